@@ -0,0 +1,160 @@
+import argparse
+import asyncio
+import collections
+import math
+import time
+
+# Bộ tạo tải cho proxy: nhiều client đồng thời (coroutine) gửi yêu cầu qua proxy trong một khoảng
+# thời gian rồi báo thông lượng và độ trễ p50/p95/p99. Mỗi yêu cầu dùng một kết nối mới với
+# "Connection: close" (các biến thể cũ của proxy đóng kết nối sau mỗi yêu cầu) và được tính là
+# xong khi proxy đóng kết nối.
+#
+# Cách chạy riêng (từ thư mục gốc của repo, proxy và Benchmark/origin_stub.py đang chạy):
+#     python Benchmark/load_generator.py [--scenario mixed] [--concurrency 32] [--duration 10]
+
+# Các kịch bản tải: danh sách (đường dẫn trên máy chủ gốc, tiêu đề Accept, trọng số)
+SCENARIOS = {
+    "static": [("/static/index.html", "text/html", 1)],
+    "image": [("/static/logo.png", "image/png,image/*;q=0.8", 1)],
+    "chunked": [("/chunked", "*/*", 1)],
+    "slow": [("/slow?delay=0.2", "*/*", 1)],
+    "mixed": [
+        ("/static/index.html", "text/html", 6),
+        ("/static/logo.png", "image/png,image/*;q=0.8", 2),
+        ("/chunked", "*/*", 1),
+        ("/slow?delay=0.2", "*/*", 1),
+    ],
+}
+
+
+def build_requests(scenario, origin):
+    """
+    Dựng sẵn các yêu cầu của kịch bản; đường dẫn có trọng số lớn được lặp lại nhiều lần trong danh sách.
+    """
+    requests = []
+    for path, accept, weight in SCENARIOS[scenario]:
+        data = (
+            f"GET http://{origin}{path} HTTP/1.1\r\n"
+            f"Host: {origin}\r\n"
+            f"Accept: {accept}\r\n"
+            f"User-Agent: proxy-bench\r\n"
+            f"Connection: close\r\n\r\n"
+        ).encode("latin-1")
+        requests.extend([data] * weight)
+    return requests
+
+
+async def send_request(proxy, data, timeout):
+    """
+    Returns:
+        tuple: (mã trạng thái, số byte nhận được); mã trạng thái 0 nếu phản hồi không hợp lệ.
+    """
+    reader, writer = await asyncio.wait_for(asyncio.open_connection(*proxy), timeout)
+    try:
+        writer.write(data)
+        await writer.drain()
+        first = b""
+        received = 0
+        while True:
+            chunk = await asyncio.wait_for(reader.read(65536), timeout)
+            if not chunk:
+                break
+            if len(first) < 12:
+                first += chunk[:12]
+            received += len(chunk)
+    finally:
+        writer.close()
+    status = int(first[9:12]) if first.startswith(b"HTTP/") and first[9:12].isdigit() else 0
+    return status, received
+
+
+async def client(proxy, requests, offset, deadline, timeout, result):
+    index = offset
+    while time.monotonic() < deadline:
+        data = requests[index % len(requests)]
+        index += 1
+        started = time.perf_counter()
+        try:
+            status, received = await send_request(proxy, data, timeout)
+        except (OSError, asyncio.TimeoutError) as Error:
+            result["errors"][type(Error).__name__] += 1
+            continue
+        result["statuses"][status] += 1
+        result["bytes"] += received
+        if 200 <= status < 400:
+            result["latencies"].append(time.perf_counter() - started)
+        else:
+            result["errors"][f"HTTP {status}"] += 1
+
+
+async def run_load(proxy, origin, scenario="mixed", concurrency=32, duration=10.0, timeout=10.0, warmup=0.0):
+    """
+    Chạy tải trong duration giây (sau warmup giây khởi động không được tính).
+
+    Returns:
+        dict: Kết quả đã tổng hợp (xem summarize).
+    """
+    requests = build_requests(scenario, origin)
+    if warmup > 0:
+        ignored = new_result()
+        deadline = time.monotonic() + warmup
+        await asyncio.gather(*(client(proxy, requests, offset, deadline, timeout, ignored) for offset in range(concurrency)))
+
+    result = new_result()
+    started = time.monotonic()
+    deadline = started + duration
+    await asyncio.gather(*(client(proxy, requests, offset, deadline, timeout, result) for offset in range(concurrency)))
+    return summarize(result, time.monotonic() - started)
+
+
+def new_result():
+    return {"latencies": [], "statuses": collections.Counter(), "errors": collections.Counter(), "bytes": 0}
+
+
+def percentile(values, fraction):
+    # Phương pháp "nearest rank" trên danh sách đã sắp xếp
+    if not values:
+        return None
+    return values[max(0, math.ceil(fraction * len(values)) - 1)]
+
+
+def summarize(result, elapsed):
+    latencies = sorted(result["latencies"])
+    return {
+        "requests": len(latencies),
+        "errors": sum(result["errors"].values()),
+        "error_kinds": dict(result["errors"]),
+        "statuses": {str(status): count for status, count in sorted(result["statuses"].items())},
+        "elapsed": elapsed,
+        "throughput": len(latencies) / elapsed if elapsed > 0 else 0.0,
+        "megabytes_per_second": result["bytes"] / elapsed / 1e6 if elapsed > 0 else 0.0,
+        "p50_ms": percentile(latencies, 0.50) * 1000 if latencies else None,
+        "p95_ms": percentile(latencies, 0.95) * 1000 if latencies else None,
+        "p99_ms": percentile(latencies, 0.99) * 1000 if latencies else None,
+    }
+
+
+def format_ms(value):
+    return "-" if value is None else f"{value:.1f}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bộ tạo tải cho proxy HTTP")
+    parser.add_argument("--proxy", default="127.0.0.1:8080", help="host:port của proxy")
+    parser.add_argument("--origin", default="localhost", help="host[:port] của máy chủ gốc, dùng trong URL của yêu cầu")
+    parser.add_argument("--scenario", default="mixed", choices=sorted(SCENARIOS))
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--warmup", type=float, default=2.0)
+    parser.add_argument("--timeout", type=float, default=10.0)
+    args = parser.parse_args()
+
+    host, _, port = args.proxy.rpartition(":")
+    summary = asyncio.run(run_load((host, int(port)), args.origin, args.scenario, args.concurrency, args.duration, args.timeout, args.warmup))
+    print(f"{summary['requests']} requests in {summary['elapsed']:.1f} s, {summary['errors']} errors {summary['error_kinds'] or ''}")
+    print(f"throughput {summary['throughput']:.1f} req/s, {summary['megabytes_per_second']:.1f} MB/s")
+    print(f"latency p50 {format_ms(summary['p50_ms'])} ms, p95 {format_ms(summary['p95_ms'])} ms, p99 {format_ms(summary['p99_ms'])} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+import argparse
+import asyncio
+import urllib.parse
+
+# Máy chủ gốc giả lập cho benchmark proxy: nội dung được dựng sẵn trong bộ nhớ, không đọc đĩa,
+# chạy trên một event loop nên bản thân nó không phải là nút thắt khi đo proxy.
+#
+#     /static/index.html    trang HTML ~6 KB (Content-Length, được phép cache 60 giây)
+#     /static/logo.png      ảnh lớn (mặc định 1 MiB, Content-Length, được phép cache 60 giây)
+#     /chunked              phần thân chunked (mặc định 64 KiB, mảnh 4 KiB, không cache)
+#     /slow?delay=0.2       chờ delay giây rồi trả về một trang nhỏ (không cache)
+#
+# Cách chạy (từ thư mục gốc của repo):
+#     python Benchmark/origin_stub.py [--host 127.0.0.1] [--port 80] [--image-size 1048576]
+#
+# Các biến thể cũ của proxy luôn kết nối tới cổng 80 của máy chủ gốc, nên mặc định là cổng 80.
+
+PAGE = (
+    b"<!DOCTYPE html><html><head><title>Benchmark</title></head><body>"
+    + b"<p>Lorem ipsum dolor sit amet, consectetur adipiscing elit, sed do eiusmod tempor.</p>" * 70
+    + b"</body></html>"
+)
+
+
+def build_response(status, content_type, body, cache_control):
+    head = (
+        b"HTTP/1.1 " + status + b"\r\n"
+        b"Content-Type: " + content_type + b"\r\n"
+        b"Cache-Control: " + cache_control + b"\r\n"
+        b"Content-Length: %d\r\n\r\n" % len(body)
+    )
+    return head, body
+
+
+def build_chunked(size, chunk_size):
+    head = (
+        b"HTTP/1.1 200 OK\r\n"
+        b"Content-Type: text/plain\r\n"
+        b"Cache-Control: no-store\r\n"
+        b"Transfer-Encoding: chunked\r\n\r\n"
+    )
+    payload = b"chunk-data-" * (chunk_size // 11) + b"x" * (chunk_size % 11)
+    body = (b"%x\r\n" % chunk_size + payload + b"\r\n") * (size // chunk_size) + b"0\r\n\r\n"
+    return head, body
+
+
+def build_routes(image_size, chunked_size):
+    # Ảnh giả: phần đầu của tệp PNG rồi tới các byte lặp lại, đủ để proxy nhận ra Content-Type image/png
+    image = (b"\x89PNG\r\n\x1a\n" + bytes(range(256)) * (image_size // 256 + 1))[:image_size]
+    return {
+        "/static/index.html": build_response(b"200 OK", b"text/html", PAGE, b"max-age=60"),
+        "/static/logo.png": build_response(b"200 OK", b"image/png", image, b"max-age=60"),
+        "/chunked": build_chunked(chunked_size, 4096),
+    }
+
+
+async def handle_connection(reader, writer, routes):
+    """
+    Phục vụ các yêu cầu trên một kết nối (giữ sống nếu client không gửi Connection: close).
+    """
+    not_found = build_response(b"404 Not Found", b"text/plain", b"Not found\n", b"no-store")
+    try:
+        while True:
+            head = await reader.readuntil(b"\r\n\r\n")
+            lower = head.lower()
+            method, target, _ = head.split(b"\r\n", 1)[0].split(b" ", 2)
+            # Phần thân của yêu cầu (POST) được đọc rồi bỏ đi
+            start = lower.find(b"content-length:")
+            if start != -1:
+                length = int(lower[start + 15:lower.find(b"\r\n", start)])
+                await reader.readexactly(length)
+
+            # Proxy có thể gửi nguyên URL tuyệt đối (http://host/path) hoặc chỉ đường dẫn
+            url = urllib.parse.urlsplit(target.decode("latin-1"))
+            if url.path == "/slow":
+                delay = float(urllib.parse.parse_qs(url.query).get("delay", ["0.2"])[0])
+                await asyncio.sleep(delay)
+                response_head, body = build_response(b"200 OK", b"text/plain", b"slow response\n", b"no-store")
+            else:
+                response_head, body = routes.get(url.path, not_found)
+
+            writer.write(response_head if method == b"HEAD" else response_head + body)
+            await writer.drain()
+            if b"connection: close" in lower:
+                break
+    except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError, ValueError):
+        pass
+    finally:
+        writer.close()
+
+
+async def serve(host, port, image_size, chunked_size):
+    routes = build_routes(image_size, chunked_size)
+    server = await asyncio.start_server(lambda reader, writer: handle_connection(reader, writer, routes), host, port, backlog=1024)
+    print(f"Origin stub is listening at: {host}:{port}", flush=True)
+    async with server:
+        await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Máy chủ gốc giả lập cho benchmark proxy")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=80)
+    parser.add_argument("--image-size", type=int, default=1024 * 1024)
+    parser.add_argument("--chunked-size", type=int, default=64 * 1024)
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.host, args.port, args.image_size, args.chunked_size))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+import importlib.util
+import os
+import sys
+import timeit
+
+# Đo chi phí phân tích một yêu cầu/phản hồi HTTP của HTTPParser (Final Socket/main.py)
+# so với parse_data cũ (Use Class (image cache)/main.py).
+#
+# Cách chạy (từ thư mục gốc của repo):
+#     python Benchmark/parser_bench.py [số lần lặp]
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+REQUEST = (
+    b"GET http://oosc.online/assets/images/logo.png HTTP/1.1\r\n"
+    b"Host: oosc.online\r\n"
+    b"User-Agent: Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0 Safari/537.36\r\n"
+    b"Accept: image/avif,image/webp,image/apng,image/svg+xml,image/*,*/*;q=0.8\r\n"
+    b"Accept-Encoding: gzip, deflate\r\n"
+    b"Accept-Language: vi-VN,vi;q=0.9,en-US;q=0.8,en;q=0.7\r\n"
+    b"Referer: http://oosc.online/\r\n"
+    b"Cookie: session=0123456789abcdef0123456789abcdef; theme=dark\r\n"
+    b"Proxy-Connection: keep-alive\r\n\r\n"
+)
+
+RESPONSE_HEAD = (
+    b"HTTP/1.1 200 OK\r\n"
+    b"Date: Sat, 17 Oct 2026 07:00:00 GMT\r\n"
+    b"Server: Apache\r\n"
+    b"Last-Modified: Tue, 02 Jan 2024 10:00:00 GMT\r\n"
+    b"ETag: \"1b2c-60b7c2a4d1e80\"\r\n"
+    b"Accept-Ranges: bytes\r\n"
+    b"Content-Length: 6956\r\n"
+    b"Cache-Control: max-age=3600\r\n"
+    b"Content-Type: image/png\r\n\r\n"
+)
+
+
+def load_module(name, path):
+    """
+    Nạp một tệp .py theo đường dẫn (các thư mục của repo có dấu cách nên không import trực tiếp được).
+    """
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def chunked_body(size, chunk_size):
+    body = bytearray()
+    payload = b"x" * chunk_size
+    for _ in range(size // chunk_size):
+        body += b"%x\r\n" % chunk_size + payload + b"\r\n"
+    body += b"0\r\n\r\n"
+    return bytes(body)
+
+
+def parse_whole(proxy):
+    # Cả tiêu đề tới trong một lần recv(); đọc 3 tiêu đề mà proxy thực sự dùng
+    parser = proxy.HTTPParser()
+    parser.feed(REQUEST)
+    parser.header(b"accept")
+    parser.header(b"connection")
+    return parser.keeps_alive()
+
+
+def parse_pieces(proxy, pieces):
+    # Tiêu đề bị cắt thành nhiều lần recv() (mạng chậm / tiêu đề lớn)
+    parser = proxy.HTTPParser()
+    for piece in pieces:
+        parser.feed(piece)
+    return parser.header(b"accept")
+
+
+def parse_response(proxy):
+    parser = proxy.HTTPParser("GET")
+    parser.feed(RESPONSE_HEAD)
+    return parser.header(b"content-type")
+
+
+def decode_chunked(proxy, body, read_size):
+    parser = proxy.HTTPParser("GET")
+    parser.feed(b"HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n\r\n")
+    for start in range(0, len(body), read_size):
+        parser.feed(body[start:start + read_size])
+    return parser.done
+
+
+def report(name, seconds, number, unit_bytes=None):
+    per_call = seconds / number
+    line = f"{name:<48} {per_call * 1e6:10.2f} us/op"
+    if unit_bytes:
+        line += f"   {unit_bytes / per_call / 1e6:8.1f} MB/s"
+    print(line)
+
+
+def main():
+    number = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    proxy = load_module("final_socket", os.path.join(ROOT, "Final Socket", "main.py"))
+    legacy = load_module("image_cache_variant", os.path.join(ROOT, "Use Class (image cache)", "main.py"))
+
+    pieces = [REQUEST[start:start + 64] for start in range(0, len(REQUEST), 64)]
+    body = chunked_body(1024 * 1024, 8192)
+
+    print(f"Request head: {len(REQUEST)} bytes, {number} iterations")
+    report("legacy parse_data (split + decode all headers)", timeit.timeit(lambda: legacy.parse_data(REQUEST), number=number), number)
+    report("HTTPParser request, one read", timeit.timeit(lambda: parse_whole(proxy), number=number), number)
+    report(f"HTTPParser request, {len(pieces)} reads of 64 bytes", timeit.timeit(lambda: parse_pieces(proxy, pieces), number=number), number)
+    report("HTTPParser response head", timeit.timeit(lambda: parse_response(proxy), number=number), number)
+
+    rounds = max(1, number // 1000)
+    report("HTTPParser chunked body 1 MiB, 64 KiB reads", timeit.timeit(lambda: decode_chunked(proxy, body, 65536), number=rounds), rounds, len(body))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,251 @@
+import argparse
+import asyncio
+import configparser
+import json
+import os
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import load_generator
+
+# Benchmark các biến thể proxy trong repo với một máy chủ gốc giả lập (origin_stub.py) trên máy.
+# Với mỗi biến thể: chép thư mục của nó vào một thư mục tạm (cache và config.ini không đụng tới repo),
+# cho phép localhost trong whitelist và cả ngày trong khung giờ, chạy proxy, tạo tải bằng
+# load_generator.py rồi đo thông lượng, độ trễ p50/p95/p99, thời gian CPU và bộ nhớ tối đa (RSS)
+# của tiến trình proxy.
+#
+# Cách chạy (từ thư mục gốc của repo, trên Linux/macOS):
+#     python Benchmark/proxy_bench.py [--variants final-socket,use-class] [--scenarios static,mixed]
+#                                     [--concurrency 32] [--duration 10] [--set ServerConfig:engine=asyncio]
+#                                     [--json ket_qua.json] [--baseline ket_qua_cu.json --tolerance 0.1]
+#
+# Các biến thể đều lắng nghe ở localhost:8080; các biến thể cũ kết nối tới cổng 80 của máy chủ gốc
+# nên máy chủ gốc mặc định chạy ở cổng 80 (cần quyền mở cổng < 1024). Với --origin-port khác 80 thì
+# chỉ đo được Final Socket. Các biến thể cũ coi giờ 23:xx là ngoài khung giờ 0-23 nên trả 403.
+# Với --baseline, các kết quả chậm hơn (thông lượng thấp hơn hoặc p99 cao hơn) quá tolerance so với
+# lần đo trước được báo là REGRESSION và chương trình thoát với mã 1.
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PROXY_ADDRESS = ("127.0.0.1", 8080)
+
+# Tên -> (thư mục trong repo, tệp chạy, có đi theo cổng của máy chủ gốc trong URL hay không)
+VARIANTS = {
+    "final-socket": ("Final Socket", "main.py", True),
+    "use-class": ("Use Class (image cache)", "main.py", False),
+    "use-all-class": ("Use All Class", "socketwclass.py", False),
+    "not-use-class": ("Not use Class", "socketnclass.py", False),
+}
+
+
+def can_bind(address):
+    # Không bật SO_REUSEADDR, giống các biến thể proxy: cổng còn kết nối TIME-WAIT thì chưa bind được
+    probe = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    try:
+        probe.bind(address)
+        return True
+    except OSError:
+        return False
+    finally:
+        probe.close()
+
+
+def wait_until(condition, timeout, interval=0.2):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(interval)
+    return condition()
+
+
+def is_listening(address):
+    try:
+        with socket.create_connection(address, timeout=1):
+            return True
+    except OSError:
+        return False
+
+
+def prepare_variant(name, workdir, origin_host, overrides):
+    """
+    Chép biến thể vào workdir và sửa config.ini của bản sao.
+
+    Returns:
+        tuple: (thư mục của bản sao, lệnh chạy proxy).
+    """
+    directory, script, _ = VARIANTS[name]
+    target = os.path.join(workdir, name)
+    shutil.copytree(os.path.join(ROOT, directory), target, ignore=shutil.ignore_patterns("cache_image", "image_cache", "__pycache__", "*.log"))
+
+    config_path = os.path.join(target, "config.ini")
+    config = configparser.ConfigParser()
+    config.read(config_path, encoding="utf-8")
+    whitelisting = [domain.strip() for domain in config.get("ProxyConfig", "whitelisting", fallback="").split(",") if domain.strip()]
+    config["ProxyConfig"]["whitelisting"] = ", ".join(whitelisting + [origin_host])
+    config["ProxyConfig"]["time"] = "0-23"
+    for override in overrides:
+        section, _, assignment = override.partition(":")
+        key, _, value = assignment.partition("=")
+        if not config.has_section(section):
+            config.add_section(section)
+        config[section][key.strip()] = value.strip()
+    with open(config_path, "w", encoding="utf-8") as file:
+        config.write(file)
+    return target, [sys.executable, script]
+
+
+def stop_process(process):
+    """
+    Dừng tiến trình proxy và lấy thời gian CPU, bộ nhớ tối đa của nó (kể cả các tiến trình con đã được nó chờ).
+
+    Returns:
+        tuple: (giây CPU, MiB RSS tối đa)
+    """
+    if process.poll() is None:
+        process.send_signal(signal.SIGTERM)
+    try:
+        _, _, usage = os.wait4(process.pid, 0)
+    except ChildProcessError:
+        return None, None
+    process.returncode = 0
+    # ru_maxrss là KiB trên Linux, byte trên macOS
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return usage.ru_utime + usage.ru_stime, usage.ru_maxrss / scale
+
+
+def bench_variant(name, workdir, args):
+    """
+    Returns:
+        dict: {kịch bản: kết quả}, hoặc None nếu không khởi động được proxy.
+    """
+    origin_host = "localhost" if args.origin_port == 80 else f"localhost:{args.origin_port}"
+    target, command = prepare_variant(name, workdir, "localhost", args.set if name == "final-socket" else [])
+
+    if not can_bind(PROXY_ADDRESS):
+        print(f"Waiting for port {PROXY_ADDRESS[1]} to be released (TIME-WAIT from the previous run)...", flush=True)
+        if not wait_until(lambda: can_bind(PROXY_ADDRESS), 120, 1.0):
+            print(f"Port {PROXY_ADDRESS[1]} is still in use, skipping {name}")
+            return None
+
+    log = open(os.path.join(target, "proxy.log"), "wb")
+    process = subprocess.Popen(command, cwd=target, stdout=log, stderr=subprocess.STDOUT)
+    results = {}
+    try:
+        if not wait_until(lambda: is_listening(PROXY_ADDRESS), 20):
+            print(f"{name} did not start, see {os.path.join(target, 'proxy.log')}")
+            return None
+        for scenario in args.scenarios:
+            started = time.monotonic()
+            results[scenario] = asyncio.run(load_generator.run_load(PROXY_ADDRESS, origin_host, scenario, args.concurrency, args.duration, args.timeout, args.warmup))
+            results[scenario]["wall_time"] = time.monotonic() - started
+    finally:
+        cpu_seconds, max_rss = stop_process(process)
+        log.close()
+
+    # Thời gian CPU là của cả lần chạy proxy (mọi kịch bản), chia cho tổng thời gian tạo tải
+    total_wall = sum(result["wall_time"] for result in results.values())
+    for result in results.values():
+        result["cpu_percent"] = 100 * cpu_seconds / total_wall if cpu_seconds is not None and total_wall else None
+        result["max_rss_mib"] = max_rss
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """
+    Returns:
+        list: Các dòng mô tả kết quả tệ hơn lần đo trước quá tolerance.
+    """
+    regressions = []
+    for key, result in results.items():
+        previous = baseline.get(key)
+        if previous is None:
+            continue
+        if previous["throughput"] and result["throughput"] < previous["throughput"] * (1 - tolerance):
+            regressions.append(f"{key}: throughput {result['throughput']:.1f} req/s < {previous['throughput']:.1f} req/s")
+        if previous.get("p99_ms") and result.get("p99_ms") and result["p99_ms"] > previous["p99_ms"] * (1 + tolerance):
+            regressions.append(f"{key}: p99 {result['p99_ms']:.1f} ms > {previous['p99_ms']:.1f} ms")
+    return regressions
+
+
+def print_table(results):
+    def number(value, digits=1):
+        return "-" if value is None else f"{value:.{digits}f}"
+
+    print(f"{'variant/scenario':<28} {'req/s':>9} {'MB/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7} {'CPU %':>7} {'RSS MiB':>8}")
+    for key, result in results.items():
+        print(
+            f"{key:<28} {result['throughput']:>9.1f} {result['megabytes_per_second']:>8.1f} {number(result['p50_ms']):>8} "
+            f"{number(result['p95_ms']):>8} {number(result['p99_ms']):>8} {result['errors']:>7} "
+            f"{number(result.get('cpu_percent'), 0):>7} {number(result.get('max_rss_mib')):>8}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark các biến thể proxy trong repo")
+    parser.add_argument("--variants", default=",".join(VARIANTS), help="các biến thể, phân tách bằng dấu phẩy: " + ", ".join(VARIANTS))
+    parser.add_argument("--scenarios", default="mixed", help="các kịch bản, phân tách bằng dấu phẩy: " + ", ".join(load_generator.SCENARIOS))
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=10.0, help="số giây đo cho mỗi kịch bản")
+    parser.add_argument("--warmup", type=float, default=2.0, help="số giây khởi động (không tính) trước mỗi kịch bản")
+    parser.add_argument("--timeout", type=float, default=10.0)
+    parser.add_argument("--origin-port", type=int, default=80)
+    parser.add_argument("--image-size", type=int, default=1024 * 1024)
+    parser.add_argument("--set", action="append", default=[], metavar="SECTION:KEY=VALUE", help="ghi đè config.ini của Final Socket")
+    parser.add_argument("--json", help="ghi kết quả ra tệp JSON")
+    parser.add_argument("--baseline", help="tệp JSON của một lần đo trước để so sánh")
+    parser.add_argument("--tolerance", type=float, default=0.1)
+    args = parser.parse_args()
+    args.scenarios = [scenario.strip() for scenario in args.scenarios.split(",") if scenario.strip()]
+    variants = [variant.strip() for variant in args.variants.split(",") if variant.strip()]
+    for name in variants:
+        if name not in VARIANTS:
+            parser.error(f"unknown variant '{name}'")
+    for scenario in args.scenarios:
+        if scenario not in load_generator.SCENARIOS:
+            parser.error(f"unknown scenario '{scenario}'")
+
+    origin = subprocess.Popen(
+        [sys.executable, os.path.join(ROOT, "Benchmark", "origin_stub.py"), "--port", str(args.origin_port), "--image-size", str(args.image_size)],
+        stdout=subprocess.DEVNULL,
+    )
+    results = {}
+    workdir = tempfile.mkdtemp(prefix="proxy-bench-")
+    try:
+        if not wait_until(lambda: is_listening(("127.0.0.1", args.origin_port)), 10):
+            print(f"Origin stub could not listen on port {args.origin_port}")
+            return 2
+        for name in variants:
+            if args.origin_port != 80 and not VARIANTS[name][2]:
+                print(f"Skipping {name}: it always connects to port 80 of the origin server")
+                continue
+            print(f"Benchmarking {name} ({', '.join(args.scenarios)}, concurrency {args.concurrency}, {args.duration:g} s)...", flush=True)
+            variant_results = bench_variant(name, workdir, args)
+            for scenario, result in (variant_results or {}).items():
+                results[f"{name}/{scenario}"] = result
+    finally:
+        origin.terminate()
+        origin.wait()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print()
+    print_table(results)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=2)
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as file:
+            regressions = compare(results, json.load(file), args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
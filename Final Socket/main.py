@@ -1,375 +1,4603 @@
 import socket
 import configparser
+import collections
 import datetime
 import threading
+import asyncio
+import bisect
+import functools
+import heapq
+import itertools
+import queue
+import select
+import selectors
+import json
+import mmap
+import hashlib
+import gzip
+import zlib
+import email.utils
+import re
+import urllib.parse
 import os
+import signal
 import shutil
+import sys
 import time
 
+# Các tuỳ chọn vận hành mặc định của proxy (có thể ghi đè trong config.ini)
+DEFAULT_OPTIONS = {
+    "ServerConfig": {
+        # "thread": mỗi kết nối một luồng; "pool": nhóm luồng cố định có hàng đợi;
+        # "asyncio": tất cả kết nối chạy trên một event loop
+        "engine": "thread",
+        # Số tiến trình worker (mỗi tiến trình chạy một engine riêng, dùng chung cổng; mỗi worker có thư mục
+        # cache riêng trên đĩa và chép mục của worker khác khi trượt cache); 1 = chạy trong một tiến trình như trước
+        "processes": 1,
+        # Độ dài hàng đợi kết nối chờ accept() của hệ điều hành
+        "backlog": 128,
+        # Số luồng xử lý và sức chứa hàng đợi của engine "pool"
+        "workers": 32,
+        "queue_size": 256,
+        # Thời gian (giây) chờ hàng đợi có chỗ trước khi trả về 503
+        "queue_timeout": 2.0,
+        # Thời gian (giây) chờ yêu cầu tiếp theo trên một kết nối giữ sống của client
+        "keep_alive_timeout": 15.0,
+        # Số yêu cầu tối đa được phục vụ trên một kết nối của client
+        "max_keep_alive_requests": 100,
+        # Kích thước bộ đệm (byte) khi chuyển tiếp phần thân từ máy chủ tới client
+        "relay_buffer_size": 65536,
+        # Kích thước tối đa (byte) của một phản hồi được giữ lại để lưu vào cache
+        "max_cache_object_size": 10485760,
+        # Kích thước tối đa (byte) phần thân một yêu cầu của client; lớn hơn thì trả về 413 (0 = không giới hạn)
+        "max_request_body_size": 104857600,
+        # Các cổng được phép mở đường hầm CONNECT (HTTPS), phân tách bằng dấu phẩy
+        "connect_ports": "443",
+        # Thời gian (giây) một đường hầm CONNECT không có dữ liệu đi qua trước khi bị đóng
+        "tunnel_idle_timeout": 300.0,
+        # Cổng của trang số liệu (Prometheus, GET /metrics) trên localhost; worker thứ i dùng cổng metrics_port + i (0 = tắt)
+        "metrics_port": 0,
+        # Chu kỳ (giây) kiểm tra config.ini để nạp lại [ProxyConfig] khi tệp thay đổi (0 = chỉ nạp lại khi nhận SIGHUP)
+        "config_reload_interval": 2.0,
+    },
+    "UpstreamConfig": {
+        # Số kết nối tối đa tới một máy chủ gốc (host:port) và số kết nối rảnh được giữ lại
+        "max_per_host": 16,
+        "max_idle_per_host": 8,
+        # Thời gian (giây) giữ một kết nối rảnh trước khi đóng
+        "idle_timeout": 30.0,
+        # Thời gian chờ kết nối và chờ dữ liệu từ máy chủ gốc
+        "connect_timeout": 10.0,
+        "read_timeout": 30.0,
+    },
+    "DNSConfig": {
+        # Thời gian (giây) nhớ kết quả phân giải thành công / thất bại
+        "positive_ttl": 300.0,
+        "negative_ttl": 30.0,
+        # Số tên miền tối đa trong bộ đệm DNS
+        "max_entries": 10000,
+    },
+    "CacheConfig": {
+        # Tổng số byte phản hồi được giữ trong bộ nhớ (0 = chỉ dùng cache trên đĩa)
+        "memory_cache_size": 67108864,
+        # Phản hồi lớn hơn ngưỡng này chỉ được lưu trên đĩa
+        "memory_max_object_size": 1048576,
+        # Giới hạn tổng số byte và số mục của cache trên đĩa (0 = không giới hạn)
+        "disk_cache_size": 1073741824,
+        "disk_max_entries": 100000,
+        # Chính sách chọn mục bị loại khi vượt giới hạn: "lru", "lfu" hoặc "gdsf"
+        "eviction_policy": "lru",
+        # Cách lưu dữ liệu trên đĩa: "files" (mỗi đối tượng một tệp) hoặc "segments"
+        # (ghi nối tiếp vào các tệp phân đoạn lớn, đọc qua mmap)
+        "storage": "files",
+        # Kích thước (byte) một tệp phân đoạn và tỉ lệ dung lượng không còn dùng để thu gọn nó
+        "segment_size": 67108864,
+        "compact_ratio": 0.5,
+        # Số giây một yêu cầu chờ lượt tải cùng URL đang chạy trước khi tự hỏi máy chủ gốc (0 = không gộp)
+        "coalesce_timeout": 10.0,
+        # Số giây các yêu cầu tới một URL vừa trả phản hồi không được lưu cache đi thẳng tới máy chủ gốc
+        # thay vì chờ lượt tải của nhau ("hit-for-pass"; 0 = tắt)
+        "hit_for_pass": 30.0,
+        # Số giây sau khi hết hạn mà bản cũ vẫn được trả trong lúc tải lại nền
+        # (khi máy chủ gốc không gửi stale-while-revalidate; 0 = tắt)
+        "stale_while_revalidate": 0.0,
+        # Mục được dùng ít nhất refresh_min_hits lần được tải lại nền refresh_ahead giây trước khi hết hạn (0 = tắt)
+        "refresh_ahead": 0.0,
+        "refresh_min_hits": 10,
+    },
+    "CompressionConfig": {
+        # Nén (gzip/deflate) phần thân phản hồi chưa nén cho client có Accept-Encoding phù hợp
+        "compression": False,
+        # Các kiểu nội dung được nén, phân tách bằng dấu phẩy
+        "compression_types": "text/html, text/css, text/plain, text/javascript, application/javascript, application/json, application/xml, image/svg+xml",
+        # Phản hồi có Content-Length nhỏ hơn ngưỡng này (byte) được gửi nguyên dạng
+        "compression_min_size": 1024,
+        # Mức nén của zlib: 1 (nhanh nhất) tới 9 (nhỏ nhất)
+        "compression_level": 6,
+    },
+    "LogConfig": {
+        # Tệp nhật ký truy cập, mỗi yêu cầu một dòng ("-" = stdout, để trống = tắt);
+        # khi chạy nhiều tiến trình, worker thứ i (i > 0) ghi vào <tên>.<i><đuôi>
+        "access_log": "-",
+        # Định dạng mỗi dòng: "json" hoặc "combined" (như Apache/nginx, thêm kết quả tra cache và thời gian xử lý)
+        "access_log_format": "json",
+        # Số dòng tối đa chờ ghi; hàng đợi đầy thì dòng mới bị bỏ thay vì làm chậm yêu cầu
+        "access_log_queue_size": 10000,
+        # Chu kỳ (giây) luồng nền ghi các dòng đang chờ thành một lô
+        "access_log_flush_interval": 0.5,
+        # Kích thước (byte) để xoay vòng tệp nhật ký (0 = không xoay vòng) và số tệp cũ được giữ lại
+        "access_log_max_bytes": 10485760,
+        "access_log_backups": 5,
+    },
+}
+ENGINES = ("thread", "pool", "asyncio")
+ACCESS_LOG_FORMATS = ("json", "combined")
+# Địa chỉ proxy lắng nghe và thư mục cache trên đĩa
+CLIENT_ADDRESS = ("localhost", 8080)
+CACHE_DIRECTORY = "cache_image"
+# Kích thước tối đa của phần tiêu đề một yêu cầu từ client
+MAX_REQUEST_HEAD = 65536
+# Dòng tiêu đề có khoảng trắng trước dấu ":" hoặc dòng nối (obs-fold, bắt đầu bằng khoảng trắng)
+INVALID_HEADER_LINE = re.compile(rb"\r\n(?:[^\r\n:]*[ \t]:|[ \t])")
+# Kích thước chunk: một hoặc nhiều chữ số hệ 16 (int(..., 16) còn nhận "0x10", "+10", "1_0", " 10")
+CHUNK_SIZE = re.compile(rb"[0-9A-Fa-f]+")
+# Cờ send() báo còn dữ liệu gửi tiếp (chỉ có trên Linux)
+MSG_MORE = getattr(socket, "MSG_MORE", 0)
+# os.splice() chuyển dữ liệu giữa socket và pipe ngay trong nhân (Linux, Python 3.10+)
+HAS_SPLICE = hasattr(os, "splice")
+
+# Một phản hồi HTTP được lưu trong cache
+class CacheEntry:
+    def __init__(self, url, head, body, stored_at, initial_age, lifetime, vary):
+        """
+        Args:
+            url (str): Khoá cache (tên miền + đường dẫn) của phản hồi.
+            head (bytes): Dòng trạng thái và các tiêu đề đầu-cuối (đã bỏ UNCACHED_HEADERS).
+            body (bytes): Phần thân đã giải mã (không còn khung chunked); None khi phần thân chỉ nằm
+                trên đĩa (body_path, body_offset), lúc đó nó được gửi thẳng từ tệp.
+            stored_at (float): Thời điểm (time.time()) nhận được phản hồi.
+            initial_age (float): Tuổi của phản hồi lúc nhận (theo Age và Date).
+            lifetime (float): Thời gian (giây) phản hồi còn "tươi" tính từ khi máy chủ tạo ra.
+            vary (dict): {tên tiêu đề: giá trị trong yêu cầu đã tạo ra phản hồi} theo tiêu đề Vary.
+        """
+        self.url = url
+        self.head = head
+        self.body = body
+        self.stored_at = stored_at
+        self.initial_age = initial_age
+        self.lifetime = lifetime
+        self.vary = vary
+        self.digest = None    # sha256 của phần thân, được đặt khi lưu xuống đĩa
+        self.body_path = None # tệp chứa phần thân trên đĩa (khi body là None)
+        self.body_offset = 0  # vị trí phần thân trong tệp đó
+        self.body_size = 0    # kích thước phần thân khi body là None
+        self.response = HTTPParser("GET")
+        self.response.feed(head)
+        self.status = self.response.status
+
+    @property
+    def expires_at(self):
+        """
+        Thời điểm (time.time()) phản hồi hết "tươi".
+        """
+        return self.stored_at + self.lifetime - self.initial_age
+
+    def age(self, now):
+        return self.initial_age + max(0, now - self.stored_at)
+
+    def content_length(self):
+        return len(self.body) if self.body is not None else self.body_size
+
+    def size(self):
+        return len(self.head) + self.content_length()
+
+    def has_validators(self):
+        return self.response.header(b"etag") is not None or self.response.header(b"last-modified") is not None
+
+    def vary_of(self, request):
+        """
+        Returns:
+            dict: Giá trị trong yêu cầu của các tiêu đề được liệt kê trong Vary của phản hồi này.
+        """
+        values = {}
+        for name in self.vary:
+            value = request.header(name.encode("latin-1"))
+            values[name] = value.decode("latin-1") if value is not None else None
+        return values
+
+    def matches(self, request):
+        """
+        Returns:
+            bool: True nếu các tiêu đề được liệt kê trong Vary của yêu cầu trùng với yêu cầu đã tạo ra phản hồi.
+        """
+        return not self.vary or self.vary_of(request) == self.vary
+
+    def can_serve(self, request, request_directives, now, stale_window=0):
+        """
+        Kiểm tra xem có thể trả lời yêu cầu từ cache mà không hỏi lại máy chủ gốc hay không.
+
+        Args:
+            request (HTTPParser): Yêu cầu của client.
+            request_directives (dict): Cache-Control của yêu cầu (parse_cache_control).
+            now (float): Thời điểm hiện tại.
+            stale_window (float): Số giây sau khi hết hạn mà bản cũ vẫn được dùng (xem stale_window()).
+        """
+        if "no-cache" in request_directives or b"no-cache" in request.header(b"pragma", b"").lower():
+            return False
+        age = self.age(now)
+        max_age = directive_seconds(request_directives, "max-age")
+        if max_age is not None and age > max_age:
+            return False
+        return age < self.lifetime + stale_window
+
+    def stale_window(self, default):
+        """
+        Số giây sau khi hết hạn mà bản này còn được trả trong lúc tải lại nền: stale-while-revalidate
+        của phản hồi (RFC 5861), nếu không có thì giá trị mặc định trong config.ini; 0 khi phản hồi
+        bắt buộc xác thực lại (must-revalidate, proxy-revalidate, no-cache).
+        """
+        directives = parse_cache_control(self.response.header(b"cache-control", b""))
+        if "must-revalidate" in directives or "proxy-revalidate" in directives or "no-cache" in directives:
+            return 0
+        seconds = directive_seconds(directives, "stale-while-revalidate")
+        return seconds if seconds is not None else default
+
+    def not_modified_for(self, request):
+        """
+        Returns:
+            bool: True nếu yêu cầu có điều kiện (If-None-Match / If-Modified-Since) và bản của client vẫn còn đúng.
+        """
+        if_none_match = request.header(b"if-none-match")
+        if if_none_match is not None:
+            etag = self.response.header(b"etag")
+            if etag is None:
+                return False
+            tags = [tag.strip().removeprefix(b"W/") for tag in if_none_match.split(b",")]
+            return b"*" in tags or etag.removeprefix(b"W/") in tags
+        since = parse_http_date(request.header(b"if-modified-since", b""))
+        last_modified = parse_http_date(self.response.header(b"last-modified", b""))
+        return since is not None and last_modified is not None and last_modified <= since
+
+    def refresh(self, response, now, cache_time):
+        """
+        Cập nhật phản hồi đã lưu sau khi máy chủ gốc trả lời 304 Not Modified: các tiêu đề
+        trong phản hồi 304 thay cho tiêu đề cùng tên đã lưu, phần thân giữ nguyên.
+
+        Args:
+            response (HTTPParser): Phản hồi 304 của máy chủ gốc.
+            now (float): Thời điểm nhận phản hồi 304.
+            cache_time (int): Thời gian cache mặc định (xem freshness_lifetime).
+
+        Returns:
+            CacheEntry: Bản ghi mới (bản ghi cũ không bị thay đổi vì có thể đang được luồng khác đọc).
+        """
+        updated = rewrite_headers(response.head, UNCACHED_HEADERS).split(b"\r\n")[1:-2]
+        names = tuple(line.split(b":", 1)[0].strip().lower() for line in updated)
+        head = rewrite_headers(self.head, names, updated)
+        parser = HTTPParser("GET")
+        parser.feed(head)
+        lifetime = freshness_lifetime(parser, parse_cache_control(parser.header(b"cache-control", b"")), now, cache_time)
+        entry = CacheEntry(self.url, head, self.body, now, initial_age(response, now), lifetime, self.vary)
+        entry.digest = self.digest
+        entry.body_path = self.body_path
+        entry.body_offset = self.body_offset
+        entry.body_size = self.body_size
+        return entry
+
+    def to_meta(self):
+        """
+        Returns:
+            dict: Thông tin của bản ghi (trừ phần thân) để ghi ra tệp .meta dạng JSON.
+        """
+        return {
+            "url": self.url,
+            "head": self.head.decode("latin-1"),
+            "size": self.content_length(),
+            "digest": self.digest,
+            "stored_at": self.stored_at,
+            "initial_age": self.initial_age,
+            "lifetime": self.lifetime,
+            "vary": self.vary,
+        }
+
+    @classmethod
+    def from_meta(cls, meta, location):
+        """
+        Tạo bản ghi từ tệp .meta; phần thân chưa được đọc mà chỉ ghi nhớ vị trí của nó
+        (location là (đường dẫn tệp, vị trí, số byte) do kho lưu trữ trả về).
+        """
+        entry = cls(meta["url"], meta["head"].encode("latin-1"), None, meta["stored_at"], meta["initial_age"], meta["lifetime"], meta["vary"])
+        entry.digest = meta["digest"]
+        entry.body_path, entry.body_offset, entry.body_size = location
+        return entry
+
+# Chỉ mục thời điểm xoá và kích thước của từng mục cache: min-heap trong bộ nhớ, ghi kèm một nhật ký trên đĩa
+class ExpiryIndex:
+    def __init__(self, journal_path):
+        """
+        Khởi tạo chỉ mục và nạp lại các mục từ nhật ký (nếu có).
+
+        Args:
+            journal_path (str): Tệp nhật ký; mỗi dòng là "<thời điểm xoá> <số byte> <sha256 nội dung> <khoá>"
+                khi thêm/cập nhật hoặc "- <khoá>" khi xoá, dòng sau ghi đè dòng trước.
+        """
+        self.journal_path = journal_path
+        self.entries = {}     # khoá -> (thời điểm xoá, số byte, sha256 của phần thân)
+        self.heap = []        # (thời điểm xoá, khoá); mục đã bị cập nhật/xoá được bỏ qua khi lấy ra
+        self.total_bytes = 0
+        self.lock = threading.Lock()
+        self.journal = None
+        self.journal_lines = 0
+        try:
+            with open(journal_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    fields = line.rstrip("\n").split(" ", 3)
+                    if fields[0] == "-":
+                        self.entries.pop(line.rstrip("\n")[2:], None)
+                        continue
+                    try:
+                        self.entries[fields[3]] = (float(fields[0]), int(fields[1]), fields[2])
+                    except (IndexError, ValueError):
+                        print(f"Skipping malformed cache index line: {line.strip()[:100]}")
+        except FileNotFoundError:
+            pass
+        except OSError as Error:
+            print(f"Error while reading cache index: {Error}")
+        self.total_bytes = sum(record[1] for record in self.entries.values())
+        self.compact()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def compact(self):
+        """
+        Ghi lại nhật ký chỉ gồm các mục còn sống và dựng lại heap (phải giữ self.lock khi gọi,
+        trừ lúc khởi tạo).
+        """
+        if self.journal is not None:
+            self.journal.close()
+        temp_path = self.journal_path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            for key, (deadline, size, digest) in self.entries.items():
+                f.write(f"{deadline} {size} {digest} {key}\n")
+        os.replace(temp_path, self.journal_path)
+        self.journal = open(self.journal_path, "a", encoding="utf-8")
+        self.journal_lines = len(self.entries)
+        self.heap = [(record[0], key) for key, record in self.entries.items()]
+        heapq.heapify(self.heap)
+
+    def log(self, line):
+        """
+        Ghi một dòng vào nhật ký (phải giữ self.lock khi gọi); nhật ký quá dài so với số mục thì được thu gọn.
+        """
+        self.journal.write(line)
+        self.journal.flush()
+        self.journal_lines += 1
+        if self.journal_lines > 2 * len(self.entries) + 1000:
+            self.compact()
+
+    def push(self, key, deadline, size, digest):
+        """
+        Thêm một khoá hoặc cập nhật thời điểm xoá/kích thước/nội dung của nó, O(log n).
+
+        Returns:
+            tuple hoặc None: Bản ghi (thời điểm xoá, số byte, sha256) cũ của khoá, nếu có.
+        """
+        with self.lock:
+            old = self.entries.get(key)
+            if old is not None:
+                self.total_bytes -= old[1]
+            self.entries[key] = (deadline, size, digest)
+            self.total_bytes += size
+            heapq.heappush(self.heap, (deadline, key))
+            self.log(f"{deadline} {size} {digest} {key}\n")
+            return old
+
+    def discard(self, key):
+        """
+        Returns:
+            tuple hoặc None: Bản ghi của khoá vừa bị bỏ, None nếu khoá không có trong chỉ mục.
+        """
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.total_bytes -= old[1]
+                self.log(f"- {key}\n")
+            return old
+
+    def pop_expired(self, now):
+        """
+        Lấy ra các khoá đã tới thời điểm xoá; chỉ chạm tới các mục ở đỉnh heap, không duyệt toàn bộ.
+
+        Returns:
+            list: Các cặp (khoá, bản ghi) cần xoá.
+        """
+        expired = []
+        with self.lock:
+            while self.heap and self.heap[0][0] <= now:
+                deadline, key = heapq.heappop(self.heap)
+                record = self.entries.get(key)
+                if record is not None and record[0] == deadline:
+                    del self.entries[key]
+                    self.total_bytes -= record[1]
+                    self.log(f"- {key}\n")
+                    expired.append((key, record))
+        return expired
+
+# Chính sách loại bỏ LRU: loại mục lâu nhất chưa được dùng
+class LRUPolicy:
+    def __init__(self):
+        self.order = collections.OrderedDict()  # khoá -> None, mục dùng gần nhất ở cuối
+
+    def add(self, key, size):
+        self.order[key] = None
+        self.order.move_to_end(key)
+
+    def touch(self, key):
+        if key in self.order:
+            self.order.move_to_end(key)
+
+    def remove(self, key):
+        self.order.pop(key, None)
+
+    def evict(self):
+        """
+        Returns:
+            str hoặc None: Khoá bị loại (đã được bỏ khỏi chính sách), None nếu không còn mục nào.
+        """
+        if not self.order:
+            return None
+        return self.order.popitem(last=False)[0]
+
+# Chính sách loại bỏ LFU: loại mục ít được dùng nhất (cùng số lần thì loại mục cũ hơn)
+class LFUPolicy:
+    def __init__(self):
+        self.entries = {}    # khoá -> (độ ưu tiên, thứ tự, số lần dùng, số byte)
+        self.heap = []       # (độ ưu tiên, thứ tự, khoá); mục lỗi thời được bỏ qua khi lấy ra
+        self.counter = itertools.count()
+        self.clock = 0.0     # độ ưu tiên của mục bị loại gần nhất (GDSF dùng để "làm già" các mục cũ)
+
+    def priority(self, count, size):
+        return count
+
+    def set(self, key, count, size):
+        priority = self.priority(count, size)
+        order = next(self.counter)
+        self.entries[key] = (priority, order, count, size)
+        heapq.heappush(self.heap, (priority, order, key))
+        if len(self.heap) > 2 * len(self.entries) + 1000:
+            self.heap = [(priority, order, key) for key, (priority, order, _, _) in self.entries.items()]
+            heapq.heapify(self.heap)
+
+    def add(self, key, size):
+        self.set(key, 1, size)
+
+    def touch(self, key):
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.set(key, entry[2] + 1, entry[3])
+
+    def remove(self, key):
+        self.entries.pop(key, None)
+
+    def evict(self):
+        while self.heap:
+            priority, order, key = heapq.heappop(self.heap)
+            entry = self.entries.get(key)
+            if entry is not None and entry[1] == order:
+                del self.entries[key]
+                self.clock = priority
+                return key
+        return None
+
+# Chính sách GDSF (Greedy-Dual-Size-Frequency): ưu tiên giữ các mục nhỏ và hay được dùng;
+# độ ưu tiên = clock + số lần dùng / số byte, clock tăng dần theo các mục bị loại
+class GDSFPolicy(LFUPolicy):
+    def priority(self, count, size):
+        return self.clock + count / max(size, 1)
+
+EVICTION_POLICIES = {"lru": LRUPolicy, "lfu": LFUPolicy, "gdsf": GDSFPolicy}
+
+# Kho lưu trữ mỗi đối tượng (phần thân hoặc .meta) thành một tệp riêng trong các thư mục con kind/ab/cd/
+class FileStore:
+    def __init__(self, directory):
+        """
+        Args:
+            directory (str): Thư mục gốc của kho.
+        """
+        self.directory = directory
+
+    def path(self, kind, name):
+        """
+        Tên đối tượng là chuỗi hex (sha256) nên hai ký tự đầu chia đều các tệp cho 65536 thư mục con.
+        """
+        return os.path.join(self.directory, kind, name[:2], name[2:4], name)
+
+    def read(self, kind, name):
+        """
+        Returns:
+            bytes hoặc None: Nội dung đối tượng, None nếu không có.
+        """
+        try:
+            with open(self.path(kind, name), "rb") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def locate(self, kind, name):
+        """
+        Returns:
+            tuple hoặc None: (đường dẫn tệp, vị trí, số byte) để gửi bằng sendfile, None nếu không có.
+        """
+        path = self.path(kind, name)
+        try:
+            return path, 0, os.stat(path).st_size
+        except OSError:
+            return None
+
+    def exists(self, kind, name):
+        return os.path.exists(self.path(kind, name))
+
+    def write(self, kind, name, data):
+        """
+        Ghi ra tệp tạm rồi đổi tên để luồng (hoặc tiến trình worker) khác không đọc phải tệp ghi dở.
+        """
+        path = self.path(kind, name)
+        suffix = f".{os.getpid()}.{threading.get_ident()}.tmp"
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + suffix, "wb") as f:
+            f.write(data)
+        os.replace(path + suffix, path)
+
+    def remove(self, kind, name):
+        try:
+            os.remove(self.path(kind, name))
+        except OSError:
+            pass
+
+    def start_compactor(self):
+        """
+        Mỗi đối tượng một tệp nên không có dung lượng "chết" cần thu gọn.
+        """
+
+# Kho lưu trữ dạng log: các đối tượng được ghi nối tiếp vào những tệp phân đoạn lớn và đọc qua mmap
+class SegmentStore:
+    def __init__(self, directory, segment_size, compact_ratio):
+        """
+        Args:
+            directory (str): Thư mục chứa các tệp phân đoạn seg-<số>.dat và nhật ký chỉ mục.
+            segment_size (int): Kích thước (byte) mà khi vượt qua thì chuyển sang ghi phân đoạn mới.
+            compact_ratio (float): Tỉ lệ dung lượng không còn được dùng để một phân đoạn được thu gọn.
+        """
+        self.directory = directory
+        self.segment_size = segment_size
+        self.compact_ratio = compact_ratio
+        self.index = {}      # (kind, name) -> (số phân đoạn, vị trí, số byte)
+        self.members = {}    # số phân đoạn -> tập các (kind, name) nằm trong phân đoạn
+        self.sizes = {}      # số phân đoạn -> số byte đã ghi
+        self.live = {}       # số phân đoạn -> số byte còn được chỉ mục tham chiếu
+        self.maps = {}       # số phân đoạn -> mmap chỉ đọc của phân đoạn
+        self.retired = []    # phân đoạn đã thu gọn nhưng chưa xoá được tệp (Windows: tệp đang mở)
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+        for file_name in os.listdir(directory):
+            if file_name.startswith("seg-") and file_name.endswith(".dat"):
+                segment = int(file_name[4:-4])
+                self.sizes[segment] = os.path.getsize(os.path.join(directory, file_name))
+                self.live[segment] = 0
+                self.members[segment] = set()
+
+        # Nhật ký: "+ <phân đoạn> <vị trí> <số byte> <kind> <name>" khi ghi, "- <kind> <name>" khi xoá
+        self.journal_path = os.path.join(directory, "_segments.log")
+        self.journal = None
+        self.journal_lines = 0
+        try:
+            with open(self.journal_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    fields = line.split()
+                    try:
+                        if fields[0] == "+":
+                            segment, offset, size = int(fields[1]), int(fields[2]), int(fields[3])
+                            if segment in self.sizes and offset + size <= self.sizes[segment]:
+                                self.set_record((fields[4], fields[5]), (segment, offset, size))
+                        elif fields[0] == "-":
+                            self.set_record((fields[1], fields[2]), None)
+                    except (IndexError, ValueError):
+                        print(f"Skipping malformed segment index line: {line.strip()[:100]}")
+        except FileNotFoundError:
+            pass
+        except OSError as Error:
+            print(f"Error while reading segment index: {Error}")
+        self.compact_journal()
+
+        self.active = max(self.sizes, default=0)
+        if self.active not in self.sizes or self.sizes[self.active] >= self.segment_size:
+            self.new_segment()
+        self.active_file = open(self.segment_path(self.active), "ab")
+
+    def segment_path(self, segment):
+        return os.path.join(self.directory, f"seg-{segment:06d}.dat")
+
+    def new_segment(self):
+        """
+        Bắt đầu một phân đoạn mới để ghi (phải giữ self.lock khi gọi, trừ lúc khởi tạo).
+        """
+        self.active = max(self.sizes, default=0) + 1
+        self.sizes[self.active] = 0
+        self.live[self.active] = 0
+        self.members[self.active] = set()
+        if getattr(self, "active_file", None) is not None:
+            self.active_file.close()
+            self.active_file = open(self.segment_path(self.active), "ab")
+
+    def set_record(self, object_key, record):
+        """
+        Đặt (record là None: bỏ) vị trí của một đối tượng và cập nhật số byte còn dùng của các phân đoạn.
+        """
+        old = self.index.pop(object_key, None)
+        if old is not None:
+            self.live[old[0]] -= old[2]
+            self.members[old[0]].discard(object_key)
+        if record is not None:
+            self.index[object_key] = record
+            self.live[record[0]] += record[2]
+            self.members[record[0]].add(object_key)
+
+    def compact_journal(self):
+        """
+        Ghi lại nhật ký chỉ gồm các đối tượng còn sống (phải giữ self.lock khi gọi, trừ lúc khởi tạo).
+        """
+        if self.journal is not None:
+            self.journal.close()
+        temp_path = self.journal_path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            for (kind, name), (segment, offset, size) in self.index.items():
+                f.write(f"+ {segment} {offset} {size} {kind} {name}\n")
+        os.replace(temp_path, self.journal_path)
+        self.journal = open(self.journal_path, "a", encoding="utf-8")
+        self.journal_lines = len(self.index)
+
+    def log(self, line):
+        self.journal.write(line)
+        self.journal.flush()
+        self.journal_lines += 1
+        if self.journal_lines > 2 * len(self.index) + 1000:
+            self.compact_journal()
+
+    def append(self, object_key, data):
+        """
+        Ghi nối đối tượng vào cuối phân đoạn đang ghi (phải giữ self.lock khi gọi).
+        """
+        if self.sizes[self.active] and self.sizes[self.active] + len(data) > self.segment_size:
+            self.new_segment()
+        offset = self.sizes[self.active]
+        self.active_file.write(data)
+        self.active_file.flush()
+        self.sizes[self.active] += len(data)
+        self.set_record(object_key, (self.active, offset, len(data)))
+        self.log(f"+ {self.active} {offset} {len(data)} {object_key[0]} {object_key[1]}\n")
+
+    def mapping(self, segment, end):
+        """
+        mmap của một phân đoạn, được ánh xạ lại khi phân đoạn đang ghi đã dài hơn bản ánh xạ cũ
+        (phải giữ self.lock khi gọi). Bản cũ không bị đóng vì có thể vẫn đang được memoryview dùng.
+        """
+        mapped = self.maps.get(segment)
+        if mapped is None or len(mapped) < end:
+            with open(self.segment_path(segment), "rb") as f:
+                mapped = self.maps[segment] = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return mapped
+
+    def read(self, kind, name):
+        """
+        Returns:
+            memoryview hoặc None: Lát cắt của mmap trỏ thẳng vào phân đoạn (không sao chép), None nếu không có.
+        """
+        with self.lock:
+            record = self.index.get((kind, name))
+            if record is None:
+                return None
+            segment, offset, size = record
+            if size == 0:
+                return memoryview(b"")
+            return memoryview(self.mapping(segment, offset + size))[offset:offset + size]
+
+    def locate(self, kind, name):
+        with self.lock:
+            record = self.index.get((kind, name))
+        if record is None:
+            return None
+        segment, offset, size = record
+        return self.segment_path(segment), offset, size
+
+    def exists(self, kind, name):
+        with self.lock:
+            return (kind, name) in self.index
+
+    def write(self, kind, name, data):
+        with self.lock:
+            self.append((kind, name), data)
+
+    def remove(self, kind, name):
+        with self.lock:
+            if (kind, name) in self.index:
+                self.set_record((kind, name), None)
+                self.log(f"- {kind} {name}\n")
+
+    def compact(self):
+        """
+        Thu gọn các phân đoạn (trừ phân đoạn đang ghi) có phần dung lượng không còn dùng vượt quá
+        compact_ratio: các đối tượng còn sống được chép sang phân đoạn đang ghi rồi tệp cũ bị xoá.
+        Mỗi đối tượng được chép trong một lần giữ khoá ngắn để không chặn lâu các luồng đọc/ghi.
+        """
+        with self.lock:
+            candidates = [segment for segment, size in self.sizes.items() if segment != self.active and size and 1 - self.live[segment] / size >= self.compact_ratio]
+        for segment in candidates:
+            while True:
+                with self.lock:
+                    if not self.members[segment]:
+                        break
+                    object_key = next(iter(self.members[segment]))
+                    _, offset, size = self.index[object_key]
+                    data = self.mapping(segment, offset + size)[offset:offset + size]
+                    self.append(object_key, data)
+            with self.lock:
+                del self.sizes[segment], self.live[segment], self.members[segment]
+                self.maps.pop(segment, None)
+                self.retired.append(segment)
+            print(f"Compacted cache segment {segment}")
+        for segment in list(self.retired):
+            try:
+                os.remove(self.segment_path(segment))
+                self.retired.remove(segment)
+            except FileNotFoundError:
+                self.retired.remove(segment)
+            except OSError:
+                pass
+
+    def start_compactor(self, interval=5.0):
+        """
+        Tạo luồng con (daemon) định kỳ thu gọn các phân đoạn.
+        """
+        def compact_forever():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.compact()
+                except Exception as Error:
+                    print(f"Error while compacting cache segments: {Error}")
+
+        compactor_thread = threading.Thread(target=compact_forever, name="cache-compactor", daemon=True)
+        compactor_thread.start()
+
+STORAGE_BACKENDS = ("files", "segments")
+
+# Thư mục riêng của một tiến trình worker trong thư mục cache (worker 0 dùng chính thư mục cache)
+def worker_cache_directory(cache_directory, worker):
+    return cache_directory if worker == 0 else os.path.join(cache_directory, f"worker-{worker}")
+
 # Khởi tạo bộ đệm cache
+# Chuẩn bị thư mục cache trước khi có Cache nào mở nó
+def prepare_cache_directory(cache_directory, storage, workers=1):
+    """
+    Thư mục cache của phiên bản cũ không có chỉ mục (hoặc của kho lưu trữ khác, hoặc có các nhật ký
+    _index.<kho>.<số>.log của cách chia sẻ cũ giữa các worker) được xoá một lần rồi bắt đầu lại.
+    Nhật ký chỉ mục chính được tạo ngay (rỗng), nên khi chạy nhiều tiến trình worker, tiến trình
+    khởi động sau không xoá mất dữ liệu tiến trình khác vừa ghi. Thư mục của các worker không còn
+    chạy (số thứ tự >= workers) bị xoá vì không tiến trình nào dọn các mục của chúng.
+    Tham số:
+        cache_directory (str): Đường dẫn đến thư mục lưu trữ dữ liệu cache.
+        storage (str): Kho lưu trữ trên đĩa ("files" hoặc "segments").
+        workers (int): Số tiến trình worker.
+    """
+    journal_path = os.path.join(cache_directory, f"_index.{storage}.log")
+    if os.path.isdir(cache_directory):
+        names = os.listdir(cache_directory)
+        legacy = any(name.startswith(f"_index.{storage}.") and name[len(f"_index.{storage}."):-4].isdigit() for name in names)
+        try:
+            if not os.path.exists(journal_path) or legacy:
+                shutil.rmtree(cache_directory)
+                print("Cache has been cleared")
+            else:
+                for name in names:
+                    if name.startswith("worker-") and name[7:].isdigit() and int(name[7:]) >= workers:
+                        shutil.rmtree(os.path.join(cache_directory, name))
+        except Exception as Error:
+            print(f"Error while deleting cache data: {Error}")
+
+    # Tạo thư mục cache nếu không tồn tại
+    os.makedirs(cache_directory, exist_ok=True)
+    open(journal_path, "a").close()
+
 class Cache:
-    def __init__(self, cache_time, cache_directory):
+    def __init__(self, cache_time, cache_directory, max_bytes=0, max_entries=0, policy="lru", storage="files", segment_size=67108864, compact_ratio=0.5, stale_while_revalidate=0.0, worker=0, workers=1):
         """
         Khởi tạo đối tượng Cache.
 
-        Args:
-            cache_time (int): Thời gian tối đa cho dữ liệu cache (tính bằng giây)
-            cache_directory (str): Đường dẫn đến thư mục lưu trữ dữ liệu cache.
-        """
-        self.cache_time = cache_time
-        self.cache_directory = cache_directory
-        self.cache_creation_time = time.time()
+        Args:
+            cache_time (int): Thời gian cache (tính bằng giây): hạn dùng mặc định của ảnh mà máy chủ
+                gốc không ghi hạn dùng, và thời gian tối thiểu giữ lại một mục còn xác thực lại được.
+            cache_directory (str): Đường dẫn đến thư mục lưu trữ dữ liệu cache.
+            max_bytes (int): Tổng số byte tối đa trên đĩa (0 = không giới hạn).
+            max_entries (int): Số mục tối đa trên đĩa (0 = không giới hạn).
+            policy (str): Chính sách chọn mục bị loại khi vượt giới hạn: "lru", "lfu" hoặc "gdsf".
+            storage (str): Kho lưu trữ trên đĩa: "files" (FileStore) hoặc "segments" (SegmentStore).
+            segment_size (int): Kích thước một tệp phân đoạn (chỉ với "segments").
+            compact_ratio (float): Tỉ lệ dung lượng không còn dùng để thu gọn một phân đoạn (chỉ với "segments").
+            stale_while_revalidate (float): Số giây mặc định bản hết hạn còn được trả trong lúc tải lại nền.
+            worker (int): Số thứ tự tiến trình worker. Mỗi worker ghi vào thư mục riêng
+                (worker_cache_directory) với chỉ mục, số tham chiếu và giới hạn (max_bytes, max_entries)
+                của riêng nó, nên không worker nào xoá tệp mà worker khác còn dùng.
+            workers (int): Số tiến trình worker. Khi trượt cache, mục do worker khác lưu (kho "files")
+                được chép sang thư mục của worker này rồi dùng như mục của nó (xem adopt).
+        """
+        self.cache_time = cache_time
+        self.stale_while_revalidate = stale_while_revalidate
+        self.cache_directory = cache_directory
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.policy = EVICTION_POLICIES[policy]()
+        self.lock = threading.Lock()  # bảo vệ self.policy và self.refs
+        self.refs = collections.Counter()  # sha256 nội dung -> số khoá đang dùng phần thân đó
+        self.evictions = 0
+        # Hàm được gọi với khoá của mục bị xoá khỏi đĩa (MemoryCache dùng để bỏ bản trong bộ nhớ)
+        self.on_evict = None
+
+        directory = worker_cache_directory(cache_directory, worker)
+        prepare_cache_directory(directory, storage, workers)
+        journal_path = os.path.join(directory, f"_index.{storage}.log")
+
+        if storage == "segments":
+            self.store = SegmentStore(os.path.join(directory, "segments"), segment_size, compact_ratio)
+            self.peers = []
+        else:
+            self.store = FileStore(directory)
+            # Kho của các worker khác, chỉ được đọc
+            self.peers = [FileStore(worker_cache_directory(cache_directory, index)) for index in range(workers) if index != worker]
+
+        # Mỗi mục hết hạn riêng lẻ theo chỉ mục, dữ liệu còn hạn được giữ lại qua các lần khởi động
+        self.expiry = ExpiryIndex(journal_path)
+        for key, (_, size, digest) in self.expiry.entries.items():
+            self.policy.add(key, size)
+            self.refs[digest] += 1
+        self.reap_expired()
+        self.evict_over_budget()
+
+    def meta_name(self, key):
+        """
+        Bản .meta (tiêu đề và thông tin hạn dùng) của một khoá được lưu dưới tên sha256 của khoá
+        (loại "meta"): tên không phụ thuộc độ dài hay ký tự của URL. Phần thân được lưu theo sha256
+        của nội dung (loại "data"): các URL khác nhau có cùng nội dung (ví dụ cùng một ảnh) dùng chung một bản.
+        """
+        return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """
+        Lấy phản hồi đã lưu cho một khoá cache.
+
+        Args:
+            key (str): Khoá cache.
+
+        Returns:
+            CacheEntry hoặc None: Phản hồi đã lưu (phần thân chưa được đọc, xem CacheEntry.from_meta),
+            hoặc None nếu không tìm thấy.
+        """
+        entry = self.load(self.store, key)
+        if entry is None and self.peers:
+            entry = self.adopt(key)
+        if entry is None:
+            return None
+        self.touch(key)
+        return entry
+
+    def load(self, store, key):
+        """
+        Đọc bản .meta của khoá trong một kho và kiểm tra phần thân của nó còn trên đĩa.
+        """
+        try:
+            raw = store.read("meta", self.meta_name(key))
+            if raw is None:
+                return None
+            meta = json.loads(bytes(raw))
+            if meta["url"] != key:
+                return None
+            location = store.locate("data", meta["digest"])
+            if location is None or location[2] != meta["size"]:
+                return None
+        except (OSError, ValueError, KeyError):
+            return None
+        return CacheEntry.from_meta(meta, location)
+
+    def adopt(self, key):
+        """
+        Chép mục do worker khác lưu sang kho của worker này (các worker chỉ đọc kho của nhau, không
+        bao giờ xoá trong đó). Bản chép được ghi vào chỉ mục và tính vào giới hạn như mọi mục khác,
+        nên nó tồn tại độc lập với việc worker kia xoá hay loại bản gốc.
+
+        Returns:
+            CacheEntry hoặc None: Bản đã chép trong kho của worker này.
+        """
+        for peer in self.peers:
+            entry = self.load(peer, key)
+            if entry is None or self.removal_time(entry) <= time.time():
+                continue
+            # Bản gốc có thể vừa bị worker kia xoá: khi đó đọc được ít hơn số byte ghi trong .meta
+            body = peer.read("data", entry.digest)
+            if body is None or len(body) != entry.body_size:
+                continue
+            entry.body = body
+            self.put(key, entry)
+            return self.load(self.store, key)
+        return None
+
+    def read_body(self, entry):
+        """
+        Đọc phần thân của một bản ghi lấy từ đĩa (trước khi đưa lên MemoryCache).
+
+        Returns:
+            bytes hoặc memoryview hoặc None: Phần thân, None nếu nó không còn trên đĩa.
+        """
+        try:
+            return self.store.read("data", entry.digest)
+        except (OSError, ValueError) as Error:
+            print(f"Error while reading cache data: {Error}")
+            return None
+
+    def touch(self, key):
+        """
+        Ghi nhận một lần dùng mục (cho chính sách loại bỏ), O(1) với LRU và O(log n) với LFU/GDSF.
+        """
+        with self.lock:
+            self.policy.touch(key)
+
+    def put(self, key, entry):
+        """
+        Lưu (hoặc cập nhật sau khi xác thực lại) một phản hồi; phần thân đã có trong kho thì không ghi lại.
+
+        Args:
+            key (str): Khoá cache.
+            entry (CacheEntry): Phản hồi cần lưu.
+        """
+        if self.max_bytes and entry.size() > self.max_bytes:
+            # Lưu một mục lớn hơn cả giới hạn sẽ đẩy mọi mục khác ra khỏi cache
+            return
+        if entry.digest is None:
+            entry.digest = hashlib.sha256(entry.body).hexdigest()
+        digest = entry.digest
+        # Giữ chỗ cho phần thân trước khi kiểm tra nó, để luồng đang xoá mục khác không xoá mất
+        with self.lock:
+            self.refs[digest] += 1
+        try:
+            if not self.store.exists("data", digest):
+                if entry.body is None:
+                    raise OSError(f"Cache object {digest} is missing")
+                self.store.write("data", digest, entry.body)
+            self.store.write("meta", self.meta_name(key), json.dumps(entry.to_meta()).encode("utf-8"))
+        except OSError as Error:
+            print(f"Error while writing cache data: {Error}")
+            self.release(digest)
+            return
+        old = self.expiry.push(key, self.removal_time(entry), entry.size(), digest)
+        if old is not None:
+            self.release(old[2])
+        with self.lock:
+            if old is None or old[2] != digest:
+                self.policy.add(key, entry.size())
+            else:
+                self.policy.touch(key)
+        self.evict_over_budget()
+
+    def release(self, digest):
+        """
+        Bỏ một tham chiếu tới phần thân; nó bị xoá khỏi kho khi không còn khoá nào dùng. Việc xoá nằm
+        trong self.lock để không chen vào giữa lúc put() giữ chỗ và kiểm tra cùng phần thân đó.
+        """
+        with self.lock:
+            self.refs[digest] -= 1
+            if self.refs[digest] > 0:
+                return
+            del self.refs[digest]
+            self.store.remove("data", digest)
+
+    def evict_over_budget(self):
+        """
+        Loại dần các mục theo chính sách cho tới khi trở lại trong giới hạn. Được gọi sau mỗi lần
+        lưu nên mỗi lần chỉ loại vài mục, không có lượt dọn dẹp lớn nào chặn các luồng khác.
+        """
+        while (self.max_bytes and self.expiry.total_bytes > self.max_bytes) or (self.max_entries and len(self.expiry) > self.max_entries):
+            with self.lock:
+                key = self.policy.evict()
+                if key is not None:
+                    self.evictions += 1
+            if key is None:
+                break
+            self.remove_files(key, self.expiry.discard(key))
+
+    def removal_time(self, entry):
+        """
+        Thời điểm xoá một mục khỏi đĩa: hết hạn dùng (và hết cửa sổ stale-while-revalidate) thì xoá,
+        trừ khi còn xác thực lại được (có ETag/Last-Modified), khi đó được giữ ít nhất cache_time giây kể từ khi lưu.
+        """
+        stale_until = entry.expires_at + entry.stale_window(self.stale_while_revalidate)
+        if entry.has_validators():
+            return max(stale_until, entry.stored_at + self.cache_time)
+        return stale_until
+
+    def delete(self, key):
+        """
+        Xoá phản hồi đã lưu (khi yêu cầu POST làm thay đổi tài nguyên).
+        """
+        record = self.expiry.discard(key)
+        with self.lock:
+            self.policy.remove(key)
+        self.remove_files(key, record)
+
+    def remove_files(self, key, record):
+        """
+        Xoá bản .meta của khoá và bỏ tham chiếu tới phần thân (record là bản ghi trong chỉ mục).
+        """
+        self.store.remove("meta", self.meta_name(key))
+        if record is not None:
+            self.release(record[2])
+        if self.on_evict is not None:
+            self.on_evict(key)
+
+    def reap_expired(self):
+        """
+        Xoá các mục đã tới thời điểm xoá, mỗi mục O(log n) nhờ heap thay vì quét cả thư mục.
+        """
+        for key, record in self.expiry.pop_expired(time.time()):
+            with self.lock:
+                self.policy.remove(key)
+            self.remove_files(key, record)
+
+    def start_reaper(self, interval=1.0):
+        """
+        Tạo luồng con (daemon) định kỳ xoá các mục hết hạn (và luồng thu gọn của kho lưu trữ).
+        """
+        self.store.start_compactor()
+        def reap_forever():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.reap_expired()
+                except Exception as Error:
+                    print(f"Error while deleting cache data: {Error}")
+
+        reaper_thread = threading.Thread(target=reap_forever, name="cache-reaper", daemon=True)
+        reaper_thread.start()
+
+    def stats(self):
+        """
+        Returns:
+            dict: Số mục, số byte trên đĩa và số mục đã bị loại vì vượt giới hạn.
+        """
+        return {
+            "disk_entries": len(self.expiry),
+            "disk_bytes": self.expiry.total_bytes,
+            "evictions": self.evictions,
+        }
+
+# Tầng cache trong bộ nhớ (LRU giới hạn theo số byte) đặt trước Cache trên đĩa
+class MemoryCache:
+    def __init__(self, disk_cache, max_bytes, max_object_size, hit_for_pass=0.0):
+        """
+        Khởi tạo tầng cache trong bộ nhớ.
+
+        Args:
+            disk_cache (Cache): Cache trên đĩa, là nơi lưu trữ chính của mọi dữ liệu.
+            max_bytes (int): Tổng số byte tối đa giữ trong bộ nhớ (0 = tắt tầng bộ nhớ).
+            max_object_size (int): Kích thước tối đa của một phản hồi được giữ trong bộ nhớ.
+            hit_for_pass (float): Số giây một khoá vừa có phản hồi không lưu được cache được bỏ qua
+                khi gộp yêu cầu (0 = tắt).
+        """
+        self.disk_cache = disk_cache
+        self.disk_cache.on_evict = self.forget
+        self.cache_time = disk_cache.cache_time
+        self.stale_while_revalidate = disk_cache.stale_while_revalidate
+        self.max_bytes = max_bytes
+        self.max_object_size = max_object_size
+        self.entries = collections.OrderedDict()  # khoá cache -> CacheEntry, mục dùng gần nhất ở cuối
+        self.size = 0
+        self.lock = threading.Lock()
+        self.fetching = {}        # khoá cache -> threading.Event của lượt tải đang chạy (engine luồng)
+        self.fetching_async = {}  # khoá cache -> asyncio.Future của lượt tải đang chạy (engine asyncio)
+        self.hit_for_pass = hit_for_pass
+        # khoá cache -> thời điểm (monotonic) hết hiệu lực của dấu "hit-for-pass"; cùng một thời hạn cho
+        # mọi khoá nên thứ tự chèn cũng là thứ tự hết hạn
+        self.passing = collections.OrderedDict()
+        self.hit_counts = collections.Counter()  # khoá cache -> số lần được dùng kể từ khi lưu
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def get_from_memory(self, key):
+        """
+        Chỉ tra tầng bộ nhớ (không chạm tới đĩa nên engine asyncio gọi trực tiếp được).
+
+        Returns:
+            CacheEntry hoặc None: Phản hồi đã lưu, hoặc None nếu không có trong bộ nhớ.
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+                self.memory_hits += 1
+        if entry is not None:
+            # Lượt dùng trong bộ nhớ cũng được tính để mục nóng không bị loại khỏi đĩa
+            self.disk_cache.touch(key)
+        return entry
+
+    def get(self, key):
+        """
+        Lấy phản hồi đã lưu: tra bộ nhớ trước, nếu không có thì đọc từ đĩa và đưa lên bộ nhớ.
+
+        Returns:
+            CacheEntry hoặc None: Phản hồi đã lưu, hoặc None nếu không tìm thấy.
+        """
+        entry = self.get_from_memory(key)
+        if entry is not None:
+            return entry
+        entry = self.disk_cache.get(key)
+        with self.lock:
+            if entry is not None:
+                self.disk_hits += 1
+            else:
+                self.misses += 1
+        if entry is not None and entry.content_length() <= self.max_object_size and entry.size() <= self.max_bytes:
+            # Phản hồi nhỏ được đọc vào bộ nhớ; phản hồi lớn được gửi thẳng từ tệp bằng sendfile
+            entry.body = self.disk_cache.read_body(entry)
+            if entry.body is None:
+                return None
+            self.promote(key, entry)
+        return entry
+
+    def lookup(self, key, request, memory_only=False):
+        """
+        Tìm phản hồi phù hợp với yêu cầu. Khoá của URL giữ biến thể được lưu gần nhất; nếu biến thể
+        đó không khớp Vary của yêu cầu thì tra tiếp khoá riêng của biến thể (variant_key).
+
+        Args:
+            key (str): Khoá cache của URL.
+            request (HTTPParser): Yêu cầu của client.
+            memory_only (bool): Chỉ tra tầng bộ nhớ (engine asyncio).
+
+        Returns:
+            CacheEntry hoặc None: Phản hồi khớp với yêu cầu, hoặc None.
+        """
+        get = self.get_from_memory if memory_only else self.get
+        entry = get(key)
+        if entry is None or entry.matches(request):
+            return entry
+        entry = get(variant_key(key, entry.vary_of(request)))
+        if entry is not None and entry.matches(request):
+            return entry
+        return None
+
+    def put(self, key, entry):
+        """
+        Ghi phản hồi xuống đĩa (ghi xuyên) rồi giữ một bản trong bộ nhớ. Phản hồi có Vary được lưu
+        dưới cả khoá của URL và khoá của biến thể; phần thân trên đĩa chỉ có một bản.
+        """
+        keys = [key]
+        if entry.vary:
+            keys.append(variant_key(key, entry.vary))
+        for store_key in keys:
+            self.disk_cache.put(store_key, entry)
+            self.promote(store_key, entry)
+        with self.lock:
+            self.hit_counts.pop(key, None)
+            # URL đã lưu được cache trở lại: các yêu cầu sau lại được gộp
+            self.passing.pop(key, None)
+
+    def wants_refresh(self, key, entry, now, refresh_ahead, refresh_min_hits):
+        """
+        Ghi nhận một lần dùng mục và cho biết có nên tải lại nó trong nền: bản đã hết hạn (đang được
+        trả trong cửa sổ stale-while-revalidate) luôn cần tải lại; bản còn hạn được tải lại trước khi
+        hết hạn refresh_ahead giây nếu đã được dùng ít nhất refresh_min_hits lần.
+        """
+        with self.lock:
+            self.hit_counts[key] += 1
+            hits = self.hit_counts[key]
+        if now >= entry.expires_at:
+            return True
+        return refresh_ahead > 0 and hits >= refresh_min_hits and entry.expires_at - now <= refresh_ahead
+
+    def begin_fetch(self, key):
+        """
+        Đăng ký một lượt tải khoá từ máy chủ gốc (engine luồng). Nhiều client cùng trượt cache một URL
+        thì chỉ yêu cầu đầu tiên hỏi máy chủ, các yêu cầu còn lại chờ nó lưu xong rồi đọc lại cache.
+
+        Returns:
+            threading.Event hoặc None: None nếu người gọi là lượt tải đầu tiên (phải gọi end_fetch khi xong),
+            ngược lại là Event sẽ được đặt khi lượt tải đang chạy kết thúc.
+        """
+        with self.lock:
+            waiter = self.fetching.get(key)
+            if waiter is not None:
+                self.coalesced += 1
+                return waiter
+            self.fetching[key] = threading.Event()
+        return None
+
+    def try_begin_fetch(self, key):
+        """
+        Như begin_fetch() nhưng không chờ và không tính vào số yêu cầu được gộp (dùng cho lượt tải lại trong nền).
+
+        Returns:
+            bool: True nếu đã đăng ký được lượt tải (phải gọi end_fetch khi xong), False nếu đang có lượt khác.
+        """
+        with self.lock:
+            if key in self.fetching:
+                return False
+            self.fetching[key] = threading.Event()
+        return True
+
+    def end_fetch(self, key, cacheable=True):
+        """
+        Kết thúc lượt tải và báo kết quả cho các yêu cầu đang chờ (waiter.cacheable). Lượt tải gọi
+        hàm này ngay khi biết phản hồi không lưu được cache, để các yêu cầu đang chờ đi thẳng tới
+        máy chủ gốc thay vì chờ nó chuyển tiếp xong phần thân.
+        """
+        with self.lock:
+            waiter = self.fetching.pop(key)
+            if not cacheable:
+                self.mark_pass(key)
+        waiter.cacheable = cacheable
+        waiter.set()
+
+    def mark_pass(self, key):
+        # Gọi khi đang giữ self.lock
+        if self.hit_for_pass <= 0:
+            return
+        now = time.monotonic()
+        self.passing.pop(key, None)
+        self.passing[key] = now + self.hit_for_pass
+        while self.passing:
+            oldest, deadline = next(iter(self.passing.items()))
+            if deadline > now:
+                break
+            del self.passing[oldest]
+
+    def passes(self, key):
+        """
+        Returns:
+            bool: True nếu URL vừa trả phản hồi không lưu được cache: yêu cầu không cần chờ lượt tải khác.
+        """
+        with self.lock:
+            deadline = self.passing.get(key)
+            if deadline is None:
+                return False
+            if deadline > time.monotonic():
+                return True
+            del self.passing[key]
+            return False
+
+    def begin_fetch_async(self, key):
+        """
+        Như begin_fetch() cho engine asyncio (chỉ được gọi trong event loop).
+
+        Returns:
+            asyncio.Future hoặc None: None nếu người gọi là lượt tải đầu tiên (phải gọi end_fetch_async khi xong).
+        """
+        future = self.fetching_async.get(key)
+        if future is not None:
+            with self.lock:
+                self.coalesced += 1
+            return future
+        self.fetching_async[key] = asyncio.get_running_loop().create_future()
+        return None
+
+    def try_begin_fetch_async(self, key):
+        """
+        Như try_begin_fetch() cho engine asyncio (chỉ được gọi trong event loop).
+        """
+        if key in self.fetching_async:
+            return False
+        self.fetching_async[key] = asyncio.get_running_loop().create_future()
+        return True
+
+    def end_fetch_async(self, key, cacheable=True):
+        # Kết quả của Future là cacheable (xem end_fetch)
+        if not cacheable:
+            with self.lock:
+                self.mark_pass(key)
+        self.fetching_async.pop(key).set_result(cacheable)
+
+    def delete(self, key):
+        self.forget(key)
+        self.disk_cache.delete(key)
+
+    def forget(self, key):
+        """
+        Bỏ bản trong bộ nhớ của một khoá (khi mục bị xoá hoặc hết hạn trên đĩa).
+        """
+        with self.lock:
+            self.hit_counts.pop(key, None)
+            entry = self.entries.pop(key, None)
+            if entry is not None:
+                self.size -= entry.size()
+
+    def promote(self, key, entry):
+        """
+        Đưa phản hồi lên tầng bộ nhớ; các phản hồi ít dùng nhất bị hạ xuống (chỉ còn trên đĩa) khi vượt quá max_bytes.
+        """
+        size = entry.size()
+        if entry.body is None or len(entry.body) > self.max_object_size or size > self.max_bytes:
+            return
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.size -= old.size()
+            self.entries[key] = entry
+            self.size += size
+            while self.size > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.size -= evicted.size()
+
+    def stats(self):
+        """
+        Returns:
+            dict: Số mục, số byte trong bộ nhớ và các bộ đếm hit/miss của hai tầng.
+        """
+        with self.lock:
+            stats = {
+                "memory_entries": len(self.entries),
+                "memory_bytes": self.size,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+            }
+        stats.update(self.disk_cache.stats())
+        return stats
+
+# Bộ đệm phân giải tên miền (DNS) dùng chung cho mọi kết nối
+class DNSCache:
+    def __init__(self, positive_ttl, negative_ttl, max_entries):
+        """
+        Khởi tạo bộ đệm DNS.
+
+        Args:
+            positive_ttl (float): Thời gian (giây) giữ một kết quả phân giải thành công.
+            negative_ttl (float): Thời gian (giây) nhớ rằng một tên miền không phân giải được.
+            max_entries (int): Số tên miền tối đa được giữ; vượt quá thì bỏ mục cũ nhất.
+        """
+        self.positive_ttl = positive_ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self.entries = {}         # host -> (địa chỉ IP hoặc None, thời điểm hết hạn)
+        self.in_flight = {}       # host -> threading.Event của lượt phân giải đang chạy (engine luồng)
+        self.in_flight_async = {} # host -> asyncio.Future của lượt phân giải đang chạy (engine asyncio)
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def lookup(self, host):
+        """
+        Tra bộ đệm (phải giữ self.lock khi gọi).
+
+        Returns:
+            tuple: (found, ip_address); found = False nếu chưa có hoặc đã hết hạn.
+        """
+        entry = self.entries.get(host)
+        if entry is None:
+            return False, None
+        ip_address, expires_at = entry
+        if expires_at <= time.monotonic():
+            del self.entries[host]
+            return False, None
+        if ip_address is None:
+            self.negative_hits += 1
+        else:
+            self.hits += 1
+        return True, ip_address
+
+    def store(self, host, ip_address):
+        """
+        Lưu kết quả phân giải (phải giữ self.lock khi gọi); kết quả thất bại dùng negative_ttl.
+        """
+        ttl = self.positive_ttl if ip_address is not None else self.negative_ttl
+        if host not in self.entries and len(self.entries) >= self.max_entries:
+            # Dict giữ thứ tự chèn: mục đầu tiên là mục cũ nhất
+            del self.entries[next(iter(self.entries))]
+        self.entries[host] = (ip_address, time.monotonic() + ttl)
+
+    def resolve(self, host):
+        """
+        Phân giải tên miền (engine luồng). Nhiều luồng cùng hỏi một tên miền chưa có trong
+        bộ đệm thì chỉ luồng đầu tiên gọi gethostbyname, các luồng còn lại chờ kết quả đó.
+
+        Args:
+            host (str): Tên miền cần phân giải.
+
+        Returns:
+            str hoặc None: Địa chỉ IP, hoặc None nếu không phân giải được.
+        """
+        with self.lock:
+            found, ip_address = self.lookup(host)
+            if found:
+                return ip_address
+            waiter = self.in_flight.get(host)
+            owner = waiter is None
+            if owner:
+                waiter = self.in_flight[host] = threading.Event()
+                self.misses += 1
+            else:
+                self.coalesced += 1
+
+        if not owner:
+            waiter.wait()
+            with self.lock:
+                entry = self.entries.get(host)
+            if entry is None:
+                # Lượt phân giải đang chờ gặp lỗi bất thường và không để lại kết quả: tự phân giải lại
+                return self.resolve(host)
+            return entry[0]
+
+        try:
+            ip_address = get_ip_from_domain_name(host)
+            # None (tên miền không phân giải được) được nhớ trong negative_ttl; lỗi bất thường thì không lưu gì
+            with self.lock:
+                self.store(host, ip_address)
+        finally:
+            with self.lock:
+                del self.in_flight[host]
+            waiter.set()
+        return ip_address
+
+    async def resolve_async(self, host):
+        """
+        Phân giải tên miền mà không chặn event loop (engine asyncio), cùng bộ đệm và cùng cách
+        gộp các lượt hỏi trùng nhau như resolve().
+
+        Returns:
+            str hoặc None: Địa chỉ IP, hoặc None nếu không phân giải được.
+        """
+        with self.lock:
+            found, ip_address = self.lookup(host)
+            if found:
+                return ip_address
+            future = self.in_flight_async.get(host)
+            if future is not None:
+                self.coalesced += 1
+            else:
+                self.misses += 1
+
+        if future is not None:
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise
+                # Lượt phân giải đang chờ bị huỷ hoặc gặp lỗi bất thường: tự phân giải lại
+                return await self.resolve_async(host)
+
+        loop = asyncio.get_running_loop()
+        future = self.in_flight_async[host] = loop.create_future()
+        try:
+            try:
+                addresses = await loop.getaddrinfo(host, None, family=socket.AF_INET, type=socket.SOCK_STREAM)
+                ip_address = addresses[0][4][0]
+            except (socket.gaierror, UnicodeError):
+                ip_address = None
+        except BaseException:
+            # Bị huỷ (CancelledError) hoặc lỗi khác: không ghi gì vào bộ đệm, các lượt đang chờ sẽ tự thử lại
+            del self.in_flight_async[host]
+            future.cancel()
+            raise
+        with self.lock:
+            self.store(host, ip_address)
+        del self.in_flight_async[host]
+        future.set_result(ip_address)
+        return ip_address
+
+    def stats(self):
+        """
+        Returns:
+            dict: Các bộ đếm hit/miss của bộ đệm DNS.
+        """
+        with self.lock:
+            return {
+                "entries": len(self.entries),
+                "hits": self.hits,
+                "negative_hits": self.negative_hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+            }
+
+# Pool các kết nối giữ sống (keep-alive) tới máy chủ gốc, phân theo (host, port)
+class UpstreamPool:
+    def __init__(self, max_per_host, max_idle_per_host, idle_timeout, connect_timeout, read_timeout, resolver):
+        """
+        Khởi tạo pool kết nối tới máy chủ gốc.
+
+        Args:
+            max_per_host (int): Số kết nối tối đa (đang dùng + đang rảnh) tới một host:port.
+            max_idle_per_host (int): Số kết nối rảnh tối đa được giữ lại cho một host:port.
+            idle_timeout (float): Thời gian (giây) một kết nối được phép rảnh trước khi bị đóng.
+            connect_timeout (float): Thời gian chờ kết nối (và chờ pool có chỗ trống).
+            read_timeout (float): Thời gian chờ dữ liệu từ máy chủ.
+            resolver (DNSCache): Bộ đệm DNS dùng khi mở kết nối mới.
+        """
+        self.max_per_host = max_per_host
+        self.max_idle_per_host = max_idle_per_host
+        self.idle_timeout = idle_timeout
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.resolver = resolver
+        self.idle = {}        # (host, port) -> [(kết nối, thời điểm được trả về pool)]
+        self.open_count = {}  # (host, port) -> số kết nối đang mở (đang dùng + đang rảnh)
+        self.lock = threading.Lock()
+        self.available = threading.Condition(self.lock)
+
+    def start_reaper(self):
+        """
+        Tạo luồng con (daemon) định kỳ đóng các kết nối rảnh quá idle_timeout.
+        """
+        def reap_forever():
+            while True:
+                time.sleep(self.idle_timeout)
+                self.reap_idle()
+
+        reaper_thread = threading.Thread(target=reap_forever, name="upstream-pool-reaper", daemon=True)
+        reaper_thread.start()
+
+    def reap_idle(self):
+        """
+        Đóng các kết nối đã rảnh lâu hơn idle_timeout.
+        """
+        now = time.monotonic()
+        expired = []
+        with self.lock:
+            for key, connections in self.idle.items():
+                fresh = [(connection, released_at) for connection, released_at in connections if now - released_at < self.idle_timeout]
+                if len(fresh) == len(connections):
+                    continue
+                for connection, released_at in connections:
+                    if now - released_at >= self.idle_timeout:
+                        expired.append(connection)
+                        self.open_count[key] -= 1
+                connections[:] = fresh
+                self.notify(key)
+        for connection in expired:
+            self.close_connection(connection)
+
+    def pop_idle(self, key):
+        """
+        Lấy kết nối rảnh được dùng gần nhất còn sống (phải giữ self.lock khi gọi).
+
+        Returns:
+            Kết nối còn dùng được hoặc None.
+        """
+        now = time.monotonic()
+        connections = self.idle.get(key)
+        while connections:
+            connection, released_at = connections.pop()
+            if now - released_at < self.idle_timeout and self.is_alive(connection):
+                return connection
+            # Kết nối đã hết hạn hoặc bị máy chủ đóng: bỏ đi
+            self.open_count[key] -= 1
+            self.close_connection(connection)
+        return None
+
+    def acquire(self, host, port):
+        """
+        Lấy một kết nối tới host:port: ưu tiên kết nối rảnh trong pool, nếu không có thì mở
+        kết nối mới; nếu đã đạt max_per_host thì chờ tối đa connect_timeout giây.
+
+        Returns:
+            tuple: (kết nối, reused) với reused = True nếu kết nối được lấy lại từ pool.
+        """
+        key = (host, port)
+        deadline = time.monotonic() + self.connect_timeout
+        with self.lock:
+            while True:
+                connection = self.pop_idle(key)
+                if connection is not None:
+                    return connection, True
+                if self.open_count.get(key, 0) < self.max_per_host:
+                    self.open_count[key] = self.open_count.get(key, 0) + 1
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise OSError(f"Too many connections to {host}:{port}")
+                self.available.wait(remaining)
+
+        try:
+            return self.open_connection(host, port), False
+        except Exception:
+            self.forget(key)
+            raise
+
+    def release(self, host, port, connection, reusable):
+        """
+        Trả kết nối về pool nếu còn dùng lại được, ngược lại đóng nó.
+
+        Args:
+            host (str): Tên miền của máy chủ.
+            port (int): Cổng của máy chủ.
+            connection: Kết nối đã lấy bằng acquire().
+            reusable (bool): Phản hồi đã được đọc trọn vẹn và máy chủ không yêu cầu đóng kết nối.
+        """
+        key = (host, port)
+        with self.lock:
+            connections = self.idle.setdefault(key, [])
+            if reusable and len(connections) < self.max_idle_per_host:
+                connections.append((connection, time.monotonic()))
+                self.notify(key)
+                return
+        self.close_connection(connection)
+        self.forget(key)
+
+    def forget(self, key):
+        """
+        Giảm số kết nối đang mở của key sau khi một kết nối bị đóng hoặc mở thất bại.
+        """
+        with self.lock:
+            self.open_count[key] -= 1
+            self.notify(key)
+
+    def notify(self, key):
+        """
+        Đánh thức các yêu cầu đang chờ pool có chỗ trống (phải giữ self.lock khi gọi).
+        """
+        self.available.notify_all()
+
+    def open_connection(self, host, port):
+        """
+        Mở một kết nối TCP mới tới máy chủ.
+        """
+        ip_address = self.resolver.resolve(host)
+        if ip_address is None:
+            raise OSError(f"Can't resolve {host}")
+        started = time.monotonic()
+        server = socket.create_connection((ip_address, port), timeout=self.connect_timeout)
+        METRICS.observe("proxy_upstream_connect_seconds", time.monotonic() - started)
+        server.settimeout(self.read_timeout)
+        return server
+
+    def is_alive(self, connection):
+        """
+        Kiểm tra nhanh (không chặn) kết nối rảnh còn sống: một socket rảnh mà "có dữ liệu để đọc"
+        nghĩa là máy chủ đã đóng kết nối (EOF) hoặc gửi dữ liệu thừa, cả hai đều không dùng lại được.
+        """
+        try:
+            readable, _, _ = select.select([connection], [], [], 0)
+        except (OSError, ValueError):
+            return False
+        return not readable
+
+    def close_connection(self, connection):
+        try:
+            connection.close()
+        except OSError:
+            pass
+
+# Phiên bản của UpstreamPool cho engine asyncio, kết nối là cặp (StreamReader, StreamWriter)
+class AsyncUpstreamPool(UpstreamPool):
+    def __init__(self, *args):
+        super().__init__(*args)
+        self.waiters = {}  # (host, port) -> các future đang chờ pool có chỗ trống
+
+    def start_reaper(self):
+        """
+        Tạo task định kỳ đóng các kết nối rảnh quá idle_timeout trên event loop hiện tại.
+        """
+        async def reap_forever():
+            while True:
+                await asyncio.sleep(self.idle_timeout)
+                self.reap_idle()
+
+        self.reaper_task = asyncio.get_running_loop().create_task(reap_forever())
+
+    async def acquire(self, host, port):
+        key = (host, port)
+        deadline = time.monotonic() + self.connect_timeout
+        while True:
+            with self.lock:
+                connection = self.pop_idle(key)
+                if connection is not None:
+                    return connection, True
+                if self.open_count.get(key, 0) < self.max_per_host:
+                    self.open_count[key] = self.open_count.get(key, 0) + 1
+                    break
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise OSError(f"Too many connections to {host}:{port}")
+            waiter = asyncio.get_running_loop().create_future()
+            self.waiters.setdefault(key, []).append(waiter)
+            try:
+                await asyncio.wait_for(waiter, remaining)
+            except asyncio.TimeoutError:
+                pass
+            finally:
+                if waiter in self.waiters.get(key, []):
+                    self.waiters[key].remove(waiter)
+
+        try:
+            return await self.open_connection(host, port), False
+        except Exception:
+            self.forget(key)
+            raise
+
+    def notify(self, key):
+        for waiter in self.waiters.pop(key, []):
+            if not waiter.done():
+                waiter.set_result(None)
+
+    async def open_connection(self, host, port):
+        ip_address = await self.resolver.resolve_async(host)
+        if ip_address is None:
+            raise OSError(f"Can't resolve {host}")
+        started = time.monotonic()
+        connection = await asyncio.wait_for(asyncio.open_connection(ip_address, port), self.connect_timeout)
+        METRICS.observe("proxy_upstream_connect_seconds", time.monotonic() - started)
+        return connection
+
+    def is_alive(self, connection):
+        server_reader, server_writer = connection
+        return not server_writer.is_closing() and not server_reader.at_eof()
+
+    def close_connection(self, connection):
+        connection[1].close()
+
+# Tải cấu hình từ config.ini
+def read_Config_File(filename):
+    """
+    Đọc các thiết lập cấu hình từ tệp được chỉ định.
+    Tham số:
+        filename (str): Tên của tệp cấu hình.
+    Trả về:
+        ProxyPolicy hoặc None: Các thiết lập cache_time, whitelisting (Whitelist đã biên dịch), và time_range
+        từ tệp cấu hình; None nếu tệp thiếu hoặc có giá trị không hợp lệ.
+    """
+    config = configparser.ConfigParser()
+    try:
+        config.read(filename)
+        cache_time = int(config["ProxyConfig"]["cache_time"])
+        whitelisting = Whitelist(
+            domain.strip()
+            for domain in config["ProxyConfig"]["whitelisting"].split(",")
+        )
+        time_range = tuple(int(t) for t in config["ProxyConfig"]["time"].split("-"))
+        if cache_time < 0:
+            raise ValueError(f"cache_time must not be negative: {cache_time}")
+        if len(time_range) != 2 or not all(0 <= hour <= 23 for hour in time_range):
+            raise ValueError(f"time must look like 7-23: {config['ProxyConfig']['time']}")
+        return ProxyPolicy(cache_time, whitelisting, time_range)
+    except Exception as Error:
+        print(f"Error in reading config.ini file: {Error}")
+        return None
+
+# Các thiết lập [ProxyConfig] đã được kiểm tra và biên dịch; không bao giờ bị sửa, chỉ được thay nguyên khối
+ProxyPolicy = collections.namedtuple("ProxyPolicy", ["cache_time", "whitelisting", "time_range"])
+
+# Theo dõi config.ini và thay ProxyPolicy đang dùng khi tệp thay đổi, không cần khởi động lại proxy
+class ConfigWatcher:
+    def __init__(self, filename, policy, interval):
+        """
+        Args:
+            filename (str): Tên của tệp cấu hình.
+            policy (ProxyPolicy): Chính sách đọc được lúc khởi động.
+            interval (float): Chu kỳ (giây) kiểm tra thời điểm sửa của tệp (0 = chỉ nạp lại khi nhận SIGHUP).
+        """
+        self.filename = filename
+        # Việc đọc/gán một thuộc tính là nguyên tử: mỗi yêu cầu lấy self.policy một lần và
+        # luôn thấy một chính sách hoàn chỉnh, cũ hoặc mới, không bao giờ lẫn giữa hai bản
+        self.policy = policy
+        self.interval = interval
+        self.listeners = []  # các hàm được gọi với chính sách mới sau mỗi lần nạp lại
+        self.wake = threading.Event()
+        self.version = self.file_version()
+
+    def file_version(self):
+        try:
+            stat = os.stat(self.filename)
+            return stat.st_mtime_ns, stat.st_size
+        except OSError:
+            return None
+
+    def reload(self):
+        """
+        Đọc lại tệp cấu hình (ngoài luồng xử lý yêu cầu); tệp lỗi thì giữ nguyên chính sách đang dùng.
+        """
+        policy = read_Config_File(self.filename)
+        if policy is None:
+            print("Keeping the previous configuration")
+            return
+        self.policy = policy
+        for listener in self.listeners:
+            listener(policy)
+        print(f"Configuration reloaded: cache_time={policy.cache_time}, {len(policy.whitelisting)} whitelisted domains, time={policy.time_range[0]}-{policy.time_range[1]}")
+
+    def start(self):
+        """
+        Tạo luồng con (daemon) theo dõi tệp cấu hình; SIGHUP (nếu hệ điều hành hỗ trợ) buộc nạp lại ngay.
+        """
+        def watch_forever():
+            while True:
+                forced = self.wake.wait(self.interval or None)
+                self.wake.clear()
+                version = self.file_version()
+                if forced or version != self.version:
+                    self.version = version
+                    try:
+                        self.reload()
+                    except Exception as Error:
+                        print(f"Error while reloading config.ini: {Error}")
+
+        watcher_thread = threading.Thread(target=watch_forever, name="config-watcher", daemon=True)
+        watcher_thread.start()
+        if hasattr(signal, "SIGHUP"):
+            # Trình xử lý tín hiệu chỉ đánh thức luồng theo dõi, việc đọc tệp không chạy trong luồng chính
+            signal.signal(signal.SIGHUP, lambda signum, frame: self.wake.set())
+
+# Đọc các tuỳ chọn vận hành (engine, ...) từ config.ini
+def read_Server_Options(filename):
+    """
+    Đọc các tuỳ chọn vận hành của proxy từ tệp cấu hình, mục nào thiếu thì dùng giá trị trong DEFAULT_OPTIONS.
+    Tham số:
+        filename (str): Tên của tệp cấu hình.
+    Trả về:
+        dict: Từ điển {tên tuỳ chọn: giá trị}, giá trị được chuyển về cùng kiểu với giá trị mặc định.
+    """
+    config = configparser.ConfigParser()
+    try:
+        config.read(filename)
+    except Exception as Error:
+        print(f"Error in reading config.ini file: {Error}")
+
+    options = {}
+    for section, defaults in DEFAULT_OPTIONS.items():
+        for key, default in defaults.items():
+            try:
+                if isinstance(default, bool):
+                    value = config.getboolean(section, key, fallback=default)
+                elif isinstance(default, int):
+                    value = config.getint(section, key, fallback=default)
+                elif isinstance(default, float):
+                    value = config.getfloat(section, key, fallback=default)
+                else:
+                    value = config.get(section, key, fallback=default).strip()
+            except ValueError as Error:
+                print(f"Invalid value for '{key}' in config.ini, using default {default!r}: {Error}")
+                value = default
+            options[key] = value
+    return options
+
+# Kiểm tra xem một tên miền có nằm trong whitelist hay không
+def is_whitelisted(host, whitelist):
+    """
+    Kiểm tra xem một tên miền cụ thể có nằm trong danh sách trắng hay không, theo từng nhãn tên miền.
+    Tham số:
+        host (str): Tên máy chủ mà proxy sẽ kết nối tới (đã tách khỏi URL, không có cổng hay user@).
+        whitelist (Whitelist): Danh sách trắng đã biên dịch.
+    Trả về:
+        bool: True nếu tên miền nằm trong danh sách trắng, False nếu ngược lại.
+    """
+    return bool(host) and host in whitelist
+
+# Danh sách trắng tên miền được biên dịch thành cây hậu tố theo nhãn (com -> example -> www)
+class Whitelist:
+    def __init__(self, domains):
+        """
+        Mỗi mục có dạng:
+            "example.com"   : example.com và mọi tên miền con (www.example.com, a.b.example.com)
+            "*.example.com" : chỉ các tên miền con của example.com
+            "*"             : mọi tên miền
+        Tra cứu tốn O(số nhãn của host), không phụ thuộc số mục trong danh sách.
+
+        Args:
+            domains (iterable): Các mục của danh sách trắng (mục rỗng bị bỏ qua).
+        """
+        self.root = {}
+        self.domains = []
+        for domain in domains:
+            self.add(domain)
+
+    def add(self, domain):
+        domain = domain.strip().lower().rstrip(".")
+        if not domain:
+            return
+        labels = domain.split(".")
+        # Nút cuối đánh dấu "" (cả tên miền đó và tên miền con) hoặc "*" (chỉ tên miền con);
+        # hai khoá này không thể là một nhãn tên miền
+        marker = ""
+        if labels[0] == "*":
+            labels, marker = labels[1:], "*"
+        node = self.root
+        for label in reversed(labels):
+            node = node.setdefault(label, {})
+        node[marker] = True
+        self.domains.append(domain)
+
+    def __contains__(self, host):
+        labels = host.lower().rstrip(".").split(".")
+        node = self.root
+        for label in reversed(labels):
+            if "*" in node:
+                return True
+            node = node.get(label)
+            if node is None:
+                return False
+            if "" in node:
+                return True
+        return False
+
+    def __len__(self):
+        return len(self.domains)
+
+# Kiểm tra xem client có nhận một kiểu nén (gzip, deflate) theo Accept-Encoding hay không
+def accepts_encoding(request, coding):
+    """
+    Tham số:
+        request (HTTPParser): Yêu cầu của client.
+        coding (str): Tên kiểu nén (chữ thường).
+    Trả về:
+        bool: True nếu Accept-Encoding liệt kê kiểu nén đó (hoặc "*") với q > 0.
+    """
+    quality = {}
+    for item in request.header(b"accept-encoding", b"").decode("latin-1").lower().split(","):
+        name, _, params = item.partition(";")
+        value = 1.0
+        for param in params.split(";"):
+            key, _, number = param.strip().partition("=")
+            if key == "q":
+                try:
+                    value = float(number)
+                except ValueError:
+                    value = 0.0
+        quality[name.strip()] = value
+    return quality.get(coding, quality.get("*", 0.0)) > 0
+
+# Phản hồi do chính proxy tạo ra (403, 502, ...), được dựng sẵn thành bytes cùng một bản nén gzip
+class StaticResponse:
+    def __init__(self, status, content_type, body=b"", file_path=None, headers=()):
+        """
+        Args:
+            status (bytes): Mã và lý do, ví dụ b"403 Forbidden".
+            content_type (bytes): Giá trị tiêu đề Content-Type.
+            body (bytes): Phần thân (khi không đọc từ tệp, hoặc khi không đọc được tệp).
+            file_path (str): Tệp chứa phần thân; được đọc lại khi tệp thay đổi.
+            headers (tuple): Các dòng tiêu đề thêm vào (bytes, dạng b"Name: value").
+        """
+        self.status = status
+        self.content_type = content_type
+        self.file_path = file_path
+        self.headers = headers
+        self.version = None
+        self.checked_at = time.monotonic()
+        # (bản thường, bản gzip): được thay nguyên khối nên luồng khác không thấy bản dựng dở
+        self.variants = self.build(body)
+        if file_path is not None:
+            self.reload()
+
+    def build(self, body):
+        """
+        Dựng phản hồi hoàn chỉnh (có Content-Length) và bản nén gzip nếu bản nén nhỏ hơn.
+        """
+        head = [b"HTTP/1.1 " + self.status, b"Content-Type: " + self.content_type, *self.headers, b"Connection: close"]
+        compressed = gzip.compress(body, 9, mtime=0)
+        if len(compressed) >= len(body):
+            plain = b"\r\n".join(head + [b"Content-Length: %d" % len(body)]) + b"\r\n\r\n" + body
+            return plain, plain
+        head.append(b"Vary: Accept-Encoding")
+        plain = b"\r\n".join(head + [b"Content-Length: %d" % len(body)]) + b"\r\n\r\n" + body
+        encoded = b"\r\n".join(head + [b"Content-Encoding: gzip", b"Content-Length: %d" % len(compressed)]) + b"\r\n\r\n" + compressed
+        return plain, encoded
+
+    def reload(self):
+        """
+        Đọc lại tệp phần thân nếu thời điểm sửa hoặc kích thước của nó đã thay đổi.
+        """
+        try:
+            stat = os.stat(self.file_path)
+            version = (stat.st_mtime_ns, stat.st_size)
+            if version == self.version:
+                return
+            with open(self.file_path, "rb") as file:
+                body = file.read()
+        except OSError as Error:
+            if self.version is not False:
+                print(f"Error in reading HTML file: {Error}")
+            self.version = False
+            return
+        self.variants = self.build(body)
+        self.version = version
+
+    def for_request(self, request=None):
+        """
+        Trả về phản hồi dựng sẵn phù hợp với Accept-Encoding của yêu cầu (request là None: bản thường).
+        Tệp phần thân được kiểm tra thay đổi tối đa mỗi giây một lần.
+        """
+        if self.file_path is not None and time.monotonic() - self.checked_at >= 1.0:
+            self.checked_at = time.monotonic()
+            self.reload()
+        plain, encoded = self.variants
+        if encoded is not plain and request is not None and accepts_encoding(request, "gzip"):
+            return encoded
+        return plain
+
+# Các phản hồi do proxy tạo ra, được dựng một lần lúc khởi động
+FORBIDDEN = StaticResponse(b"403 Forbidden", b"text/html", b"Error reading HTML file", file_path="403.html")
+BAD_GATEWAY = StaticResponse(b"502 Bad Gateway", b"text/plain", b"Proxy could not get a response from the origin server.\n")
+SERVICE_UNAVAILABLE = StaticResponse(b"503 Service Unavailable", b"text/plain", b"Proxy is overloaded, please retry later.\n", headers=(b"Retry-After: 1",))
+GATEWAY_TIMEOUT = StaticResponse(b"504 Gateway Timeout", b"text/plain", b"The origin server did not respond in time.\n")
+NOT_FOUND = StaticResponse(b"404 Not Found", b"text/plain", b"Not found.\n")
+BAD_REQUEST = StaticResponse(b"400 Bad Request", b"text/plain", b"The request could not be understood by the proxy.\n")
+PAYLOAD_TOO_LARGE = StaticResponse(b"413 Content Too Large", b"text/plain", b"The request body is larger than the proxy accepts.\n")
+
+# Gửi một phản hồi dựng sẵn (StaticResponse) và ghi nhận nó vào bản ghi của yêu cầu
+def send_static_response(client_socket, response, request=None, record=None):
+    data = response.for_request(request)
+    client_socket.sendall(data)
+    if record is not None:
+        record.sent(data)
+
+async def send_static_response_async(client_writer, response, request=None, record=None):
+    data = response.for_request(request)
+    client_writer.write(data)
+    await client_writer.drain()
+    if record is not None:
+        record.sent(data)
+
+# Các ngưỡng (giây) của histogram độ trễ
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Các nhóm số liệu do proxy tự đếm: tên -> (kiểu, mô tả)
+METRIC_FAMILIES = {
+    "proxy_requests_total": ("counter", "Requests handled, by method and response status."),
+    "proxy_cache_results_total": ("counter", "Requests by cache result (hit, stale, revalidated, miss, bypass)."),
+    "proxy_client_connections_total": ("counter", "Client connections accepted."),
+    "proxy_rejected_connections_total": ("counter", "Client connections rejected with 503 because the proxy was overloaded."),
+    "proxy_active_connections": ("gauge", "Client connections currently open."),
+    "proxy_bytes_received_total": ("counter", "Request bytes received from clients."),
+    "proxy_bytes_sent_total": ("counter", "Response bytes sent to clients (tunnel traffic excluded)."),
+    "proxy_request_duration_seconds": ("histogram", "Time from reading a request to the end of its response."),
+    "proxy_upstream_connect_seconds": ("histogram", "Time to open a TCP connection to an origin server."),
+    "proxy_upstream_ttfb_seconds": ("histogram", "Time from the request being written upstream to reading the response head (pool wait, DNS and connect excluded)."),
+    "proxy_access_log_dropped_total": ("counter", "Access log lines dropped because the log queue was full."),
+}
+# Phương thức lạ được gộp vào nhãn "OTHER" để số chuỗi số liệu không tăng theo dữ liệu của client
+METRIC_METHODS = ("GET", "HEAD", "POST", "CONNECT")
+
+# Bộ đếm số liệu của proxy: mỗi luồng ghi vào bảng riêng của nó, chỉ khi xuất số liệu mới cộng các bảng lại
+class Metrics:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        """
+        Luồng xử lý yêu cầu không phải giành khoá nào khi đếm (engine asyncio chỉ có một bảng).
+        Bảng của luồng đã kết thúc được gộp vào self.retired.
+
+        Args:
+            buckets (tuple): Các ngưỡng tăng dần của histogram.
+        """
+        self.buckets = buckets
+        self.bucket_labels = tuple((("le", repr(bucket)),) for bucket in buckets) + ((("le", "+Inf"),),)
+        self.local = threading.local()
+        self.shards = []                          # (luồng, bảng {(tên, nhãn): giá trị})
+        self.retired = collections.Counter()
+        self.lock = threading.Lock()              # chỉ giữ khi thêm bảng hoặc khi cộng các bảng
+        self.prune_at = 64
+        self.sources = []                         # (tiền tố, hàm trả về dict stats()) được đọc khi xuất số liệu
+
+    def shard(self):
+        shard = getattr(self.local, "shard", None)
+        if shard is None:
+            shard = self.local.shard = {}
+            with self.lock:
+                self.shards.append((threading.current_thread(), shard))
+                if len(self.shards) >= self.prune_at:
+                    # Engine "thread" tạo một luồng cho mỗi kết nối: gộp bảng của các luồng đã kết thúc
+                    self.fold()
+                    self.prune_at = max(64, 2 * len(self.shards))
+        return shard
+
+    def inc(self, name, value=1, labels=()):
+        shard = self.shard()
+        key = (name, labels)
+        shard[key] = shard.get(key, 0) + value
+
+    def observe(self, name, seconds):
+        """
+        Thêm một giá trị vào histogram.
+        """
+        shard = self.shard()
+        bucket = (name + "_bucket", self.bucket_labels[bisect.bisect_left(self.buckets, seconds)])
+        shard[bucket] = shard.get(bucket, 0) + 1
+        shard[(name + "_sum", ())] = shard.get((name + "_sum", ()), 0) + seconds
+        shard[(name + "_count", ())] = shard.get((name + "_count", ()), 0) + 1
+
+    def record_request(self, record):
+        """
+        Ghi nhận một yêu cầu đã xử lý xong (xem RequestRecord).
+        """
+        method = record.method.upper()
+        self.inc("proxy_requests_total", 1, (("method", method if method in METRIC_METHODS else "OTHER"), ("status", str(record.status))))
+        if record.cache:
+            self.inc("proxy_cache_results_total", 1, (("result", record.cache),))
+        self.inc("proxy_bytes_received_total", record.bytes_in)
+        self.inc("proxy_bytes_sent_total", record.bytes_out)
+        self.observe("proxy_request_duration_seconds", record.duration)
+        if record.upstream_time is not None:
+            self.observe("proxy_upstream_ttfb_seconds", record.upstream_time)
+
+    def fold(self):
+        """
+        Gộp bảng của các luồng đã kết thúc vào self.retired (phải giữ self.lock khi gọi).
+        """
+        live = []
+        for thread, shard in self.shards:
+            if thread.is_alive():
+                live.append((thread, shard))
+            else:
+                self.retired.update(shard)
+        self.shards = live
+
+    def collect(self):
+        """
+        Returns:
+            collections.Counter: Tổng của mọi bảng, {(tên, nhãn): giá trị}.
+        """
+        totals = collections.Counter()
+        with self.lock:
+            self.fold()
+            for _, shard in self.shards:
+                # dict() sao chép bảng trong một bước nên không lỗi khi luồng chủ đang ghi vào nó
+                totals.update(dict(shard))
+            totals.update(self.retired)
+        return totals
+
+    def render(self):
+        """
+        Returns:
+            bytes: Số liệu theo định dạng văn bản của Prometheus (phiên bản 0.0.4).
+        """
+        totals = self.collect()
+        lines = []
+        for name, (kind, description) in METRIC_FAMILIES.items():
+            lines.append(f"# HELP {name} {description}")
+            lines.append(f"# TYPE {name} {kind}")
+            if kind == "histogram":
+                cumulative = 0
+                for labels in self.bucket_labels:
+                    cumulative += totals.get((name + "_bucket", labels), 0)
+                    lines.append(f"{name}_bucket{format_labels(labels)} {cumulative}")
+                lines.append(f"{name}_sum {totals.get((name + '_sum', ()), 0)}")
+                lines.append(f"{name}_count {totals.get((name + '_count', ()), 0)}")
+                continue
+            samples = sorted((labels, value) for (key, labels), value in totals.items() if key == name) or [((), 0)]
+            for labels, value in samples:
+                lines.append(f"{name}{format_labels(labels)} {value}")
+        # Số liệu đã có sẵn trong cache và bộ đệm DNS: số mục/số byte là gauge, các bộ đếm là counter
+        for prefix, stats in self.sources:
+            for key, value in stats().items():
+                if key.endswith(("entries", "bytes")):
+                    lines.append(f"# TYPE {prefix}_{key} gauge")
+                    lines.append(f"{prefix}_{key} {value}")
+                else:
+                    lines.append(f"# TYPE {prefix}_{key}_total counter")
+                    lines.append(f"{prefix}_{key}_total {value}")
+        return ("\n".join(lines) + "\n").encode("utf-8")
+
+def format_labels(labels):
+    """
+    Định dạng nhãn của một chuỗi số liệu, ví dụ {method="GET",status="200"}.
+    """
+    if not labels:
+        return ""
+    pairs = []
+    for name, value in labels:
+        value = value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        pairs.append(f'{name}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+# Số liệu của tiến trình (mỗi tiến trình worker có bộ đếm và trang số liệu riêng)
+METRICS = Metrics()
+
+# Bản ghi của một yêu cầu: trạng thái, số byte, kết quả tra cache và thời gian xử lý
+class RequestRecord:
+    def __init__(self, client_address, request, client_data):
+        """
+        Args:
+            client_address (tuple): Địa chỉ của client (IP, port).
+            request (HTTPParser): Yêu cầu của client; None khi yêu cầu không phân tích được (trả lỗi 400).
+            client_data (bytes): Yêu cầu dạng thô (để đếm số byte nhận được).
+        """
+        self.client_address = client_address
+        if request is not None:
+            self.method = request.method
+            self.target = request.target
+            self.version = request.version
+            self.user_agent = request.header(b"user-agent")
+            self.referer = request.header(b"referer")
+        else:
+            self.method = "-"
+            self.target = "-"
+            self.version = None
+            self.user_agent = None
+            self.referer = None
+        self.timestamp = time.time()
+        self.status = 0              # mã trạng thái của phản hồi đã gửi (0 = chưa gửi gì)
+        self.cache = ""              # "hit", "stale", "revalidated", "miss", "bypass" hoặc "" (không tra cache)
+        self.bytes_in = len(client_data)
+        self.bytes_out = 0
+        self.started = time.monotonic()
+        self.upstream_time = None    # thời gian từ khi gửi xong yêu cầu lên máy chủ gốc tới khi có đủ tiêu đề phản hồi (giây)
+        self.duration = None
+
+    def sent(self, data):
+        """
+        Ghi nhận dữ liệu đã gửi cho client; mã trạng thái được lấy từ dòng trạng thái của lần gửi đầu tiên.
+        """
+        if not self.status:
+            try:
+                self.status = int(bytes(data[9:12]))
+            except ValueError:
+                pass
+        self.bytes_out += len(data)
+
+    def finish(self):
+        self.duration = time.monotonic() - self.started
+        METRICS.record_request(self)
+        ACCESS_LOG.write(self)
+
+# Nhật ký truy cập: mỗi yêu cầu một dòng, được định dạng và ghi bởi một luồng nền
+class AccessLog:
+    def __init__(self):
+        """
+        Luồng xử lý yêu cầu chỉ thêm bản ghi vào hàng đợi (deque.append, không khoá và không I/O);
+        luồng ghi định kỳ lấy hết các bản ghi đang chờ, định dạng và ghi chúng bằng một lần write().
+        Nhật ký chưa được start() thì mọi bản ghi bị bỏ qua.
+        """
+        self.queue = collections.deque()
+        self.started = False
+        self.path = None
+        self.file = None
+        self.size = 0
+
+    def start(self, path, log_format="json", queue_size=10000, flush_interval=0.5, max_bytes=10485760, backups=5):
+        """
+        Tạo luồng con (daemon) ghi nhật ký.
+
+        Args:
+            path (str): Tệp nhật ký, "-" để ghi ra stdout.
+            log_format (str): "json" hoặc "combined".
+            queue_size (int): Số bản ghi tối đa chờ ghi; vượt quá thì bản ghi mới bị bỏ.
+            flush_interval (float): Chu kỳ (giây) ghi một lô.
+            max_bytes (int): Kích thước tệp để xoay vòng (0 = không xoay vòng).
+            backups (int): Số tệp cũ được giữ lại (<tên>.1 là tệp mới nhất).
+        """
+        self.path = path
+        self.format = self.format_json if log_format == "json" else self.format_combined
+        self.queue_size = queue_size
+        self.flush_interval = flush_interval
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.started = True
+
+        def write_forever():
+            while True:
+                time.sleep(self.flush_interval)
+                try:
+                    self.flush()
+                except Exception as Error:
+                    print(f"Error while writing access log: {Error}")
+
+        writer_thread = threading.Thread(target=write_forever, name="access-log", daemon=True)
+        writer_thread.start()
+
+    def write(self, record):
+        """
+        Đưa một bản ghi (RequestRecord) vào hàng đợi; không bao giờ chặn luồng gọi.
+        """
+        if not self.started:
+            return
+        if len(self.queue) >= self.queue_size:
+            METRICS.inc("proxy_access_log_dropped_total")
+            return
+        self.queue.append(record)
+
+    def flush(self):
+        """
+        Ghi tất cả bản ghi đang chờ (chạy trên luồng ghi).
+        """
+        lines = []
+        while True:
+            try:
+                lines.append(self.format(self.queue.popleft()))
+            except IndexError:
+                break
+        if not lines:
+            return
+        data = "".join(lines).encode("utf-8")
+        if self.path == "-":
+            sys.stdout.buffer.write(data)
+            sys.stdout.flush()
+            return
+        if self.file is None:
+            self.file = open(self.path, "ab")
+            self.size = os.fstat(self.file.fileno()).st_size
+        if self.max_bytes and self.size and self.size + len(data) > self.max_bytes:
+            self.rotate()
+        self.file.write(data)
+        self.file.flush()
+        self.size += len(data)
+
+    def rotate(self):
+        """
+        Đổi tên <tên>.1 -> <tên>.2 ... (bỏ tệp cũ nhất), tệp hiện tại thành <tên>.1, rồi mở tệp mới.
+        """
+        self.file.close()
+        for index in range(self.backups - 1, 0, -1):
+            if os.path.exists(f"{self.path}.{index}"):
+                os.replace(f"{self.path}.{index}", f"{self.path}.{index + 1}")
+        if self.backups > 0:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+        self.file = open(self.path, "ab")
+        self.size = 0
+
+    def format_json(self, record):
+        return json.dumps({
+            "time": datetime.datetime.fromtimestamp(record.timestamp, datetime.timezone.utc).isoformat(timespec="milliseconds"),
+            "client": record.client_address[0] if record.client_address else None,
+            "method": record.method,
+            "target": record.target,
+            "version": (record.version or b"").decode("latin-1"),
+            "status": record.status,
+            "cache": record.cache or None,
+            "bytes_in": record.bytes_in,
+            "bytes_out": record.bytes_out,
+            "duration_ms": round(record.duration * 1000, 3),
+            "upstream_ms": round(record.upstream_time * 1000, 3) if record.upstream_time is not None else None,
+            "user_agent": record.user_agent.decode("latin-1") if record.user_agent is not None else None,
+            "referer": record.referer.decode("latin-1") if record.referer is not None else None,
+        }) + "\n"
+
+    def format_combined(self, record):
+        """
+        Định dạng "combined" của Apache/nginx, thêm kết quả tra cache và thời gian xử lý (giây) ở cuối dòng.
+        """
+        def quoted(value):
+            return "-" if value is None else value.decode("latin-1").replace("\\", "\\\\").replace('"', '\\"')
+
+        client = record.client_address[0] if record.client_address else "-"
+        timestamp = time.strftime("%d/%b/%Y:%H:%M:%S %z", time.localtime(record.timestamp))
+        request_line = quoted(f"{record.method} {record.target} ".encode("latin-1", "replace") + (record.version or b""))
+        return f'{client} - - [{timestamp}] "{request_line}" {record.status} {record.bytes_out} "{quoted(record.referer)}" "{quoted(record.user_agent)}" {record.cache or "-"} {record.duration:.3f}\n'
+
+# Nhật ký truy cập của tiến trình (được bật bởi Proxy_Worker theo [LogConfig])
+ACCESS_LOG = AccessLog()
+
+# Giải mã tăng dần phần thân dạng chunked khi dữ liệu tới theo từng mảnh
+class ChunkedDecoder:
+    def __init__(self):
+        """
+        Khởi tạo bộ giải mã ở trạng thái chờ dòng kích thước của chunk đầu tiên.
+        """
+        self.state = "size"   # "size" -> "data" -> "data_end" -> ... -> "trailer"
+        self.line = b""       # phần dòng (kích thước/trailer) chưa nhận đủ
+        self.remaining = 0    # số byte dữ liệu còn lại của chunk hiện tại
+        self.done = False
+
+    def feed(self, data):
+        """
+        Nạp thêm dữ liệu thô (còn mã hoá chunked).
+
+        Args:
+            data (bytes): Dữ liệu vừa nhận được.
+
+        Returns:
+            tuple: (parts, extra): parts là danh sách các đoạn dữ liệu đã giải mã;
+            extra là phần dữ liệu nằm sau chunk cuối (chỉ khác rỗng khi done = True).
+        """
+        parts = []
+        position = 0
+        size = len(data)
+        while position < size and not self.done:
+            if self.state == "data":
+                taken = min(self.remaining, size - position)
+                parts.append(data[position:position + taken])
+                position += taken
+                self.remaining -= taken
+                if self.remaining == 0:
+                    self.state = "data_end"
+                continue
+
+            line_end = data.find(b"\n", position)
+            if line_end < 0:
+                self.line += data[position:]
+                position = size
+                if len(self.line) > MAX_REQUEST_HEAD:
+                    raise ValueError("Chunk size line too long")
+                break
+            line = (self.line + data[position:line_end]).rstrip(b"\r")
+            self.line = b""
+            position = line_end + 1
+
+            if self.state == "size":
+                # Chỉ cho phép khoảng trắng trước phần mở rộng ";..." (RFC 9112 §7.1.1)
+                size_token = line.split(b";", 1)[0].rstrip(b" \t")
+                if not CHUNK_SIZE.fullmatch(size_token):
+                    raise ValueError(f"Invalid chunk size: {size_token[:32]!r}")
+                chunk_size = int(size_token, 16)
+                if chunk_size == 0:
+                    self.state = "trailer"
+                else:
+                    self.remaining = chunk_size
+                    self.state = "data"
+            elif self.state == "data_end":
+                if line:
+                    raise ValueError("Missing CRLF after chunk data")
+                self.state = "size"
+            elif not line:
+                # Dòng trống sau chunk cuối (và các trailer): phần thân kết thúc
+                self.done = True
+        return parts, data[position:]
+
+# Bộ phân tích HTTP/1.x tăng dần cho cả yêu cầu và phản hồi
+class HTTPParser:
+    def __init__(self, request_method=None):
+        """
+        Khởi tạo bộ phân tích một thông điệp HTTP. Dữ liệu được nạp dần bằng feed() ngay khi
+        nhận được, phần tiêu đề có thể trải dài qua nhiều lần nhận.
+
+        Args:
+            request_method (str): None để phân tích yêu cầu của client; khi phân tích phản hồi
+                thì là phương thức của yêu cầu tương ứng (phản hồi cho HEAD không có phần thân).
+        """
+        self.is_response = request_method is not None
+        self.request_method = request_method
+        self.state = "head"          # "head" -> "body" -> "done"
+        self.buffer = bytearray()    # phần tiêu đề chưa nhận đủ
+        self.head = b""              # phần tiêu đề đầy đủ, kể cả "\r\n\r\n"
+        self.method = None
+        self.target = None
+        self.version = None
+        self.status = None
+        self.header_index = None     # các tiêu đề đã tra cứu, chỉ được tạo khi header() được gọi lần đầu
+        self.lower_head = None
+        self.framing = None          # "none", "length", "chunked" hoặc "close"
+        self.remaining = 0           # số byte phần thân còn lại khi framing là "length"
+        self.chunked = None
+
+    @property
+    def done(self):
+        return self.state == "done"
+
+    def feed(self, data):
+        """
+        Nạp thêm dữ liệu. Một lần gọi không bao giờ vượt qua ranh giới tiêu đề/phần thân:
+        khi tiêu đề vừa đủ, feed() dừng lại để người gọi xử lý tiêu đề trước khi nạp phần thân.
+
+        Args:
+            data (bytes hoặc memoryview): Dữ liệu vừa nhận được.
+
+        Returns:
+            tuple: (parts, consumed): parts là các đoạn phần thân đã giải mã (chunked được bỏ
+            khung); consumed là số byte của data thuộc về thông điệp này, phần còn lại
+            data[consumed:] thuộc về thông điệp tiếp theo (hoặc là phần thân chưa nạp).
+        """
+        if self.state == "head":
+            return self.feed_head(data)
+        if self.state == "body":
+            return self.feed_body(data)
+        return [], 0
+
+    def feed_head(self, data):
+        start = len(self.buffer)
+        if start == 0:
+            # Trường hợp thường gặp: cả tiêu đề nằm trong một lần nhận, không cần sao chép vào bộ đệm
+            end = data.find(b"\r\n\r\n")
+            if end >= 0:
+                self.head = bytes(data[:end + 4])
+                self.parse_head()
+                return [], end + 4
+            self.buffer += data
+        else:
+            self.buffer += data
+            # Chỉ tìm trong phần mới nhận (lùi lại 3 byte phòng "\r\n\r\n" bị cắt giữa hai lần nhận)
+            end = self.buffer.find(b"\r\n\r\n", max(0, start - 3))
+            if end >= 0:
+                self.head = bytes(self.buffer[:end + 4])
+                self.buffer = bytearray()
+                self.parse_head()
+                return [], end + 4 - start
+        if len(self.buffer) > MAX_REQUEST_HEAD:
+            raise ValueError("Header too large")
+        return [], len(data)
+
+    def parse_head(self):
+        """
+        Phân tích dòng đầu tiên và xác định cách kết thúc phần thân (RFC 7230 mục 3.3.3).
+        Các tiêu đề khác chưa được giải mã cho tới khi cần. Yêu cầu có độ dài phần thân không rõ ràng
+        (Content-Length âm, nhiều giá trị khác nhau, hoặc đi cùng Transfer-Encoding) hoặc có dòng tiêu đề
+        sai dạng (khoảng trắng trước ":", dòng nối; cả với phản hồi) bị từ chối (ValueError) vì proxy và máy chủ gốc có thể
+        hiểu khác nhau chỗ kết thúc yêu cầu (request smuggling, RFC 9112 mục 5.1).
+        """
+        start_line = self.head[:self.head.index(b"\r\n")]
+        parts = start_line.split(b" ", 2)
+        if self.is_response:
+            if len(parts) < 2 or not parts[1].isdigit():
+                raise ValueError(f"Malformed status line: {start_line[:100]!r}")
+            self.version = parts[0]
+            self.status = int(parts[1])
+        else:
+            if len(parts) != 3:
+                raise ValueError(f"Malformed request line: {start_line[:100]!r}")
+            self.method = parts[0].decode("latin-1")
+            self.target = parts[1].decode("latin-1")
+            self.version = parts[2]
+        # header() chỉ nhận "\r\nTên:", nên "Tên :" sẽ bị bỏ qua trong khi máy chủ hoặc client khác có thể
+        # vẫn đọc nó (phản hồi sai dạng được người gọi trả về client thành 502)
+        if INVALID_HEADER_LINE.search(self.head, 0, len(self.head) - 2):
+            raise ValueError("Whitespace before colon or obsolete line folding in headers")
+
+        transfer_encoding = self.header(b"transfer-encoding")
+        content_length = self.header(b"content-length")
+        # Chỉ đọc được phần thân theo khung chunked khi "chunked" là mã hoá cuối cùng và chỉ xuất hiện một lần
+        codings = [] if transfer_encoding is None else [coding.strip() for coding in transfer_encoding.lower().split(b",")]
+        chunked = bool(codings) and codings[-1] == b"chunked" and codings.count(b"chunked") == 1
+        if not self.is_response and transfer_encoding is not None:
+            if content_length is not None:
+                raise ValueError("Request has both Transfer-Encoding and Content-Length")
+            if not chunked:
+                raise ValueError(f"Unsupported request Transfer-Encoding: {transfer_encoding[:100]!r}")
+        if content_length is not None:
+            # Các tiêu đề Content-Length trùng nhau (hoặc "n, n") chỉ được chấp nhận khi cùng một số không âm
+            lengths = {value.strip() for value in content_length.split(b",")}
+            if len(lengths) != 1 or not next(iter(lengths)).isdigit():
+                raise ValueError(f"Invalid Content-Length: {content_length[:100]!r}")
+        if self.is_response and (self.request_method.upper() == "HEAD" or self.status in (204, 304) or 100 <= self.status < 200):
+            self.framing = "none"
+        elif chunked:
+            self.framing = "chunked"
+            self.chunked = ChunkedDecoder()
+        elif self.is_response and transfer_encoding is not None:
+            # Phản hồi có Transfer-Encoding nhưng không kết thúc bằng chunked: đọc tới khi máy chủ
+            # đóng kết nối, bỏ qua Content-Length (RFC 9112 §6.3)
+            self.framing = "close"
+        elif content_length is not None:
+            self.framing = "length"
+            self.remaining = int(content_length.split(b",")[0].strip())
+        elif self.is_response:
+            self.framing = "close"
+        else:
+            self.framing = "none"
+
+        if self.framing == "none" or (self.framing == "length" and self.remaining == 0):
+            self.state = "done"
+        else:
+            self.state = "body"
+
+    def feed_body(self, data):
+        if self.framing == "length":
+            taken = min(self.remaining, len(data))
+            self.remaining -= taken
+            if self.remaining == 0:
+                self.state = "done"
+            return ([data[:taken]] if taken else []), taken
+        if self.framing == "chunked":
+            if isinstance(data, memoryview):
+                data = data.tobytes()
+            parts, extra = self.chunked.feed(data)
+            if self.chunked.done:
+                self.state = "done"
+            return parts, len(data) - len(extra)
+        # framing "close": mọi dữ liệu tới khi máy chủ đóng kết nối đều là phần thân
+        return [data], len(data)
+
+    def finish(self):
+        """
+        Báo rằng bên gửi đã đóng kết nối.
+
+        Returns:
+            bool: True nếu thông điệp đã trọn vẹn (phần thân kiểu "close" kết thúc bằng EOF).
+        """
+        if self.state == "body" and self.framing == "close":
+            self.state = "done"
+        return self.done
+
+    def header(self, name, default=None):
+        """
+        Lấy giá trị của một tiêu đề dưới dạng bytes (chưa giải mã). Tiêu đề chỉ được tìm khi
+        cần, bằng find() trên bản chữ thường của phần tiêu đề, không tách từng dòng.
+
+        Args:
+            name (bytes): Tên tiêu đề viết thường, ví dụ b"content-type".
+            default: Giá trị trả về khi không có tiêu đề.
+
+        Returns:
+            bytes: Giá trị tiêu đề; các tiêu đề trùng tên được nối bằng ", ".
+        """
+        if self.header_index is None:
+            self.header_index = {}
+            self.lower_head = self.head.lower()
+        if name in self.header_index:
+            value = self.header_index[name]
+            return default if value is None else value
+
+        values = []
+        needle = b"\r\n" + name + b":"
+        position = self.lower_head.find(needle)
+        while position >= 0:
+            start = position + len(needle)
+            end = self.head.index(b"\r\n", start)
+            values.append(self.head[start:end].strip())
+            position = self.lower_head.find(needle, end)
+        value = b", ".join(values) if values else None
+        self.header_index[name] = value
+        return default if value is None else value
+
+    def headers(self):
+        """
+        Returns:
+            dict: Toàn bộ tiêu đề đã giải mã thành str (chỉ dùng khi cần in ra).
+        """
+        headers = {}
+        for line in self.head.split(b"\r\n")[1:]:
+            name, separator, value = line.partition(b":")
+            if separator:
+                headers[name.strip().lower().decode("latin-1")] = value.strip().decode("latin-1")
+        return headers
+
+    def keeps_alive(self):
+        """
+        Returns:
+            bool: HTTP/1.1 mặc định giữ kết nối trừ khi có "close"; HTTP/1.0 chỉ giữ khi có "keep-alive".
+            Với yêu cầu, Proxy-Connection cũng được xét như Connection.
+        """
+        connection = self.header(b"connection", b"")
+        if not self.is_response:
+            connection += b"," + self.header(b"proxy-connection", b"")
+        connection = connection.lower()
+        if self.version == b"HTTP/1.0":
+            return b"keep-alive" in connection
+        return b"close" not in connection
+
+# Lấy địa chỉ IP liên quan đến một tên miền (bỏ khúc "http://")
+def get_ip_from_domain_name(domain_name):
+    """
+    Lấy địa chỉ IP liên quan đến một tên miền.
+    Tham số:
+        domain_name (str): Tên miền cần tìm địa chỉ IP.
+    Trả về:
+        str hoặc None: Địa chỉ IP đã tìm thấy hoặc None nếu không tìm thấy.
+    """
+    try:
+        ip_address = socket.gethostbyname(domain_name)
+        return ip_address
+    except (socket.gaierror, UnicodeError):
+        return None
+
+# Kiểm tra xem thời gian hiện tại có nằm trong khoảng thời gian đã chỉ định không
+def available_time_range(time_range):
+    """
+    Kiểm tra xem thời gian hiện tại có nằm trong khoảng thời gian đã chỉ định không.
+    Tham số:
+        time_range (list): Danh sách chứa thời gian bắt đầu và kết thúc.
+    Trả về:
+        bool: True nếu thời gian hiện tại nằm trong khoảng, False nếu ngược lại.
+    """
+    # lấy thời gian hiện tại
+    now = datetime.datetime.now().time() # chỉ lấy thời gian
+    start_time = datetime.time(time_range[0]) # thời gian bắt đầu (7h sáng)
+    end_time = datetime.time(time_range[1]) # thời gian kết thúc (10h tối)
+    return start_time <= now <= end_time # kiểm tra xem thời gian hiện tại có nằm giữa thời gian bắt đầu và thời gian kết thúc không
+
+# Tách tên miền và cổng (mặc định 80) từ phần host của URL
+def split_host_port(domain_name):
+    """
+    Tách tên miền dạng "host" hoặc "host:port" thành host và port.
+    Tham số:
+        domain_name (str): Phần host lấy từ URL.
+    Trả về:
+        tuple: (host, port), port mặc định là 80.
+    """
+    host, separator, port = domain_name.rpartition(":")
+    if separator and port.isdigit() and "]" not in port:
+        return host.strip("[]"), int(port)
+    return domain_name.strip("[]"), 80
+
+# Bỏ và thêm tiêu đề trong một thông điệp HTTP
+def rewrite_headers(message, remove, add=()):
+    """
+    Tham số:
+        message (bytes): Yêu cầu hoặc phản hồi HTTP (phần thân, nếu có, được giữ nguyên).
+        remove (tuple): Tên các tiêu đề cần bỏ (bytes viết thường).
+        add (list): Các dòng tiêu đề (bytes, dạng b"Name: value") thêm vào cuối phần tiêu đề.
+    Trả về:
+        bytes: Thông điệp đã được viết lại.
+    """
+    head, separator, body = message.partition(b"\r\n\r\n")
+    lines = head.split(b"\r\n")
+    kept = [lines[0]]
+    for line in lines[1:]:
+        name = line.split(b":", 1)[0].strip().lower()
+        if name not in remove:
+            kept.append(line)
+    kept.extend(add)
+    return b"\r\n".join(kept) + b"\r\n\r\n" + body
+
+# Thay các tiêu đề kết nối (hop-by-hop) của một thông điệp HTTP
+def set_connection_header(message, value):
+    """
+    Bỏ các tiêu đề Connection/Proxy-Connection/Keep-Alive của thông điệp và đặt lại Connection.
+    Dùng cho yêu cầu gửi lên máy chủ (luôn "keep-alive" để kết nối được trả lại UpstreamPool)
+    và cho phản hồi gửi về client ("keep-alive" hoặc "close").
+    Tham số:
+        message (bytes): Yêu cầu hoặc phản hồi HTTP đầy đủ.
+        value (bytes): Giá trị mới của tiêu đề Connection.
+    Trả về:
+        bytes: Thông điệp đã được viết lại.
+    """
+    return rewrite_headers(message, (b"connection", b"proxy-connection", b"keep-alive"), [b"Connection: " + value])
+
+# Các tiêu đề không được lưu vào cache: tiêu đề hop-by-hop chỉ có ý nghĩa trên một chặng kết nối,
+# còn Content-Length và Age được tính lại mỗi lần trả phản hồi từ cache
+UNCACHED_HEADERS = (b"connection", b"proxy-connection", b"keep-alive", b"transfer-encoding", b"te", b"trailer", b"upgrade", b"proxy-authenticate", b"content-length", b"age")
+# Các mã trạng thái được lưu cache (RFC 9110 mục 15.1: được phép cache theo heuristic)
+CACHEABLE_STATUS = (200, 203, 300, 301, 308, 404, 410)
+# Các tiêu đề được giữ lại trong phản hồi 304 gửi cho client (RFC 9110 mục 15.4.5)
+NOT_MODIFIED_HEADERS = (b"cache-control", b"content-location", b"date", b"etag", b"expires", b"last-modified", b"vary")
+# Các tiêu đề làm cho yêu cầu của client trở thành yêu cầu có điều kiện
+CONDITIONAL_HEADERS = (b"if-none-match", b"if-modified-since", b"if-match", b"if-unmodified-since", b"if-range")
+
+# Tạo khoá cache từ URL của yêu cầu
+def cache_key(host, port, url):
+    """
+    Chuẩn hoá URL để các cách viết khác nhau của cùng một tài nguyên dùng chung một khoá.
+    Tham số:
+        host (str): Tên máy chủ (viết thường, như urlsplit trả về).
+        port (int): Cổng của máy chủ.
+        url (urllib.parse.SplitResult): URL của yêu cầu đã được phân tích.
+    Trả về:
+        str: Khoá dạng "host[:port]/path?query": bỏ cổng mặc định 80 và phần "#...".
+    """
+    authority = f"[{host}]" if ":" in host else host
+    if port != 80:
+        authority += f":{port}"
+    path = url.path[1:] if url.path.startswith("/") else url.path
+    return authority + "/" + path + ("?" + url.query if url.query else "")
+
+# Phân tích URL tuyệt đối của yêu cầu một lần duy nhất
+def parse_target(target):
+    """
+    Whitelist, kết nối tới máy chủ gốc và khoá cache đều dùng kết quả này, để không có hai cách
+    tách host khác nhau (ví dụ "http://a/x//b/y" không thể qua whitelist bằng "a" rồi kết nối tới "b").
+    Tham số:
+        target (str): URL trong dòng yêu cầu.
+    Trả về:
+        tuple: (host, port, key), hoặc None nếu URL không phải "http://host[:port]/..." hợp lệ
+        (không có host, cổng sai, có user@, hoặc chỉ có đường dẫn).
+    """
+    try:
+        url = urllib.parse.urlsplit(target)
+        port = url.port or 80
+    except ValueError:
+        return None
+    if url.scheme.lower() != "http" or not url.hostname or "@" in url.netloc:
+        return None
+    return url.hostname, port, cache_key(url.hostname, port, url)
+
+# Khoá riêng cho từng biến thể của một URL có tiêu đề Vary
+def variant_key(key, vary):
+    """
+    Tham số:
+        key (str): Khoá cache của URL.
+        vary (dict): {tên tiêu đề trong Vary: giá trị trong yêu cầu}.
+    Trả về:
+        str: Khoá của URL kèm sha256 của các giá trị đó (ký tự "#" không thể có trong khoá của URL).
+    """
+    values = "\n".join(f"{name}:{value}" for name, value in sorted(vary.items()))
+    return key + "#" + hashlib.sha256(values.encode("utf-8")).hexdigest()
+
+def parse_cache_control(value):
+    """
+    Tham số:
+        value (bytes): Giá trị tiêu đề Cache-Control.
+    Trả về:
+        dict: {tên chỉ thị viết thường: giá trị (str) hoặc None nếu chỉ thị không có giá trị}.
+    """
+    directives = {}
+    for item in value.decode("latin-1").split(","):
+        name, separator, argument = item.partition("=")
+        name = name.strip().lower()
+        if name:
+            directives[name] = argument.strip().strip('"') if separator else None
+    return directives
+
+def directive_seconds(directives, name):
+    """
+    Trả về:
+        int hoặc None: Số giây của một chỉ thị như max-age; None nếu không có, 0 nếu giá trị sai.
+    """
+    if name not in directives:
+        return None
+    try:
+        return max(0, int(directives[name]))
+    except (TypeError, ValueError):
+        return 0
+
+def parse_http_date(value):
+    """
+    Tham số:
+        value (bytes): Ngày giờ theo định dạng HTTP, ví dụ b"Sun, 06 Nov 1994 08:49:37 GMT".
+    Trả về:
+        float hoặc None: Thời điểm tương ứng (như time.time()), None nếu không đọc được.
+    """
+    try:
+        return email.utils.parsedate_to_datetime(value.decode("latin-1")).timestamp()
+    except (TypeError, ValueError, IndexError):
+        return None
+
+def initial_age(response, now):
+    """
+    Tuổi của phản hồi lúc proxy nhận được (RFC 9111 mục 4.2.3).
+    """
+    try:
+        age = int(response.header(b"age", b"0"))
+    except ValueError:
+        age = 0
+    date = parse_http_date(response.header(b"date", b""))
+    apparent_age = max(0, now - date) if date is not None else 0
+    return max(age, apparent_age)
+
+def freshness_lifetime(response, directives, now, cache_time):
+    """
+    Tính thời gian phản hồi còn "tươi" (RFC 9111 mục 4.2.1): s-maxage, max-age, Expires, rồi tới
+    ước lượng 10% khoảng thời gian từ Last-Modified. Ảnh không có thông tin nào trong số này
+    được giữ cache_time giây như trước đây.
+    Tham số:
+        response (HTTPParser): Phản hồi của máy chủ gốc.
+        directives (dict): Cache-Control của phản hồi.
+        now (float): Thời điểm nhận phản hồi.
+        cache_time (int): Thời gian cache mặc định trong config.ini.
+    Trả về:
+        float: Số giây; 0 nghĩa là phải xác thực lại với máy chủ trước mỗi lần dùng.
+    """
+    if "no-cache" in directives:
+        return 0
+    for name in ("s-maxage", "max-age"):
+        if name in directives:
+            return directive_seconds(directives, name)
+    date = parse_http_date(response.header(b"date", b"")) or now
+    expires = response.header(b"expires")
+    if expires is not None:
+        # Expires sai định dạng (ví dụ "0") nghĩa là đã hết hạn
+        return max(0, (parse_http_date(expires) or 0) - date)
+    last_modified = parse_http_date(response.header(b"last-modified", b""))
+    if last_modified is not None:
+        return min(max(0, date - last_modified) / 10, cache_time)
+    if response.header(b"content-type", b"").startswith(b"image/"):
+        return cache_time
+    return 0
+
+def vary_values(vary, request):
+    """
+    Tham số:
+        vary (bytes): Giá trị tiêu đề Vary của phản hồi.
+        request (HTTPParser): Yêu cầu đã tạo ra phản hồi.
+    Trả về:
+        dict hoặc None: {tên tiêu đề: giá trị trong yêu cầu}; None nếu Vary là "*" (không thể cache).
+    """
+    values = {}
+    for name in vary.split(b","):
+        name = name.strip().lower()
+        if name == b"*":
+            return None
+        if name:
+            value = request.header(name)
+            values[name.decode("latin-1")] = value.decode("latin-1") if value is not None else None
+    return values
+
+# Quyết định một phản hồi có được lưu cache hay không (RFC 9111 mục 3)
+def create_cache_entry(key, request, response, now, cache_time):
+    """
+    Tham số:
+        key (str): Khoá cache của yêu cầu.
+        request (HTTPParser): Yêu cầu GET của client.
+        response (HTTPParser): Phản hồi của máy chủ gốc (mới có phần tiêu đề).
+        now (float): Thời điểm nhận phản hồi.
+        cache_time (int): Thời gian cache mặc định trong config.ini.
+    Trả về:
+        CacheEntry hoặc None: Bản ghi chưa có phần thân (được gắn sau khi chuyển tiếp xong),
+        hoặc None nếu phản hồi không được lưu.
+    """
+    if response.status not in CACHEABLE_STATUS or response.framing == "none":
+        return None
+    request_directives = parse_cache_control(request.header(b"cache-control", b""))
+    directives = parse_cache_control(response.header(b"cache-control", b""))
+    if "no-store" in request_directives or "no-store" in directives or "private" in directives:
+        return None
+    # Phản hồi cho yêu cầu có xác thực chỉ được dùng chung khi máy chủ cho phép rõ ràng
+    if request.header(b"authorization") is not None and not {"public", "s-maxage", "must-revalidate"} & directives.keys():
+        return None
+    vary = vary_values(response.header(b"vary", b""), request)
+    if vary is None:
+        return None
+    lifetime = freshness_lifetime(response, directives, now, cache_time)
+    if lifetime <= 0 and response.header(b"etag") is None and response.header(b"last-modified") is None:
+        # Hết hạn ngay mà không có gì để xác thực lại thì lưu cũng vô ích
+        return None
+    head = rewrite_headers(response.head, UNCACHED_HEADERS)
+    return CacheEntry(key, head, None, now, initial_age(response, now), lifetime, vary)
+
+# Thêm If-None-Match / If-Modified-Since để xác thực lại một bản cache đã cũ
+def add_validators(request, entry):
+    """
+    Tham số:
+        request (bytes): Yêu cầu sẽ gửi lên máy chủ gốc.
+        entry (CacheEntry): Bản cache cần xác thực lại.
+    Trả về:
+        bytes: Yêu cầu có điều kiện; máy chủ trả 304 nếu bản cache vẫn còn đúng.
+    """
+    validators = []
+    etag = entry.response.header(b"etag")
+    if etag is not None:
+        validators.append(b"If-None-Match: " + etag)
+    last_modified = entry.response.header(b"last-modified")
+    if last_modified is not None:
+        validators.append(b"If-Modified-Since: " + last_modified)
+    return rewrite_headers(request, (), validators)
+
+def is_conditional(request):
+    return any(request.header(name) is not None for name in CONDITIONAL_HEADERS)
+
+# Nén phần thân phản hồi theo từng mảnh khi chuyển tiếp (gzip hoặc deflate)
+class BodyCompressor:
+    def __init__(self, coding, level):
+        """
+        Args:
+            coding (str): "gzip" hoặc "deflate" (định dạng zlib, RFC 9110 mục 8.4.1).
+            level (int): Mức nén của zlib.
+        """
+        self.coding = coding
+        self.compressor = zlib.compressobj(level, zlib.DEFLATED, 31 if coding == "gzip" else 15)
+
+    def compress(self, data):
+        return self.compressor.compress(data)
+
+    def flush(self):
+        return self.compressor.flush()
+
+# Đóng khung một mảnh dữ liệu theo Transfer-Encoding: chunked (mảnh rỗng thì bỏ qua)
+def chunk_frame(data):
+    return b"%x\r\n" % len(data) + data + b"\r\n" if data else b""
+
+# Quyết định có nén phần thân phản hồi cho client hay không
+def prepare_compression(request, response, options):
+    """
+    Phản hồi 200 chưa nén, có kiểu nội dung trong compression_types, không có no-transform và không
+    biết trước là nhỏ hơn compression_min_size thì được coi là nén được: nó luôn được gửi kèm
+    "Vary: Accept-Encoding" để bản nén và bản thường được cache thành hai biến thể riêng. Phần thân
+    chỉ thật sự được nén khi client gửi yêu cầu GET HTTP/1.1 (không có Range) và nhận gzip hoặc deflate;
+    khi đó phản hồi được gửi dạng chunked và ETag được chuyển thành ETag yếu (W/).
+    Tham số:
+        request (HTTPParser): Yêu cầu của client.
+        response (HTTPParser): Phản hồi của máy chủ gốc (mới có phần tiêu đề).
+        options (dict): Các tuỳ chọn vận hành (compression, compression_types, ...).
+    Trả về:
+        tuple: (head, stored, compressor): phần tiêu đề gửi cho client, HTTPParser của phần tiêu đề đó
+        (để quyết định lưu cache), và BodyCompressor hoặc None nếu phần thân được gửi nguyên dạng.
+    """
+    if not options["compression"] or response.status != 200 or response.header(b"content-encoding") is not None:
+        return response.head, response, None
+    if "no-transform" in parse_cache_control(response.header(b"cache-control", b"")):
+        return response.head, response, None
+    content_type = response.header(b"content-type", b"").split(b";")[0].strip().lower().decode("latin-1")
+    if content_type not in options["compression_types"]:
+        return response.head, response, None
+    if response.framing == "none" or (response.framing == "length" and response.remaining < options["compression_min_size"]):
+        return response.head, response, None
+    if response.framing == "close" and response.header(b"transfer-encoding") is not None:
+        # Phần thân còn mang mã hoá truyền tải khác chunked mà proxy không giải mã được
+        return response.head, response, None
+
+    vary = response.header(b"vary")
+    remove = [b"vary"]
+    add = [b"Vary: " + (vary + b", Accept-Encoding" if vary else b"Accept-Encoding")]
+    compressor = None
+    if request.method.upper() == "GET" and request.version == b"HTTP/1.1" and request.header(b"range") is None:
+        coding = "gzip" if accepts_encoding(request, "gzip") else "deflate" if accepts_encoding(request, "deflate") else None
+        if coding is not None:
+            compressor = BodyCompressor(coding, options["compression_level"])
+            remove += [b"content-length", b"transfer-encoding", b"etag"]
+            add += [b"Content-Encoding: " + coding.encode(), b"Transfer-Encoding: chunked"]
+            etag = response.header(b"etag")
+            if etag is not None:
+                add.append(b"ETag: " + (etag if etag.startswith(b"W/") else b"W/" + etag))
+    head = rewrite_headers(response.head, tuple(remove), add)
+    stored = HTTPParser(response.request_method)
+    stored.feed(head)
+    return head, stored, compressor
+
+# Giữ lại một bản phần thân phản hồi (có giới hạn kích thước) để lưu vào cache
+class BodyCollector:
+    def __init__(self, limit):
+        """
+        Args:
+            limit (int): Số byte tối đa được giữ lại; vượt quá thì bỏ toàn bộ (không lưu cache).
+        """
+        self.limit = limit
+        self.parts = []
+        self.size = 0
+
+    def add(self, part):
+        if self.parts is None:
+            return
+        self.size += len(part)
+        if self.size > self.limit:
+            self.parts = None
+        else:
+            self.parts.append(bytes(part))
+
+    def body(self):
+        """
+        Returns:
+            bytes hoặc None: Phần thân đã giữ lại, hoặc None nếu đã vượt giới hạn.
+        """
+        return b"".join(self.parts) if self.parts is not None else None
+
+# Đọc phần tiêu đề phản hồi của máy chủ (bỏ qua các phản hồi tạm thời 1xx)
+def read_response_head(server, method, data=b""):
+    """
+    Tham số:
+        server (socket.socket): Kết nối tới máy chủ.
+        method (str): Phương thức của yêu cầu đã gửi.
+        data (bytes): Phần đầu của phản hồi đã nhận trước đó.
+    Trả về:
+        tuple: (parser, leftover): parser là HTTPParser đã có đủ tiêu đề (None nếu máy chủ đóng
+        kết nối trước khi trả lời), leftover là phần thân đã nhận lẫn trong lần đọc cuối.
+    """
+    parser = HTTPParser(method)
+    while True:
+        if data:
+            _, consumed = parser.feed(data)
+            data = data[consumed:]
+            if parser.state != "head":
+                # Bỏ qua các phản hồi tạm thời như "100 Continue", phản hồi thật nằm ngay sau đó
+                if 100 <= parser.status < 200 and parser.status != 101:
+                    parser = HTTPParser(method)
+                    continue
+                return parser, data
+        data = server.recv(4096)
+        if not data:
+            return None, b""
+
+# Các phương thức có thể gửi lại cho máy chủ gốc mà không làm thay đổi tài nguyên hai lần
+IDEMPOTENT_METHODS = ("GET", "HEAD", "OPTIONS")
+
+def send_upstream_request(upstream_pool, host, port, request, method, record=None):
+    """
+    Gửi yêu cầu lên máy chủ qua một kết nối lấy từ UpstreamPool và đọc phần tiêu đề phản hồi.
+    Kết nối tái sử dụng có thể đã bị máy chủ đóng trong lúc nằm trong pool. Khi đó yêu cầu chỉ
+    được gửi lại trên kết nối mới nếu phương thức là idempotent (GET/HEAD/OPTIONS), lỗi không phải
+    là hết thời gian chờ và chưa nhận được byte phản hồi nào: máy chủ có thể đã xử lý yêu cầu dù
+    client chưa nhận được gì, nên một POST không bao giờ được gửi lại.
+
+    Args:
+        upstream_pool (UpstreamPool): Pool kết nối tới máy chủ gốc.
+        host (str): Tên miền của máy chủ.
+        port (int): Cổng của máy chủ.
+        request (bytes): Yêu cầu đã được chuẩn bị bởi set_connection_header.
+        method (str): Phương thức của yêu cầu.
+        record (RequestRecord): Nếu có, upstream_time được đặt bằng thời gian từ khi gửi xong yêu cầu
+            tới khi nhận đủ tiêu đề phản hồi (không tính thời gian chờ pool, phân giải DNS và kết nối).
+
+    Returns:
+        tuple: (server, parser, leftover). Người gọi phải trả server về pool bằng release().
+    """
+    idempotent = method.upper() in IDEMPOTENT_METHODS
+    while True:
+        server, reused = upstream_pool.acquire(host, port)
+        try:
+            # Chỉ lỗi trước byte phản hồi đầu tiên mới có thể được thử lại
+            try:
+                server.sendall(request)
+                sent_at = time.monotonic()
+                first = server.recv(4096)
+            except OSError as Error:
+                if not reused or not idempotent or isinstance(Error, socket.timeout):
+                    raise
+                first = None
+            if first:
+                parser, leftover = read_response_head(server, method, first)
+                if parser is not None:
+                    if record is not None:
+                        record.upstream_time = time.monotonic() - sent_at
+                    return server, parser, leftover
+                raise OSError(f"{host}:{port} closed the connection in the middle of the response head")
+            if not reused or not idempotent:
+                raise OSError(f"{host}:{port} closed the connection without a response")
+        except Exception:
+            upstream_pool.release(host, port, server, False)
+            raise
+        upstream_pool.release(host, port, server, False)
+        print(f"Stale upstream connection to {host}:{port}, retrying")
+
+def relay_response_body(server, client_socket, parser, leftover, collect, options, compressor=None, record=None):
+    """
+    Chuyển tiếp phần thân phản hồi từ máy chủ tới client ngay khi dữ liệu tới, qua một
+    bộ đệm có kích thước cố định (relay_buffer_size), thay vì gom toàn bộ phản hồi vào bộ nhớ.
+    Phần thân được gửi nguyên dạng (kể cả khung chunked); parser cho biết khi nào phần thân
+    kết thúc và trả về dữ liệu đã giải mã để lưu cache.
+
+    Args:
+        server (socket.socket): Kết nối tới máy chủ.
+        client_socket (socket.socket): Đối tượng socket của client; None khi tải lại cache trong nền.
+        parser (HTTPParser): Bộ phân tích phản hồi đã có đủ tiêu đề.
+        leftover (bytes): Phần thân đã nhận cùng với phần tiêu đề.
+        collect (bool): Có giữ lại một bản phần thân để lưu vào cache hay không.
+        options (dict): Các tuỳ chọn vận hành (relay_buffer_size, max_cache_object_size).
+        compressor (BodyCompressor): Nếu có, phần thân đã giải mã được nén và gửi dạng chunked;
+            bản được giữ lại để lưu cache là bản đã nén.
+        record (RequestRecord): Bản ghi của yêu cầu, được cộng số byte gửi cho client.
+
+    Returns:
+        tuple: (body, complete): body là phần thân để lưu cache (None nếu không giữ lại hoặc vượt
+        max_cache_object_size); complete = True nếu phần thân được nhận trọn vẹn và máy chủ
+        không gửi dữ liệu thừa.
+    """
+    collector = BodyCollector(options["max_cache_object_size"]) if collect else None
+    buffer = bytearray(options["relay_buffer_size"])
+    view = memoryview(buffer)
+    data = leftover
+    while True:
+        if data:
+            parts, consumed = parser.feed(data)
+            if compressor is not None:
+                parts = [compressor.compress(part) for part in parts]
+                framed = chunk_frame(b"".join(parts))
+                if client_socket is not None and framed:
+                    client_socket.sendall(framed)
+                    if record is not None:
+                        record.bytes_out += len(framed)
+            elif client_socket is not None:
+                client_socket.sendall(data[:consumed])
+                if record is not None:
+                    record.bytes_out += consumed
+            if collector is not None:
+                for part in parts:
+                    collector.add(part)
+            if consumed < len(data):
+                # Máy chủ gửi thừa dữ liệu sau phản hồi: không thể dùng lại kết nối
+                return None, False
+        if parser.done:
+            break
+        # Với Content-Length chỉ đọc đúng số byte còn thiếu để không lấn sang dữ liệu khác
+        size = min(len(buffer), parser.remaining) if parser.framing == "length" else len(buffer)
+        received = server.recv_into(view, size)
+        if not received:
+            if not parser.finish():
+                return None, False
+            break
+        data = view[:received]
+
+    if compressor is not None:
+        tail = compressor.flush()
+        if collector is not None:
+            collector.add(tail)
+        if client_socket is not None:
+            framed = chunk_frame(tail) + b"0\r\n\r\n"
+            client_socket.sendall(framed)
+            if record is not None:
+                record.bytes_out += len(framed)
+    return (collector.body() if collector is not None else None), True
+
+# Phần thân yêu cầu vượt max_request_body_size (trả lỗi 413 thay vì 400)
+class RequestTooLarge(ValueError):
+    def __init__(self, request, size):
+        """
+        Args:
+            request (HTTPParser): Yêu cầu đã có đủ tiêu đề (để ghi nhật ký).
+            size (int): Giới hạn đã vượt (byte).
+        """
+        super().__init__(f"Request body larger than {size} bytes")
+        self.request = request
+
+def check_request_body(parser, parts, received, max_body_size):
+    """
+    Kiểm tra giới hạn phần thân sau mỗi lần nạp dữ liệu: Content-Length được so ngay khi có đủ tiêu đề,
+    phần thân chunked được đếm theo số byte đã giải mã.
+
+    Returns:
+        int: Số byte phần thân (đã giải mã) nhận được tới lúc này.
+    """
+    received += sum(len(part) for part in parts)
+    if max_body_size and (received > max_body_size or (parser.framing == "length" and received + parser.remaining > max_body_size)):
+        raise RequestTooLarge(parser, max_body_size)
+    return received
+
+# Đọc một yêu cầu HTTP hoàn chỉnh (tiêu đề + phần thân) từ client
+def read_client_request(client_socket, buffer, max_body_size=0):
+    """
+    Đọc một yêu cầu hoàn chỉnh từ client. Các byte nhận thừa (yêu cầu pipelining tiếp theo)
+    được trả lại để dùng cho lần đọc sau.
+    Tham số:
+        client_socket (socket.socket): Đối tượng socket của client.
+        buffer (bytes): Dữ liệu đã nhận nhưng chưa xử lý từ lần đọc trước.
+        max_body_size (int): Kích thước tối đa của phần thân (0 = không giới hạn); vượt quá thì
+            RequestTooLarge được ném ra trước khi phần thân được nhận hết.
+    Trả về:
+        tuple: (parser, request, buffer): parser là HTTPParser của yêu cầu, request là toàn bộ
+        yêu cầu dạng bytes (cả hai là None nếu client đã đóng kết nối), buffer là phần còn lại.
+    """
+    parser = HTTPParser()
+    pieces = []
+    data = buffer
+    received = 0
+    while True:
+        if data:
+            parts, consumed = parser.feed(data)
+            pieces.append(data[:consumed])
+            data = data[consumed:]
+            if parser.state != "head":
+                received = check_request_body(parser, parts, received, max_body_size)
+            if parser.done:
+                return parser, b"".join(pieces), data
+            if data:
+                continue
+        data = client_socket.recv(65536)
+        if not data:
+            return None, None, b""
+
+# Tạo dòng trạng thái và tiêu đề của một phản hồi lấy từ cache
+def build_cache_head(entry, request, keep_alive, now):
+    """
+    Tạo phản hồi cho client từ bản cache: 304 nếu bản của client vẫn còn đúng, nếu không thì
+    phản hồi đã lưu với Age và Content-Length được tính lại (không có phần thân với HEAD).
+    Tham số:
+        entry (CacheEntry): Bản cache.
+        request (HTTPParser): Yêu cầu GET/HEAD của client.
+        keep_alive (bool): Có giữ kết nối với client sau phản hồi hay không.
+        now (float): Thời điểm hiện tại.
+    Trả về:
+        tuple: (head, has_body): phần tiêu đề hoàn chỉnh và việc có phải gửi tiếp phần thân hay không.
+    """
+    connection = b"Connection: keep-alive" if keep_alive else b"Connection: close"
+    age = b"Age: %d" % entry.age(now)
+    if entry.not_modified_for(request):
+        lines = [b"HTTP/1.1 304 Not Modified"]
+        for line in entry.head.split(b"\r\n")[1:]:
+            if line.split(b":", 1)[0].strip().lower() in NOT_MODIFIED_HEADERS:
+                lines.append(line)
+        lines += [age, connection]
+        return b"\r\n".join(lines) + b"\r\n\r\n", False
+    head = rewrite_headers(entry.head, (), [age, b"Content-Length: %d" % entry.content_length(), connection])
+    return head, request.method.upper() != "HEAD"
+
+# Gửi một phản hồi lấy từ cache cho client
+def send_cache_response(client_socket, entry, request, keep_alive, now, record=None):
+    """
+    Phần thân đã có trong bộ nhớ được gửi cùng tiêu đề. Phần thân chỉ có trên đĩa được gửi bằng
+    socket.sendfile() thẳng từ tệp nội dung (os.sendfile trong nhân), không sao chép qua tiến trình.
+    Tham số:
+        client_socket (socket.socket): Đối tượng socket của client.
+        entry (CacheEntry): Bản cache.
+        request (HTTPParser): Yêu cầu GET/HEAD của client.
+        keep_alive (bool): Có giữ kết nối với client sau phản hồi hay không.
+        now (float): Thời điểm hiện tại.
+        record (RequestRecord): Bản ghi của yêu cầu, được ghi nhận phản hồi đã gửi.
+    Trả về:
+        bool: False nếu tệp nội dung đã bị xoá trước khi kịp gửi (chưa có byte nào được gửi).
+    """
+    head, has_body = build_cache_head(entry, request, keep_alive, now)
+    sent = 0
+    if not has_body:
+        client_socket.sendall(head)
+    elif entry.body is not None:
+        client_socket.sendall(head + entry.body)
+        sent = len(entry.body)
+    else:
+        try:
+            body_file = open(entry.body_path, "rb")
+        except OSError:
+            return False
+        with body_file:
+            # MSG_MORE: nhân gộp tiêu đề với phần đầu của tệp vào cùng một gói tin
+            client_socket.sendall(head, MSG_MORE)
+            sent = client_socket.sendfile(body_file, entry.body_offset, entry.content_length())
+    if record is not None:
+        record.sent(head)
+        record.bytes_out += sent
+    return True
+
+# Tải lại một mục cache từ máy chủ gốc trong nền (không có client chờ phản hồi)
+def refresh_cache_entry(cache, upstream_pool, key, entry, request, client_data, options):
+    """
+    Dùng cho stale-while-revalidate và việc tải lại trước hạn các mục được dùng nhiều. Người gọi đã
+    giữ lượt tải của khoá (cache.try_begin_fetch) nên các yêu cầu trượt cache cùng lúc sẽ chờ lượt này.
+    Tham số:
+        cache (MemoryCache): Cache hai tầng.
+        upstream_pool (UpstreamPool): Pool kết nối tới máy chủ gốc.
+        key (str): Khoá cache.
+        entry (CacheEntry): Bản đang có trong cache.
+        request (HTTPParser): Yêu cầu GET đã dẫn tới việc tải lại.
+        client_data (bytes): Yêu cầu đó dạng thô, được gửi lại (bỏ điều kiện của client, thêm điều kiện của bản cache).
+        options (dict): Các tuỳ chọn vận hành.
+    """
+    host, port, _ = parse_target(request.target)
+    upstream_request = rewrite_headers(set_connection_header(client_data, b"keep-alive"), CONDITIONAL_HEADERS)
+    if entry.has_validators():
+        upstream_request = add_validators(upstream_request, entry)
+    try:
+        server, response, leftover = send_upstream_request(upstream_pool, host, port, upstream_request, "GET")
+        reusable = False
+        try:
+            if response.status == 304 and entry.has_validators():
+                reusable = not leftover and response.keeps_alive()
+                cache.put(key, entry.refresh(response, time.time(), cache.cache_time))
+            else:
+                # Bản tải lại phải là cùng biến thể (nén hoặc không) với bản đang có trong cache
+                _, stored, compressor = prepare_compression(request, response, options)
+                new_entry = create_cache_entry(key, request, stored, time.time(), cache.cache_time)
+                body, complete = relay_response_body(server, None, response, leftover, new_entry is not None, options, compressor)
+                reusable = complete and response.framing != "close" and response.keeps_alive()
+                if complete and body is not None:
+                    new_entry.body = body
+                    cache.put(key, new_entry)
+            print(f"Cache entry refreshed in background: {key} ({response.status})")
+        finally:
+            upstream_pool.release(host, port, server, reusable)
+    except Exception as Error:
+        print(f"Error while refreshing cache entry: {Error}")
+    finally:
+        cache.end_fetch(key)
+
+def handle_request(client_socket, request, client_data, config, cache, upstream_pool, options, keep_alive, record):
+    """
+    Xử lý một yêu cầu HTTP trên kết nối của client.
+
+    Args:
+        client_socket (socket.socket): Đối tượng socket của client.
+        request (HTTPParser): Yêu cầu đã được phân tích.
+        client_data (bytes): Yêu cầu hoàn chỉnh nhận từ client.
+        config (ConfigWatcher): Nguồn của chính sách hiện hành (whitelist, khung giờ cho phép).
+        cache (MemoryCache): Cache hai tầng (bộ nhớ và đĩa) để lưu trữ và truy xuất dữ liệu cache.
+        upstream_pool (UpstreamPool): Pool kết nối giữ sống tới các máy chủ gốc.
+        options (dict): Các tuỳ chọn vận hành (relay_buffer_size, max_cache_object_size).
+        keep_alive (bool): Client muốn giữ kết nối sau yêu cầu này.
+        record (RequestRecord): Bản ghi của yêu cầu (trạng thái, số byte, kết quả tra cache, thời gian).
+
+    Returns:
+        bool: True nếu kết nối với client có thể dùng tiếp cho yêu cầu sau.
+    """
+    # Danh sách các phương thức HTTP được chấp nhận
+    ACCEPT_METHOD = ("GET", "POST", "HEAD")
+
+    method = request.method
+    # Tách host, cổng và khoá cache từ URL một lần; URL không có host hợp lệ bị từ chối với 400
+    target = parse_target(request.target)
+    if target is None:
+        send_static_response(client_socket, BAD_REQUEST, request, record)
+        return False
+    host, port, key = target
+
+    # Kiểm tra các điều kiện để xem liệu yêu cầu này hợp lệ không
+    # Mỗi yêu cầu dùng một bản chính sách duy nhất, kể cả khi config.ini được nạp lại giữa chừng
+    policy = config.policy
+    if method.upper() not in ACCEPT_METHOD or not is_whitelisted(host, policy.whitelisting) or not available_time_range(policy.time_range):
+        # Gửi lỗi 403 nếu không hợp lệ (phản hồi dựng sẵn, có bản gzip nếu client nhận)
+        send_static_response(client_socket, FORBIDDEN, request, record)
+        return False
+
+    request_directives = parse_cache_control(request.header(b"cache-control", b""))
+    use_cache = method.upper() in ("GET", "HEAD") and "no-store" not in request_directives
+
+    # Lấy phản hồi từ cache nếu có, còn "tươi" (hoặc trong cửa sổ stale-while-revalidate) và khớp các tiêu đề trong Vary
+    entry = cache.lookup(key, request) if use_cache else None
+    stale_window = entry.stale_window(cache.stale_while_revalidate) if entry is not None and method.upper() == "GET" else 0
+    if entry is not None and entry.can_serve(request, request_directives, time.time(), stale_window):
+        # Bản đã hết hạn hoặc mục được dùng nhiều sắp hết hạn: tải lại trong nền, client không phải chờ
+        if method.upper() == "GET" and cache.wants_refresh(key, entry, time.time(), options["refresh_ahead"], options["refresh_min_hits"]) and cache.try_begin_fetch(key):
+            threading.Thread(target=refresh_cache_entry, args=(cache, upstream_pool, key, entry, request, client_data, options), daemon=True).start()
+        record.cache = "stale" if time.time() >= entry.expires_at else "hit"
+        if send_cache_response(client_socket, entry, request, keep_alive, time.time(), record):
+            return keep_alive
+        # Tệp nội dung vừa bị xoá: lấy lại từ máy chủ như khi không có trong cache
+        entry = None
+
+    # Đã có yêu cầu khác đang tải URL này: chờ nó lưu vào cache thay vì cùng hỏi máy chủ gốc.
+    # URL vừa trả phản hồi không lưu được cache thì không chờ (không có gì để dùng chung). Yêu cầu có điều kiện
+    # của client không dẫn lượt tải: phản hồi 304 dành riêng cho nó không nói gì về khả năng lưu cache của URL.
+    leader = False
+    if use_cache and method.upper() == "GET" and options["coalesce_timeout"] > 0 and not is_conditional(request) and not cache.passes(key):
+        waiter = cache.begin_fetch(key)
+        leader = waiter is None
+        if not leader and waiter.wait(options["coalesce_timeout"]) and waiter.cacheable:
+            entry = cache.lookup(key, request) or entry
+            if entry is not None and entry.can_serve(request, request_directives, time.time()):
+                record.cache = "hit"
+                if send_cache_response(client_socket, entry, request, keep_alive, time.time(), record):
+                    return keep_alive
+                entry = None
+
+    # Bản cache đã cũ nhưng có ETag/Last-Modified: hỏi máy chủ xem bản đó còn đúng không
+    revalidating = entry is not None and entry.has_validators() and not is_conditional(request)
+    upstream_request = set_connection_header(client_data, b"keep-alive")
+    if revalidating:
+        upstream_request = add_validators(upstream_request, entry)
+
+    record.cache = "miss" if use_cache else "bypass"
+    try:
+        # Gửi yêu cầu qua một kết nối giữ sống lấy từ pool (bỏ qua bắt tay TCP nếu có sẵn)
+        server, response, leftover = send_upstream_request(upstream_pool, host, port, upstream_request, method, record)
+    except Exception as Error:
+        print(f"Error while getting server's response: {Error}")
+        if leader:
+            cache.end_fetch(key)
+        # Máy chủ gốc không trả lời kịp: 504, các lỗi khác: 502
+        send_static_response(client_socket, GATEWAY_TIMEOUT if isinstance(Error, socket.timeout) else BAD_GATEWAY, request, record)
+        return False
+
+    reusable = False
+    # Phản hồi đã nhận trọn vẹn nhưng không lưu được cache (phần thân vượt max_cache_object_size)
+    uncacheable = False
+    try:
+        if revalidating and response.status == 304:
+            # Bản cache vẫn đúng: cập nhật hạn dùng và trả lời client từ cache
+            reusable = not leftover and response.keeps_alive()
+            entry = entry.refresh(response, time.time(), cache.cache_time)
+            cache.put(key, entry)
+            record.cache = "revalidated"
+            if not send_cache_response(client_socket, entry, request, keep_alive, time.time(), record):
+                send_static_response(client_socket, BAD_GATEWAY, request, record)
+                return False
+            return keep_alive
+
+        # Phần thân được nén cho client nếu có thể; stored mô tả phản hồi mà client thực sự nhận được
+        head, stored, compressor = prepare_compression(request, response, options)
+        # Chỉ giữ kết nối với client khi phản hồi tự xác định được độ dài
+        keep_alive = keep_alive and stored.framing != "close"
+        head = set_connection_header(head, b"keep-alive" if keep_alive else b"close")
+        client_socket.sendall(head)
+        record.sent(head)
+
+        # Phần thân được giữ lại trong lúc chuyển tiếp nếu phản hồi được phép lưu cache
+        new_entry = create_cache_entry(key, request, stored, time.time(), cache.cache_time) if use_cache and method.upper() == "GET" else None
+        if leader and new_entry is None:
+            # Không có gì để các yêu cầu đang chờ dùng chung: thả chúng ngay, không đợi phần thân
+            cache.end_fetch(key, False)
+            leader = False
+        body, complete = relay_response_body(server, client_socket, response, leftover, new_entry is not None, options, compressor, record)
+        reusable = complete and response.framing != "close" and response.status != 101 and response.keeps_alive()
+        uncacheable = complete and body is None
+
+        if complete and body is not None:
+            new_entry.body = body
+            cache.put(key, new_entry)
+        elif method.upper() not in ("GET", "HEAD") and response.status < 400:
+            # Yêu cầu POST thành công có thể đã thay đổi tài nguyên: bỏ bản cache cũ
+            cache.delete(key)
+
+        return keep_alive and complete
+    finally:
+        upstream_pool.release(host, port, server, reusable)
+        if leader:
+            # Sau cache.put(): các yêu cầu đang chờ sẽ đọc được bản vừa lưu
+            cache.end_fetch(key, not uncacheable)
+
+# Một chiều của đường hầm CONNECT: đọc từ src, ghi sang dst
+class TunnelPipe:
+    def __init__(self, src, dst, buffer_size):
+        """
+        Args:
+            src (socket.socket): Socket nguồn (không chặn).
+            dst (socket.socket): Socket đích (không chặn).
+            buffer_size (int): Số byte tối đa đọc mỗi lần.
+        """
+        self.src = src
+        self.dst = dst
+        self.buffer_size = buffer_size
+        self.pending = 0     # số byte đã đọc từ src nhưng chưa ghi xong sang dst
+        self.data = None     # dữ liệu chưa ghi (khi không dùng splice)
+        self.eof = False     # src đã đóng chiều gửi
+        self.done = False    # đã chuyển hết và đã shutdown(SHUT_WR) phía dst
+        # Dữ liệu đi socket -> pipe -> socket bằng os.splice(), không được chép lên bộ nhớ của tiến trình
+        self.pipe = os.pipe() if HAS_SPLICE else None
+
+    def read(self):
+        """
+        Gọi khi src đọc được (chỉ khi không còn dữ liệu chờ ghi).
+        """
+        try:
+            if self.pipe is not None:
+                count = os.splice(self.src.fileno(), self.pipe[1], self.buffer_size, flags=os.SPLICE_F_MOVE | os.SPLICE_F_NONBLOCK)
+            else:
+                self.data = memoryview(self.src.recv(self.buffer_size))
+                count = len(self.data)
+        except BlockingIOError:
+            return
+        if count == 0:
+            self.eof = True
+        self.pending = count
+        self.write()
+
+    def write(self):
+        """
+        Ghi dữ liệu đang chờ sang dst (khi đọc xong hoặc khi dst ghi được); dst đầy thì dừng lại chờ.
+        """
+        try:
+            while self.pending:
+                if self.pipe is not None:
+                    count = os.splice(self.pipe[0], self.dst.fileno(), self.pending, flags=os.SPLICE_F_MOVE | os.SPLICE_F_NONBLOCK)
+                else:
+                    count = self.dst.send(self.data)
+                    self.data = self.data[count:]
+                self.pending -= count
+        except BlockingIOError:
+            return
+        if self.eof and not self.done:
+            # Half-close: báo EOF cho phía bên kia nhưng vẫn nhận dữ liệu theo chiều ngược lại
+            self.done = True
+            try:
+                self.dst.shutdown(socket.SHUT_WR)
+            except OSError:
+                pass
+
+    def close(self):
+        if self.pipe is not None:
+            os.close(self.pipe[0])
+            os.close(self.pipe[1])
+
+# Chuyển tiếp hai chiều giữa client và máy chủ qua một selector, cho tới khi cả hai chiều kết thúc
+def relay_tunnel(client_socket, server, options):
+    """
+    Mỗi chiều chỉ đọc tiếp khi dữ liệu đọc trước đã được ghi hết (áp lực ngược: client hoặc máy chủ chậm
+    không làm phình bộ nhớ). Đường hầm bị đóng khi cả hai chiều đã EOF, khi có lỗi kết nối, hoặc khi
+    không có dữ liệu trong tunnel_idle_timeout giây.
+    Tham số:
+        client_socket (socket.socket): Đối tượng socket của client.
+        server (socket.socket): Kết nối tới máy chủ đích.
+        options (dict): Các tuỳ chọn vận hành (relay_buffer_size, tunnel_idle_timeout).
+    """
+    client_socket.setblocking(False)
+    server.setblocking(False)
+    directions = (TunnelPipe(client_socket, server, options["relay_buffer_size"]), TunnelPipe(server, client_socket, options["relay_buffer_size"]))
+    selector = selectors.DefaultSelector()
+    masks = {client_socket: 0, server: 0}
+    try:
+        while not all(direction.done for direction in directions):
+            # Chỉ gọi selector.modify() khi tập sự kiện quan tâm của một socket thay đổi
+            wanted = {client_socket: 0, server: 0}
+            for direction in directions:
+                if direction.pending:
+                    wanted[direction.dst] |= selectors.EVENT_WRITE
+                elif not direction.eof:
+                    wanted[direction.src] |= selectors.EVENT_READ
+            for sock, mask in wanted.items():
+                if mask != masks[sock]:
+                    if masks[sock] == 0:
+                        selector.register(sock, mask)
+                    elif mask == 0:
+                        selector.unregister(sock)
+                    else:
+                        selector.modify(sock, mask)
+                    masks[sock] = mask
+            events = selector.select(options["tunnel_idle_timeout"])
+            if not events:
+                print("Tunnel idle, closing")
+                return
+            for key, mask in events:
+                for direction in directions:
+                    if mask & selectors.EVENT_WRITE and direction.dst is key.fileobj and direction.pending:
+                        direction.write()
+                    if mask & selectors.EVENT_READ and direction.src is key.fileobj and not direction.pending and not direction.eof:
+                        direction.read()
+    except OSError as Error:
+        print(f"Tunnel error: {Error}")
+    finally:
+        selector.close()
+        for direction in directions:
+            direction.close()
+
+# Mở đường hầm CONNECT (HTTPS) tới máy chủ đích
+def handle_connect(client_socket, request, leftover, config, upstream_pool, options, record):
+    """
+    Tham số:
+        client_socket (socket.socket): Đối tượng socket của client.
+        request (HTTPParser): Yêu cầu CONNECT (target dạng host:port).
+        leftover (bytes): Dữ liệu client đã gửi ngay sau yêu cầu CONNECT (thuộc về đường hầm).
+        config (ConfigWatcher): Nguồn của chính sách hiện hành (whitelist, khung giờ cho phép).
+        upstream_pool (UpstreamPool): Dùng để phân giải tên miền và mở kết nối (kết nối này không được trả về pool).
+        options (dict): Các tuỳ chọn vận hành (connect_ports, relay_buffer_size, tunnel_idle_timeout).
+        record (RequestRecord): Bản ghi của yêu cầu CONNECT.
+    """
+    policy = config.policy
+    host, port = split_host_port(request.target)
+    if port not in options["connect_ports"] or not is_whitelisted(host, policy.whitelisting) or not available_time_range(policy.time_range):
+        send_static_response(client_socket, FORBIDDEN, request, record)
+        return
+    try:
+        server = upstream_pool.open_connection(host, port)
+    except Exception as Error:
+        print(f"Error while opening tunnel to {host}:{port}: {Error}")
+        send_static_response(client_socket, GATEWAY_TIMEOUT if isinstance(Error, socket.timeout) else BAD_GATEWAY, request, record)
+        return
+    with server:
+        established = b"HTTP/1.1 200 Connection Established\r\n\r\n"
+        client_socket.sendall(established)
+        record.sent(established)
+        if leftover:
+            server.sendall(leftover)
+        relay_tunnel(client_socket, server, options)
+
+def deal_with_client(client_socket, client_address, config, cache, upstream_pool, options, idle=None, first_request=1):
+    """
+    Xử lý kết nối từ client: phục vụ lần lượt các yêu cầu trên cùng một kết nối
+    (HTTP/1.1 keep-alive, kể cả các yêu cầu pipelining được trả lời đúng thứ tự)
+    cho tới khi client đóng kết nối hoặc rảnh quá keep_alive_timeout.
+
+    Args:
+        client_socket (socket.socket): Đối tượng socket của client.
+        client_address (tuple): Địa chỉ của client (IP, port).
+        config (ConfigWatcher): Nguồn của chính sách hiện hành (whitelist, khung giờ cho phép).
+        cache (MemoryCache): Cache hai tầng (bộ nhớ và đĩa) để lưu trữ và truy xuất dữ liệu cache.
+        upstream_pool (UpstreamPool): Pool kết nối giữ sống tới các máy chủ gốc.
+        options (dict): Các tuỳ chọn vận hành (keep_alive_timeout, max_keep_alive_requests).
+        idle (IdleConnections): Engine pool: giữa hai yêu cầu, kết nối được trả cho IdleConnections
+            (luồng được giải phóng) và quay lại nhóm luồng khi client gửi yêu cầu tiếp theo.
+        first_request (int): Số thứ tự của yêu cầu đầu tiên được xử lý trong lượt này (> 1 khi kết nối quay lại từ idle).
+    """
+    if first_request == 1:
+        METRICS.inc("proxy_client_connections_total")
+        METRICS.inc("proxy_active_connections")
+    parked = False
+    try:
+        # Không nhận được yêu cầu mới trong keep_alive_timeout giây thì đóng kết nối
+        client_socket.settimeout(options["keep_alive_timeout"])
+        buffer = b""
+        for request_number in range(first_request, options["max_keep_alive_requests"] + 1):
+            if idle is not None and request_number > first_request and not buffer:
+                # Client chưa gửi yêu cầu tiếp theo: không giữ luồng của nhóm trong lúc chờ
+                idle.park(client_socket, (client_address, config, cache, upstream_pool, options, idle, request_number))
+                parked = True
+                break
+            try:
+                request, client_data, buffer = read_client_request(client_socket, buffer, options["max_request_body_size"])
+            except socket.timeout:
+                break
+            except RequestTooLarge as Error:
+                print(f"Request too large from {client_address}: {Error}")
+                record = RequestRecord(client_address, Error.request, Error.request.head)
+                try:
+                    send_static_response(client_socket, PAYLOAD_TOO_LARGE, record=record)
+                finally:
+                    record.finish()
+                break
+            except ValueError as Error:
+                # Yêu cầu sai cú pháp, độ dài phần thân không rõ ràng hoặc tiêu đề quá lớn: trả lỗi 400
+                print(f"Bad request from {client_address}: {Error}")
+                record = RequestRecord(client_address, None, b"")
+                try:
+                    send_static_response(client_socket, BAD_REQUEST, record=record)
+                finally:
+                    record.finish()
+                break
+            if request is None:
+                break
+            record = RequestRecord(client_address, request, client_data)
+            if request.method.upper() == "CONNECT":
+                # Đường hầm chiếm trọn kết nối; dữ liệu đã nhận sau yêu cầu CONNECT thuộc về đường hầm
+                try:
+                    handle_connect(client_socket, request, buffer, config, upstream_pool, options, record)
+                finally:
+                    record.finish()
+                break
+            keep_alive = request.keeps_alive() and request_number < options["max_keep_alive_requests"]
+            try:
+                keep_alive = handle_request(client_socket, request, client_data, config, cache, upstream_pool, options, keep_alive, record)
+            finally:
+                record.finish()
+            if not keep_alive:
+                break
+
+    except Exception as Error:
+        print(f"Unable to connect to the server: {Error}")
+    finally:
+        # Kết nối đã được chuyển cho IdleConnections thì luồng khác có thể đang dùng nó
+        if not parked:
+            METRICS.inc("proxy_active_connections", -1)
+            client_socket.close()
 
-        # Tạo thư mục cache nếu không tồn tại
-        if not os.path.exists(cache_directory):
-            os.makedirs(cache_directory)
+# Phiên bản bất đồng bộ (asyncio) của read_response_head
+async def read_response_head_async(server_reader, method, data=b""):
+    """
+    Returns:
+        tuple: (parser, leftover) giống read_response_head.
+    """
+    parser = HTTPParser(method)
+    while True:
+        if data:
+            _, consumed = parser.feed(data)
+            data = data[consumed:]
+            if parser.state != "head":
+                if 100 <= parser.status < 200 and parser.status != 101:
+                    parser = HTTPParser(method)
+                    continue
+                return parser, data
+        data = await server_reader.read(4096)
+        if not data:
+            return None, b""
 
-        # Kiểm tra xem thời gian từ khi tạo thư mục cache đã vượt quá thời gian cache cho phép hay không
-        if time.time() - os.path.getctime(cache_directory) >= self.cache_time:
+# Phiên bản bất đồng bộ (asyncio) của send_upstream_request
+async def send_upstream_request_async(upstream_pool, host, port, request, method, record=None):
+    """
+    Returns:
+        tuple: (connection, parser, leftover) với connection là cặp (StreamReader, StreamWriter)
+        lấy từ AsyncUpstreamPool; người gọi phải trả nó về pool bằng release().
+    """
+    idempotent = method.upper() in IDEMPOTENT_METHODS
+    while True:
+        connection, reused = await upstream_pool.acquire(host, port)
+        server_reader, server_writer = connection
+        try:
             try:
-                # Xóa toàn bộ dữ liệu cache và tạo lại thư mục cache
-                shutil.rmtree(cache_directory)
-                os.makedirs(cache_directory)
-                print("Cache has been cleared")
-            except Exception as Error:
-                print(f"Error while deleting cache data: {Error}")
+                server_writer.write(request)
+                await server_writer.drain()
+                sent_at = time.monotonic()
+                # Cùng read_timeout như socket.settimeout() của engine luồng
+                first = await asyncio.wait_for(server_reader.read(4096), upstream_pool.read_timeout)
+            except (OSError, asyncio.TimeoutError) as Error:
+                if not reused or not idempotent or isinstance(Error, (socket.timeout, asyncio.TimeoutError)):
+                    raise
+                first = None
+            if first:
+                parser, leftover = await asyncio.wait_for(read_response_head_async(server_reader, method, first), upstream_pool.read_timeout)
+                if parser is not None:
+                    if record is not None:
+                        record.upstream_time = time.monotonic() - sent_at
+                    return connection, parser, leftover
+                raise OSError(f"{host}:{port} closed the connection in the middle of the response head")
+            if not reused or not idempotent:
+                raise OSError(f"{host}:{port} closed the connection without a response")
+        except Exception:
+            upstream_pool.release(host, port, connection, False)
+            raise
+        upstream_pool.release(host, port, connection, False)
+        print(f"Stale upstream connection to {host}:{port}, retrying")
 
-    def get(self, website, image_name):
-        """
-        Lấy dữ liệu cache cho trang web và tên ảnh cụ thể.
+# Phiên bản bất đồng bộ (asyncio) của relay_response_body
+async def relay_response_body_async(server_reader, client_writer, parser, leftover, collect, options, compressor=None, record=None):
+    """
+    Chuyển tiếp phần thân phản hồi tới client theo từng mảnh tối đa relay_buffer_size byte;
+    drain() sau mỗi mảnh giữ cho bộ đệm ghi của client không phình ra khi client chậm.
 
-        Args:
-            website (str): Tên trang web.
-            image_name (str): Tên của ảnh.
+    Returns:
+        tuple: (body, complete) giống relay_response_body.
 
-        Returns:
-            bytes hoặc None: Dữ liệu ảnh cache, hoặc None nếu không tìm thấy.
-        """
-        file_path = os.path.join(self.cache_directory, website, image_name)
-        if os.path.exists(file_path):
-            with open(file_path, "rb") as f:
-                return f.read()
-        else:
-            return None
+    Raises:
+        asyncio.TimeoutError: Máy chủ gốc không gửi thêm dữ liệu trong read_timeout giây.
+    """
+    collector = BodyCollector(options["max_cache_object_size"]) if collect else None
+    buffer_size = options["relay_buffer_size"]
+    data = leftover
+    while True:
+        if data:
+            parts, consumed = parser.feed(data)
+            if compressor is not None:
+                parts = [compressor.compress(part) for part in parts]
+                framed = chunk_frame(b"".join(parts))
+                if client_writer is not None and framed:
+                    client_writer.write(framed)
+                    await client_writer.drain()
+                    if record is not None:
+                        record.bytes_out += len(framed)
+            elif client_writer is not None:
+                client_writer.write(data[:consumed])
+                await client_writer.drain()
+                if record is not None:
+                    record.bytes_out += consumed
+            if collector is not None:
+                for part in parts:
+                    collector.add(part)
+            if consumed < len(data):
+                return None, False
+        if parser.done:
+            break
+        size = min(buffer_size, parser.remaining) if parser.framing == "length" else buffer_size
+        # Cùng read_timeout như socket.settimeout() của engine luồng: máy chủ ngừng gửi giữa chừng thì
+        # asyncio.TimeoutError làm người gọi bỏ kết nối tới máy chủ và đóng kết nối với client
+        data = await asyncio.wait_for(server_reader.read(size), options["read_timeout"])
+        if not data:
+            if not parser.finish():
+                return None, False
+            break
 
-    def put(self, website, image_name, image_data):
-        """
-        Lưu trữ dữ liệu ảnh trong cache cho trang web và tên ảnh cụ thể.
+    if compressor is not None:
+        tail = compressor.flush()
+        if collector is not None:
+            collector.add(tail)
+        if client_writer is not None:
+            framed = chunk_frame(tail) + b"0\r\n\r\n"
+            client_writer.write(framed)
+            await client_writer.drain()
+            if record is not None:
+                record.bytes_out += len(framed)
+    return (collector.body() if collector is not None else None), True
 
-        Args:
-            website (str): Tên trang web.
-            image_name (str): Tên của ảnh.
-            image_data (bytes): Dữ liệu ảnh cần lưu trữ trong cache.
-        """
-        website_directory = os.path.join(self.cache_directory, website)
+# Phiên bản bất đồng bộ (asyncio) của read_client_request
+async def read_client_request_async(client_reader, buffer, max_body_size=0):
+    """
+    Returns:
+        tuple: (parser, request, buffer) giống read_client_request.
+    """
+    parser = HTTPParser()
+    pieces = []
+    data = buffer
+    received = 0
+    while True:
+        if data:
+            parts, consumed = parser.feed(data)
+            pieces.append(data[:consumed])
+            data = data[consumed:]
+            if parser.state != "head":
+                received = check_request_body(parser, parts, received, max_body_size)
+            if parser.done:
+                return parser, b"".join(pieces), data
+            if data:
+                continue
+        data = await client_reader.read(65536)
+        if not data:
+            return None, None, b""
+
+# Phiên bản bất đồng bộ (asyncio) của send_cache_response
+async def send_cache_response_async(client_writer, entry, request, keep_alive, now, record=None):
+    """
+    Phần thân chỉ có trên đĩa được gửi bằng loop.sendfile() (os.sendfile trên kết nối TCP thường).
 
-        # Tạo thư mục con cho trang web nếu chưa tồn tại
-        if not os.path.exists(website_directory):
-            os.makedirs(website_directory)
+    Returns:
+        bool: False nếu tệp nội dung đã bị xoá trước khi kịp gửi (chưa có byte nào được gửi).
+    """
+    head, has_body = build_cache_head(entry, request, keep_alive, now)
+    sent = 0
+    if not has_body:
+        client_writer.write(head)
+    elif entry.body is not None:
+        client_writer.write(head + entry.body)
+        sent = len(entry.body)
+    else:
+        try:
+            body_file = open(entry.body_path, "rb")
+        except OSError:
+            return False
+        with body_file:
+            client_writer.write(head)
+            await client_writer.drain()
+            sent = await asyncio.get_running_loop().sendfile(client_writer.transport, body_file, entry.body_offset, entry.content_length())
+    await client_writer.drain()
+    if record is not None:
+        record.sent(head)
+        record.bytes_out += sent
+    return True
 
-        file_path = os.path.join(website_directory, image_name)
-        with open(file_path, "wb") as f:
-            f.write(image_data)
+# Các tác vụ tải lại cache trong nền của engine asyncio (giữ tham chiếu để không bị thu gom giữa chừng)
+BACKGROUND_TASKS = set()
 
-# Tải cấu hình từ config.ini
-def read_Config_File(filename):
+async def refresh_cache_entry_async(cache, upstream_pool, key, entry, request, client_data, options):
     """
-    Đọc các thiết lập cấu hình từ tệp được chỉ định.
-    Tham số:
-        filename (str): Tên của tệp cấu hình.
-    Trả về:
-        tuple: Một tuple chứa các thiết lập cache_time, whitelisting, và time_range từ tệp cấu hình.
+    Tải lại một mục cache trong nền (engine asyncio), cùng logic với refresh_cache_entry.
     """
-    config = configparser.ConfigParser()
+    loop = asyncio.get_running_loop()
+    host, port, _ = parse_target(request.target)
+    upstream_request = rewrite_headers(set_connection_header(client_data, b"keep-alive"), CONDITIONAL_HEADERS)
+    if entry.has_validators():
+        upstream_request = add_validators(upstream_request, entry)
     try:
-        config.read(filename)
-        cache_time = int(config["ProxyConfig"]["cache_time"])
-        whitelisting = [
-            domain.strip()
-            for domain in config["ProxyConfig"]["whitelisting"].split(",")
-        ]
-        time_range = [int(t) for t in config["ProxyConfig"]["time"].split("-")]
-        return cache_time, whitelisting, time_range
+        connection, response, leftover = await send_upstream_request_async(upstream_pool, host, port, upstream_request, "GET")
+        reusable = False
+        try:
+            if response.status == 304 and entry.has_validators():
+                reusable = not leftover and response.keeps_alive()
+                await loop.run_in_executor(None, cache.put, key, entry.refresh(response, time.time(), cache.cache_time))
+            else:
+                _, stored, compressor = prepare_compression(request, response, options)
+                new_entry = create_cache_entry(key, request, stored, time.time(), cache.cache_time)
+                body, complete = await relay_response_body_async(connection[0], None, response, leftover, new_entry is not None, options, compressor)
+                reusable = complete and response.framing != "close" and response.keeps_alive()
+                if complete and body is not None:
+                    new_entry.body = body
+                    await loop.run_in_executor(None, cache.put, key, new_entry)
+            print(f"Cache entry refreshed in background: {key} ({response.status})")
+        finally:
+            upstream_pool.release(host, port, connection, reusable)
     except Exception as Error:
-        print(f"Error in reading config.ini file: {Error}")
-        return None, None, None
-    
-# Kiểm tra xem một tên miền có nằm trong whitelist hay không
-def is_whitelisted(domain, whitelist):
+        print(f"Error while refreshing cache entry: {Error}")
+    finally:
+        cache.end_fetch_async(key)
+
+async def handle_request_async(client_writer, request, client_data, config, cache, upstream_pool, options, keep_alive, record):
     """
-    Kiểm tra xem một tên miền cụ thể có nằm trong danh sách trắng hay không.
-    Tham số:
-        domain (str): Tên miền cần kiểm tra.
-        whitelist (list): Danh sách các tên miền trong danh sách trắng.
-    Trả về:
-        bool: True nếu tên miền nằm trong danh sách trắng, False nếu ngược lại.
+    Xử lý một yêu cầu HTTP trên kết nối của client (engine asyncio), cùng logic với handle_request.
+
+    Returns:
+        bool: True nếu kết nối với client có thể dùng tiếp cho yêu cầu sau.
     """
-    for valid_domain in whitelist:
-        if valid_domain in domain:
-            return True
-    return False
+    # Danh sách các phương thức HTTP được chấp nhận
+    ACCEPT_METHOD = ("GET", "POST", "HEAD")
+    # Đọc/ghi tệp cache là thao tác chặn nên được đẩy sang thread pool mặc định của event loop
+    loop = asyncio.get_running_loop()
+
+    method = request.method
+    target = parse_target(request.target)
+    if target is None:
+        await send_static_response_async(client_writer, BAD_REQUEST, request, record)
+        return False
+    host, port, key = target
+
+    policy = config.policy
+    if method.upper() not in ACCEPT_METHOD or not is_whitelisted(host, policy.whitelisting) or not available_time_range(policy.time_range):
+        await send_static_response_async(client_writer, FORBIDDEN, request, record)
+        return False
+
+    request_directives = parse_cache_control(request.header(b"cache-control", b""))
+    use_cache = method.upper() in ("GET", "HEAD") and "no-store" not in request_directives
+
+    entry = None
+    if use_cache:
+        # Bản cache có sẵn trong bộ nhớ được dùng ngay, chỉ khi phải đọc đĩa mới cần tới thread pool
+        entry = cache.lookup(key, request, memory_only=True)
+        if entry is None:
+            entry = await loop.run_in_executor(None, cache.lookup, key, request)
+    stale_window = entry.stale_window(cache.stale_while_revalidate) if entry is not None and method.upper() == "GET" else 0
+    if entry is not None and entry.can_serve(request, request_directives, time.time(), stale_window):
+        if method.upper() == "GET" and cache.wants_refresh(key, entry, time.time(), options["refresh_ahead"], options["refresh_min_hits"]) and cache.try_begin_fetch_async(key):
+            task = loop.create_task(refresh_cache_entry_async(cache, upstream_pool, key, entry, request, client_data, options))
+            BACKGROUND_TASKS.add(task)
+            task.add_done_callback(BACKGROUND_TASKS.discard)
+        record.cache = "stale" if time.time() >= entry.expires_at else "hit"
+        if await send_cache_response_async(client_writer, entry, request, keep_alive, time.time(), record):
+            return keep_alive
+        entry = None
 
-# Trả về nội dung HTML cho phản hồi 403 Forbidden error
-def error_403_html(file_path):
+    leader = False
+    if use_cache and method.upper() == "GET" and options["coalesce_timeout"] > 0 and not is_conditional(request) and not cache.passes(key):
+        future = cache.begin_fetch_async(key)
+        leader = future is None
+        if not leader:
+            try:
+                if await asyncio.wait_for(asyncio.shield(future), options["coalesce_timeout"]):
+                    entry = await loop.run_in_executor(None, cache.lookup, key, request) or entry
+            except asyncio.TimeoutError:
+                pass
+            if entry is not None and entry.can_serve(request, request_directives, time.time()):
+                record.cache = "hit"
+                if await send_cache_response_async(client_writer, entry, request, keep_alive, time.time(), record):
+                    return keep_alive
+                entry = None
+
+    revalidating = entry is not None and entry.has_validators() and not is_conditional(request)
+    upstream_request = set_connection_header(client_data, b"keep-alive")
+    if revalidating:
+        upstream_request = add_validators(upstream_request, entry)
+
+    record.cache = "miss" if use_cache else "bypass"
+    try:
+        connection, response, leftover = await send_upstream_request_async(upstream_pool, host, port, upstream_request, method, record)
+    except Exception as Error:
+        print(f"Error while getting server's response: {Error}")
+        if leader:
+            cache.end_fetch_async(key)
+        await send_static_response_async(client_writer, GATEWAY_TIMEOUT if isinstance(Error, (socket.timeout, asyncio.TimeoutError)) else BAD_GATEWAY, request, record)
+        return False
+
+    reusable = False
+    uncacheable = False
+    try:
+        if revalidating and response.status == 304:
+            reusable = not leftover and response.keeps_alive()
+            entry = entry.refresh(response, time.time(), cache.cache_time)
+            await loop.run_in_executor(None, cache.put, key, entry)
+            record.cache = "revalidated"
+            if not await send_cache_response_async(client_writer, entry, request, keep_alive, time.time(), record):
+                await send_static_response_async(client_writer, BAD_GATEWAY, request, record)
+                return False
+            return keep_alive
+
+        head, stored, compressor = prepare_compression(request, response, options)
+        keep_alive = keep_alive and stored.framing != "close"
+        head = set_connection_header(head, b"keep-alive" if keep_alive else b"close")
+        client_writer.write(head)
+        record.sent(head)
+
+        new_entry = create_cache_entry(key, request, stored, time.time(), cache.cache_time) if use_cache and method.upper() == "GET" else None
+        if leader and new_entry is None:
+            cache.end_fetch_async(key, False)
+            leader = False
+        body, complete = await relay_response_body_async(connection[0], client_writer, response, leftover, new_entry is not None, options, compressor, record)
+        reusable = complete and response.framing != "close" and response.status != 101 and response.keeps_alive()
+        uncacheable = complete and body is None
+
+        if complete and body is not None:
+            new_entry.body = body
+            await loop.run_in_executor(None, cache.put, key, new_entry)
+        elif method.upper() not in ("GET", "HEAD") and response.status < 400:
+            await loop.run_in_executor(None, cache.delete, key)
+
+        return keep_alive and complete
+    finally:
+        upstream_pool.release(host, port, connection, reusable)
+        if leader:
+            cache.end_fetch_async(key, not uncacheable)
+
+# Chép dữ liệu một chiều của đường hầm CONNECT (engine asyncio)
+async def pump_tunnel_async(reader, writer, buffer_size, idle_timeout, activity):
     """
-    Đọc và trả lại nội dung HTML cho phản hồi lỗi 403 Forbidden.
-    Tham số:
-        file_path (str): Đường dẫn đến tệp HTML.
-    Trả về:
-        bytes: Dữ liệu phản hồi lỗi.
+    Khi reader gặp EOF thì chỉ đóng chiều ghi của writer (write_eof, half-close).
+    activity là danh sách một phần tử giữ thời điểm có dữ liệu gần nhất, dùng chung cho cả hai chiều:
+    đường hầm chỉ bị đóng khi cả hai chiều cùng không có dữ liệu trong idle_timeout giây.
+    """
+    while True:
+        try:
+            data = await asyncio.wait_for(reader.read(buffer_size), idle_timeout)
+        except asyncio.TimeoutError:
+            if time.monotonic() - activity[0] >= idle_timeout:
+                raise
+            continue
+        if not data:
+            break
+        activity[0] = time.monotonic()
+        writer.write(data)
+        await writer.drain()
+    if writer.can_write_eof():
+        writer.write_eof()
+
+async def handle_connect_async(client_reader, client_writer, request, leftover, config, upstream_pool, options, record):
+    """
+    Mở đường hầm CONNECT (engine asyncio), cùng logic với handle_connect. Dữ liệu được chép qua
+    các transport của event loop (os.splice không dùng được với asyncio streams).
     """
+    policy = config.policy
+    host, port = split_host_port(request.target)
+    if port not in options["connect_ports"] or not is_whitelisted(host, policy.whitelisting) or not available_time_range(policy.time_range):
+        await send_static_response_async(client_writer, FORBIDDEN, request, record)
+        return
     try:
-        with open(file_path, "rb") as file:
-            error_data = b"HTTP/1.1 403 Forbidden\r\nContent-Type: text/html\r\n\r\n"
-            error_data += file.read()
-        return error_data
+        server_reader, server_writer = await upstream_pool.open_connection(host, port)
     except Exception as Error:
-        print(f"Error in reading HTML file: {Error}")
-        return b"HTTP/1.1 403 Forbidden\r\nContent-Type: text/plain\r\n\r\nError reading HTML file"
+        print(f"Error while opening tunnel to {host}:{port}: {Error}")
+        await send_static_response_async(client_writer, GATEWAY_TIMEOUT if isinstance(Error, (socket.timeout, asyncio.TimeoutError)) else BAD_GATEWAY, request, record)
+        return
+    try:
+        established = b"HTTP/1.1 200 Connection Established\r\n\r\n"
+        client_writer.write(established)
+        record.sent(established)
+        if leftover:
+            server_writer.write(leftover)
+        activity = [time.monotonic()]
+        await asyncio.gather(
+            pump_tunnel_async(client_reader, server_writer, options["relay_buffer_size"], options["tunnel_idle_timeout"], activity),
+            pump_tunnel_async(server_reader, client_writer, options["relay_buffer_size"], options["tunnel_idle_timeout"], activity),
+        )
+    except (OSError, asyncio.TimeoutError) as Error:
+        print(f"Tunnel error: {Error!r}")
+    finally:
+        server_writer.close()
 
-# Phân tích dữ liệu từ máy khách để trích xuất thông tin yêu cầu HTTP
-def parse_data(client_data):
+async def deal_with_client_async(client_reader, client_writer, config, cache, upstream_pool, options):
     """
-    Phân tích dữ liệu từ máy khách để trích xuất thông tin yêu cầu HTTP.
-    Tham số:
-        client_data (bytes): Dữ liệu gốc từ máy khách.
-    Trả về:
-        tuple: Phương thức, URL và tiêu đề đã được phân tích.
+    Xử lý kết nối từ client dưới dạng coroutine, cùng logic với deal_with_client
+    nhưng không chiếm một luồng riêng cho mỗi kết nối.
+
+    Args:
+        client_reader (asyncio.StreamReader): Luồng đọc dữ liệu từ client.
+        client_writer (asyncio.StreamWriter): Luồng ghi dữ liệu về client.
+        config (ConfigWatcher): Nguồn của chính sách hiện hành (whitelist, khung giờ cho phép).
+        cache (MemoryCache): Cache hai tầng (bộ nhớ và đĩa) để lưu trữ và truy xuất dữ liệu cache.
+        upstream_pool (AsyncUpstreamPool): Pool kết nối giữ sống tới các máy chủ gốc.
+        options (dict): Các tuỳ chọn vận hành (keep_alive_timeout, max_keep_alive_requests).
     """
-    data = client_data.split(b"\r\n\r\n")
-    lines = data[0].split(b"\r\n")
+    client_address = client_writer.get_extra_info("peername")
+    METRICS.inc("proxy_client_connections_total")
+    METRICS.inc("proxy_active_connections")
+    try:
+        buffer = b""
+        for request_number in range(1, options["max_keep_alive_requests"] + 1):
+            try:
+                request, client_data, buffer = await asyncio.wait_for(read_client_request_async(client_reader, buffer, options["max_request_body_size"]), options["keep_alive_timeout"])
+            except asyncio.TimeoutError:
+                break
+            except RequestTooLarge as Error:
+                print(f"Request too large from {client_address}: {Error}")
+                record = RequestRecord(client_address, Error.request, Error.request.head)
+                try:
+                    await send_static_response_async(client_writer, PAYLOAD_TOO_LARGE, record=record)
+                finally:
+                    record.finish()
+                break
+            except ValueError as Error:
+                print(f"Bad request from {client_address}: {Error}")
+                record = RequestRecord(client_address, None, b"")
+                try:
+                    await send_static_response_async(client_writer, BAD_REQUEST, record=record)
+                finally:
+                    record.finish()
+                break
+            if request is None:
+                break
+            record = RequestRecord(client_address, request, client_data)
+            if request.method.upper() == "CONNECT":
+                try:
+                    await handle_connect_async(client_reader, client_writer, request, buffer, config, upstream_pool, options, record)
+                finally:
+                    record.finish()
+                break
+            keep_alive = request.keeps_alive() and request_number < options["max_keep_alive_requests"]
+            try:
+                keep_alive = await handle_request_async(client_writer, request, client_data, config, cache, upstream_pool, options, keep_alive, record)
+            finally:
+                record.finish()
+            if not keep_alive:
+                break
 
-    if len(lines) < 1:
-        return None, None, None
-    
-    method, url, _ = lines[0].split(b" ", 2)
-    headers = {}
-    for line in lines[1:]:
-        if b":" in line:
-            key, value = line.split(b":", 1)
-            key = key.strip().decode("utf-8").lower()
-            value = value.strip().decode("utf-8")
-            headers[key] = value
-    return method.decode("utf-8"), url.decode("utf-8"), headers
+    except Exception as Error:
+        print(f"Unable to connect to the server: {Error}")
+    finally:
+        METRICS.inc("proxy_active_connections", -1)
+        client_writer.close()
 
-# Lấy địa chỉ IP liên quan đến một tên miền (bỏ khúc "http://")
-def get_ip_from_domain_name(domain_name):
+# Tăng giới hạn số file descriptor để một tiến trình giữ được hàng chục nghìn kết nối
+def raise_open_file_limit():
     """
-    Lấy địa chỉ IP liên quan đến một tên miền.
-    Tham số:
-        domain_name (str): Tên miền cần tìm địa chỉ IP.
-    Trả về:
-        str hoặc None: Địa chỉ IP đã tìm thấy hoặc None nếu không tìm thấy.
+    Nâng giới hạn mềm RLIMIT_NOFILE lên bằng giới hạn cứng (chỉ có trên Unix).
     """
     try:
-        ip_address = socket.gethostbyname(domain_name)
-        return ip_address
-    except socket.gaierror:
-        return None
+        import resource
+    except ImportError:
+        return
+    try:
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        if hard == resource.RLIM_INFINITY or soft < hard:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    except (ValueError, OSError) as Error:
+        print(f"Can't raise open file limit: {Error}")
 
-# Kiểm tra xem thời gian hiện tại có nằm trong khoảng thời gian đã chỉ định không
-def available_time_range(time_range):
+# Tạo pool kết nối tới máy chủ gốc từ các tuỳ chọn trong [UpstreamConfig]
+def create_upstream_pool(options, pool_class=UpstreamPool):
     """
-    Kiểm tra xem thời gian hiện tại có nằm trong khoảng thời gian đã chỉ định không.
     Tham số:
-        time_range (list): Danh sách chứa thời gian bắt đầu và kết thúc.
+        options (dict): Các tuỳ chọn đọc bởi read_Server_Options.
+        pool_class (type): UpstreamPool (engine luồng) hoặc AsyncUpstreamPool (engine asyncio).
     Trả về:
-        bool: True nếu thời gian hiện tại nằm trong khoảng, False nếu ngược lại.
+        UpstreamPool: Pool đã khởi động luồng/task dọn kết nối rảnh, kèm bộ đệm DNS (upstream_pool.resolver).
     """
-    # lấy thời gian hiện tại
-    now = datetime.datetime.now().time() # chỉ lấy thời gian
-    start_time = datetime.time(time_range[0]) # thời gian bắt đầu (7h sáng)
-    end_time = datetime.time(time_range[1]) # thời gian kết thúc (10h tối)
-    return start_time <= now <= end_time # kiểm tra xem thời gian hiện tại có nằm giữa thời gian bắt đầu và thời gian kết thúc không
+    resolver = DNSCache(options["positive_ttl"], options["negative_ttl"], options["max_entries"])
+    upstream_pool = pool_class(
+        options["max_per_host"],
+        options["max_idle_per_host"],
+        options["idle_timeout"],
+        options["connect_timeout"],
+        options["read_timeout"],
+        resolver,
+    )
+    upstream_pool.start_reaper()
+    METRICS.sources.append(("proxy_dns", resolver.stats))
+    return upstream_pool
 
-def receive_data_from_server(server):
+async def Proxy_Server_Async(listener, config, cache, options):
     """
-    Nhận dữ liệu từ máy chủ.
+    Khởi chạy proxy trên một event loop asyncio duy nhất: mỗi kết nối là một coroutine
+    thay vì một luồng, nên số kết nối đồng thời không bị giới hạn bởi bộ nhớ của luồng.
 
     Args:
-        server (socket.socket): Đối tượng socket máy chủ.
-
-    Returns:
-        bytes: Dữ liệu nhận từ máy chủ.
+        listener (socket.socket): Socket lắng nghe đã bind (xem create_listening_socket).
+        config (ConfigWatcher): Nguồn của chính sách hiện hành (whitelist, khung giờ cho phép).
+        cache (MemoryCache): Cache hai tầng dùng chung cho mọi kết nối.
+        options (dict): Các tuỳ chọn vận hành (backlog, cấu hình pool kết nối tới máy chủ gốc, ...).
     """
-    data = b""
-    while not data.endswith(b"\r\n\r\n"):
+    raise_open_file_limit()
+    upstream_pool = create_upstream_pool(options, AsyncUpstreamPool)
+    handler = functools.partial(deal_with_client_async, config=config, cache=cache, upstream_pool=upstream_pool, options=options)
+    server = await asyncio.start_server(handler, sock=listener, backlog=options["backlog"])
+
+    print(f"Proxy is listening at: {listener.getsockname()} (asyncio engine, pid {os.getpid()})")
+    async with server:
+        await server.serve_forever()
+
+# Nhóm luồng xử lý có kích thước cố định cho engine "pool"
+class WorkerPool:
+    def __init__(self, workers, queue_size, queue_timeout, handler):
+        """
+        Khởi tạo nhóm luồng xử lý kết nối.
+
+        Args:
+            workers (int): Số luồng xử lý cố định.
+            queue_size (int): Số kết nối tối đa được giữ trong hàng đợi chờ luồng rảnh.
+            queue_timeout (float): Thời gian (giây) luồng accept chờ hàng đợi có chỗ trước khi trả lỗi 503.
+            handler (callable): Hàm xử lý một kết nối, được gọi với các tham số truyền vào submit().
+        """
+        self.queue_timeout = queue_timeout
+        self.handler = handler
+        self.tasks = queue.Queue(maxsize=queue_size)
+        for index in range(workers):
+            worker = threading.Thread(target=self.work, name=f"proxy-worker-{index}", daemon=True)
+            worker.start()
+
+    def work(self):
+        """
+        Vòng lặp của một luồng xử lý: lấy kết nối từ hàng đợi và xử lý lần lượt.
+        """
+        while True:
+            args = self.tasks.get()
+            try:
+                self.handler(*args)
+            except Exception as Error:
+                print(f"Worker error: {Error}")
+            finally:
+                self.tasks.task_done()
+
+    def submit(self, *args, timeout=None):
+        """
+        Đưa một kết nối vào hàng đợi, chờ tối đa timeout giây (mặc định queue_timeout) nếu hàng đợi đang đầy.
+
+        Returns:
+            bool: True nếu kết nối đã được nhận, False nếu proxy đang quá tải.
+        """
         try:
-            chunk = server.recv(4096)
-            if not chunk:
-                break
-            data += chunk
-        except Exception as Error:
-            print(f"Error while receiving data from server: {Error}")
-            break
-    return data
+            self.tasks.put(args, timeout=self.queue_timeout if timeout is None else timeout)
+            return True
+        except queue.Full:
+            return False
+
+# Các kết nối giữ sống đang rảnh của engine pool, chờ yêu cầu tiếp theo trên một selector thay vì trên luồng xử lý
+class IdleConnections:
+    def __init__(self, workers, timeout):
+        """
+        Một luồng chờ mọi kết nối rảnh bằng selectors; kết nối có dữ liệu được đưa lại vào hàng đợi
+        của WorkerPool, kết nối rảnh quá timeout giây bị đóng. Nhờ vậy số kết nối giữ sống không bị
+        giới hạn bởi số luồng (workers) mà chỉ bởi số tệp được mở.
+
+        Args:
+            workers (WorkerPool): Nhóm luồng nhận lại các kết nối có yêu cầu mới.
+            timeout (float): Thời gian (giây) chờ yêu cầu tiếp theo (keep_alive_timeout).
+        """
+        self.workers = workers
+        self.timeout = timeout
+        self.selector = selectors.DefaultSelector()
+        self.lock = threading.Lock()
+        self.pending = []  # (socket, tham số của deal_with_client, hạn chờ) chưa được đăng ký với selector
+        # Đánh thức select() khi có kết nối mới được gửi tới (selector chỉ được dùng trong luồng của nó)
+        self.wakeup_reader, self.wakeup_writer = socket.socketpair()
+        self.wakeup_reader.setblocking(False)
+        self.wakeup_writer.setblocking(False)
+        self.selector.register(self.wakeup_reader, selectors.EVENT_READ)
+        threading.Thread(target=self.run, name="proxy-idle-connections", daemon=True).start()
+
+    def park(self, client_socket, args):
+        with self.lock:
+            self.pending.append((client_socket, args, time.monotonic() + self.timeout))
+        try:
+            self.wakeup_writer.send(b"\0")
+        except BlockingIOError:
+            pass
+
+    def close(self, client_socket):
+        METRICS.inc("proxy_active_connections", -1)
+        client_socket.close()
+
+    def run(self):
+        while True:
+            events = self.selector.select(0.5)
+            with self.lock:
+                pending, self.pending = self.pending, []
+            for client_socket, args, deadline in pending:
+                try:
+                    self.selector.register(client_socket, selectors.EVENT_READ, (args, deadline))
+                except (OSError, ValueError):
+                    self.close(client_socket)
+            for key, _ in events:
+                if key.fileobj is self.wakeup_reader:
+                    try:
+                        while self.wakeup_reader.recv(4096):
+                            pass
+                    except BlockingIOError:
+                        pass
+                    continue
+                self.selector.unregister(key.fileobj)
+                args, _ = key.data
+                # Không chờ hàng đợi trong luồng này: hàng đợi đầy thì trả 503 ngay
+                if not self.workers.submit(key.fileobj, *args, timeout=0):
+                    METRICS.inc("proxy_active_connections", -1)
+                    reject_overloaded_client(key.fileobj, args[0])
+            now = time.monotonic()
+            for key in list(self.selector.get_map().values()):
+                if key.data is not None and key.data[1] <= now:
+                    self.selector.unregister(key.fileobj)
+                    self.close(key.fileobj)
 
-def deal_with_client(client_socket, client_address, whitelisting, time_range, cache):
+# Từ chối nhanh một kết nối khi proxy quá tải
+def reject_overloaded_client(client_socket, client_address):
     """
-    Xử lý kết nối từ client và xử lý các yêu cầu HTTP.
+    Gửi phản hồi 503 Service Unavailable rồi đóng kết nối mà không đọc yêu cầu.
 
     Args:
         client_socket (socket.socket): Đối tượng socket của client.
         client_address (tuple): Địa chỉ của client (IP, port).
-        whitelisting (list): Danh sách các URL được phép.
-        time_range (tuple): Tuple đại diện cho khoảng thời gian cho phép.
-        cache (Cache): Đối tượng Cache để lưu trữ và truy xuất dữ liệu cache.
     """
-    print(f"New connection: {client_address}")
+    METRICS.inc("proxy_rejected_connections_total")
+    try:
+        client_socket.settimeout(1)
+        client_socket.sendall(SERVICE_UNAVAILABLE.for_request())
+    except OSError as Error:
+        print(f"Error while sending 503 response: {Error}")
+    finally:
+        client_socket.close()
 
-    # Danh sách các phương thức HTTP được chấp nhận
-    ACCEPT_METHOD = ("GET", "POST", "HEAD")
+# Tạo socket lắng nghe của proxy
+def create_listening_socket(address, backlog, reuse_port=False):
+    """
+    Tham số:
+        address (tuple): Địa chỉ (host, port) mà proxy lắng nghe.
+        backlog (int): Độ dài hàng đợi kết nối chờ accept().
+        reuse_port (bool): Bật SO_REUSEPORT để nhiều tiến trình worker cùng bind một cổng; nhân hệ điều
+            hành chia đều kết nối mới cho các socket đó.
+    Trả về:
+        socket.socket: Socket đã bind và listen.
+    """
+    # Tạo socket proxy
+    proxy = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
     try:
-        # Nhận dữ liệu từ client
-        client_data = client_socket.recv(4096)
-        if client_data:
-            # Phân tích dữ liệu nhận được từ client thành method, url và headers
-            method, url, headers = parse_data(client_data)
-            # Kiểm tra các điều kiện để xem liệu yêu cầu này hợp lệ không
-            if method == None or method.upper() not in ACCEPT_METHOD or not is_whitelisted(url, whitelisting) or not available_time_range(time_range):
-                # Gửi lỗi 403 nếu không hợp lệ
-                client_socket.sendall(error_403_html("403.html"))
-                client_socket.close()
-                return
-            
-            # Trích xuất tên ảnh từ URL
-            image_name = url.split("/")[-1]
-            # Trích xuất tên miền từ URL
-            domain_name = url.split("//")[-1].split("/")[0]
-            # url.split("//"): Đoạn này sẽ tách URL thành một danh sách sử dụng chuỗi "//" như điểm tách. Ví dụ, nếu url là "https://www.example.com/page" thì kết quả sẽ là ["https:", "www.example.com/page"].
-            # [-1].split("/"): Sau khi đã tách "//" từ URL, ta lấy phần tử cuối cùng của danh sách (tức là "www.example.com/page") và tiến hành tách theo dấu /. Kết quả của bước này sẽ là danh sách ["www.example.com", "page"].
-            # [0]: Cuối cùng, lấy phần tử đầu tiên của danh sách sau bước tách trước đó (tức là "www.example.com") để trích xuất tên miền chính từ URL.
-
-            # Kiểm tra xem có yêu cầu dữ liệu hình ảnh và tên ảnh có hợp lệ không
-            if "image/" in headers.get("accept", "") and len(image_name) > 0:
-                # Lấy dữ liệu ảnh từ cache nếu có
-                cache_image = cache.get(domain_name, image_name)
-                
-                if cache_image:
-                    print("Getting data from cache file")
-                    client_socket.sendall(cache_image)
-                    client_socket.close()
-                    return
-                
-            # Tạo socket server để kết nối với máy chủ ảnh
-            server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        if reuse_port:
+            proxy.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        # Gắn socket proxy vào địa chỉ và cổng của máy chủ
+        proxy.bind(address)
+        # Hệ điều hành giữ tối đa "backlog" kết nối đang chờ accept()
+        proxy.listen(backlog)
+    except OSError:
+        proxy.close()
+        raise
+    return proxy
+
+# Trang số liệu (Prometheus) trên một cổng quản trị riêng
+def start_metrics_server(address):
+    """
+    Tạo luồng con (daemon) trả lời GET /metrics bằng METRICS.render(); đường dẫn khác trả về 404.
+    Các yêu cầu được trả lời lần lượt trên một luồng, không chiếm tài nguyên của các engine xử lý client.
+    Tham số:
+        address (tuple): Địa chỉ (host, port) của trang số liệu.
+    """
+    listener = create_listening_socket(address, 16)
+
+    def serve_forever():
+        while True:
             try:
-                # Lấy địa chỉ IP từ tên miền và kết nối tới máy chủ ảnh
-                SERVER_ADDRESS = (get_ip_from_domain_name(domain_name), 80)
-                server.connect(SERVER_ADDRESS)
-                print(f"Connecting to: {domain_name}")
-
-                # Gửi yêu cầu của client tới server ảnh
-                server.sendall(client_data)
-                response_data = server.recv(4096)
-                response_method, response_url, response_headers = parse_data(response_data)
-
-                if method.upper() == "HEAD":
-                    # Nếu phương thức yêu cầu là HEAD, gửi dữ liệu phản hồi nhận được trở lại cho máy khách.
-                    client_socket.sendall(response_data)
-                    return
-
-                if method.upper() == "POST" and b"100 Continue" in response_data.split(b"\r\n")[0]:
-                    # Nếu phương thức yêu cầu là POST và phản hồi bao gồm "100 Continue", tiến hành gửi dữ liệu POST thực sự.
-
-                    # Gửi dữ liệu POST ban đầu (loại bỏ phần tiêu đề) tới máy chủ.
-                    server.sendall(client_data.split(b"\r\n\r\n", 1)[1])
-
-                    # Nhận và bỏ qua phản hồi "100 Continue" từ máy chủ.
-                    while not response_data.endswith(b"\r\n\r\n"):
-                        try:
-                            data = server.recv(4096)
-                            response_data += data
-                        except Exception as Error:
-                            print(f"Lỗi khi nhận phản hồi '100 Continue': {Error}")
-                            break
-
-                    # Bây giờ tiến hành gửi dữ liệu POST còn lại và nhận phản hồi thực sự từ máy chủ.
-                    server.sendall(client_data.split(b"\r\n\r\n", 1)[1])
-                    response_data = receive_data_from_server(server)
-
-
-                # Xử lý các trường hợp có "transfer-encoding" hoặc "content-length"
-                if "transfer-encoding" in response_headers:
-                    while not response_data.endswith(b"0\r\n\r\n"):
-                        try:
-                            data = server.recv(4096)
-                            response_data += data
-                        except Exception as Error:
-                            print(f"Error while receiving data from server: {Error}")
-                            break
-
-                elif "content-length" in response_headers:
-                    while len(response_data) < int(response_headers["content-length"]):
-                        try:
-                            data = server.recv(4096)
-                            response_data += data
-                        except Exception as Error:
-                            print(f"Error while receiving data from server: {Error}")
-                            break
-                
-                # Nếu đây là dữ liệu ảnh, lưu vào cache
-                if response_headers.get("content-type", "").startswith("image/"):
-                    head,body = response_data.split(b'\r\n\r\n', 1)
-                    cache.put(domain_name, image_name, body)
-
-                print(domain_name)
-                print(response_method)
-                print(response_url)
-                print(response_headers)
-            
-            except Exception as Error:
-                print(f"Error while getting server's IP: {Error}")
+                admin_socket, _ = listener.accept()
+            except OSError as Error:
+                print(f"Metrics endpoint error: {Error}")
+                continue
+            with admin_socket:
+                try:
+                    admin_socket.settimeout(5)
+                    request, _, _ = read_client_request(admin_socket, b"")
+                    if request is None:
+                        continue
+                    if request.method.upper() == "GET" and urllib.parse.urlsplit(request.target).path == "/metrics":
+                        response = StaticResponse(b"200 OK", b"text/plain; version=0.0.4; charset=utf-8", METRICS.render())
+                    else:
+                        response = NOT_FOUND
+                    admin_socket.sendall(response.for_request(request))
+                except (OSError, ValueError) as Error:
+                    print(f"Metrics endpoint error: {Error}")
+
+    metrics_thread = threading.Thread(target=serve_forever, name="metrics-server", daemon=True)
+    metrics_thread.start()
+    print(f"Metrics are served at: http://{address[0]}:{address[1]}/metrics")
+
+# Tiến trình chính ở chế độ nhiều tiến trình: tạo các worker và khởi động lại worker bị dừng
+def supervise_workers(count, run):
+    """
+    Tham số:
+        count (int): Số tiến trình worker.
+        run (callable): Hàm chạy trong mỗi worker, nhận số thứ tự worker (0..count-1).
+    SIGHUP được chuyển tiếp cho các worker (mỗi worker tự nạp lại config.ini); SIGINT/SIGTERM dừng
+    tất cả worker rồi thoát.
+    """
+    children = {}  # pid -> số thứ tự worker
+    started = {}   # số thứ tự worker -> thời điểm tạo gần nhất
+
+    def spawn(index):
+        # Bộ đệm stdout chưa ghi sẽ bị in lặp lại ở tiến trình con nếu không xả trước khi fork
+        sys.stdout.flush()
+        pid = os.fork()
+        if pid == 0:
+            exit_code = 0
+            try:
+                signal.signal(signal.SIGTERM, signal.SIG_DFL)
+                # SIGHUP mặc định kết thúc tiến trình: bỏ qua nó tới khi ConfigWatcher.start() cài trình xử lý
+                signal.signal(signal.SIGHUP, signal.SIG_IGN)
+                # Ctrl+C gửi tới cả nhóm tiến trình: tiến trình chính sẽ dừng worker
+                signal.signal(signal.SIGINT, signal.SIG_IGN)
+                run(index)
+            except BaseException as Error:
+                print(f"Worker {index} error: {Error}")
+                exit_code = 1
             finally:
-                server.close()
-                # Gửi phản hồi từ server về cho client
-                client_socket.sendall(response_data)
+                sys.stdout.flush()
+                os._exit(exit_code)
+        children[pid] = index
+        started[index] = time.monotonic()
+        print(f"Worker {index} started (pid {pid})")
 
-    except Exception as Error:
-        print(f"Unable to connect to the server: {Error}")
+    def forward(signum, frame):
+        for pid in list(children):
+            try:
+                os.kill(pid, signum)
+            except OSError:
+                pass
+
+    def stop(signum, frame):
+        raise SystemExit(0)
+
+    signal.signal(signal.SIGHUP, forward)
+    signal.signal(signal.SIGTERM, stop)
+    for index in range(count):
+        spawn(index)
+    try:
+        while children:
+            pid, status = os.wait()
+            index = children.pop(pid, None)
+            if index is None:
+                continue
+            print(f"Worker {index} (pid {pid}) exited with status {os.waitstatus_to_exitcode(status)}, restarting")
+            if time.monotonic() - started[index] < 1.0:
+                # Worker lỗi ngay khi khởi động (ví dụ không bind được cổng): chờ một chút để không fork liên tục
+                time.sleep(1.0)
+            spawn(index)
+    except (KeyboardInterrupt, SystemExit):
+        print("Stopping workers")
     finally:
-        print(f"Connection closed: {client_address}")
-        client_socket.close()
+        forward(signal.SIGTERM, None)
+        for pid in list(children):
+            try:
+                os.waitpid(pid, 0)
+            except ChildProcessError:
+                pass
 
-def Proxy_Server():
+# Chạy proxy (cache, theo dõi cấu hình, engine) trong tiến trình hiện tại
+def Proxy_Worker(policy, options, worker=0, listener=None):
     """
-    Khởi chạy máy chủ Proxy để xử lý yêu cầu từ các clients.
+    Tham số:
+        policy (ProxyPolicy): Chính sách đọc từ [ProxyConfig] lúc khởi động.
+        options (dict): Các tuỳ chọn vận hành đã được kiểm tra bởi Proxy_Server.
+        worker (int): Số thứ tự tiến trình worker (0 khi chạy một tiến trình).
+        listener (socket.socket): Socket lắng nghe kế thừa từ tiến trình chính, None thì tự tạo.
     """
-    # Đọc cấu hình từ tệp config.ini
-    cache_time, whitelisting, time_range = read_Config_File("config.ini")
-    if cache_time is None or whitelisting is None or time_range is None:
-        # Nếu không đọc được cấu hình, thông báo và thoát khỏi hàm
-        print("Can't read Configuration file. Please check if the configuration file is missing.")
-        return
+    processes = options["processes"]
+
+    def share(limit):
+        # Mỗi worker giữ một phần giới hạn của cache trên đĩa (0 = không giới hạn)
+        return (limit + processes - 1) // processes
+
+    DISK_CACHE = Cache(policy.cache_time, CACHE_DIRECTORY, share(options["disk_cache_size"]), share(options["disk_max_entries"]), options["eviction_policy"],
+                       options["storage"], options["segment_size"], options["compact_ratio"], options["stale_while_revalidate"], worker, processes)
+    # Phản hồi hay được truy cập nằm trong bộ nhớ, cache trên đĩa là nơi lưu trữ chính
+    CACHE = MemoryCache(DISK_CACHE, options["memory_cache_size"], options["memory_max_object_size"], options["hit_for_pass"])
+    DISK_CACHE.start_reaper()
+
+    # [ProxyConfig] được nạp lại khi config.ini thay đổi; các tuỳ chọn khác cần khởi động lại proxy
+    config = ConfigWatcher("config.ini", policy, options["config_reload_interval"])
+
+    def apply_cache_time(new_policy):
+        DISK_CACHE.cache_time = CACHE.cache_time = new_policy.cache_time
 
-    CLIENT_ADDRESS = ("localhost", 8080)
-    CACHE_DIRECTORY = "cache_image"
-    CACHE = Cache(cache_time, CACHE_DIRECTORY)
+    config.listeners.append(apply_cache_time)
+    config.start()
+
+    if options["access_log"]:
+        path = options["access_log"]
+        if worker and path != "-":
+            # Mỗi worker ghi (và xoay vòng) tệp nhật ký riêng
+            root, extension = os.path.splitext(path)
+            path = f"{root}.{worker}{extension}"
+        ACCESS_LOG.start(path, options["access_log_format"], options["access_log_queue_size"], options["access_log_flush_interval"],
+                         options["access_log_max_bytes"], options["access_log_backups"])
+
+    if options["metrics_port"]:
+        METRICS.sources.append(("proxy_cache", CACHE.stats))
+        try:
+            # Mỗi worker có bộ đếm riêng nên có cổng số liệu riêng
+            start_metrics_server((CLIENT_ADDRESS[0], options["metrics_port"] + worker))
+        except OSError as Error:
+            print(f"Can't start metrics endpoint: {Error}")
 
     try:
-        # Tạo socket proxy
-        proxy = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        # Gắn socket proxy vào địa chỉ và cổng của máy chủ
-        proxy.bind(CLIENT_ADDRESS)
-        # Cho phép proxy lắng nghe và xử lý tới 5 kết nối cùng một lúc
-        proxy.listen(5)
+        if listener is None:
+            listener = create_listening_socket(CLIENT_ADDRESS, options["backlog"], reuse_port=processes > 1)
+    except Exception as Error:
+        # Nếu có lỗi khi tạo socket proxy, thông báo lỗi
+        print(f"Can't connect to socket: {Error}")
+        return
 
-        print(f"Proxy is listening at: {CLIENT_ADDRESS}")
+    if options["engine"] == "asyncio":
+        # Toàn bộ kết nối được xử lý bởi các coroutine trên một event loop
+        try:
+            asyncio.run(Proxy_Server_Async(listener, config, CACHE, options))
+        except Exception as Error:
+            print(f"Can't connect to socket: {Error}")
+        return
+
+    UPSTREAM_POOL = create_upstream_pool(options)
+    workers = idle = None
+    if options["engine"] == "pool":
+        # Số luồng cố định; kết nối vượt quá sẽ xếp hàng, hàng đợi đầy thì trả 503
+        workers = WorkerPool(options["workers"], options["queue_size"], options["queue_timeout"], deal_with_client)
+        # Kết nối giữ sống chờ yêu cầu tiếp theo ngoài nhóm luồng
+        idle = IdleConnections(workers, options["keep_alive_timeout"])
+
+    proxy = listener
+    try:
+        print(f"Proxy is listening at: {proxy.getsockname()} ({options['engine']} engine, pid {os.getpid()})")
         while True:
             try:
-                # Chấp nhận kết nối từ client và tạo luồng xử lý riêng biệt
                 client_socket, client_address = proxy.accept()
-                client_thread = threading.Thread(target=deal_with_client, args=(client_socket, client_address, whitelisting, time_range, CACHE),)
+                if workers is not None:
+                    # Chuyển kết nối cho nhóm luồng; nếu hàng đợi vẫn đầy sau queue_timeout thì trả 503
+                    if not workers.submit(client_socket, client_address, config, CACHE, UPSTREAM_POOL, options, idle):
+                        reject_overloaded_client(client_socket, client_address)
+                    continue
+                # Chấp nhận kết nối từ client và tạo luồng xử lý riêng biệt
+                client_thread = threading.Thread(target=deal_with_client, args=(client_socket, client_address, config, CACHE, UPSTREAM_POOL, options),)
                 client_thread.start()
             except Exception as Error:
                 # Nếu không thể chấp nhận kết nối, thông báo lỗi
                 print(f"Connection not acceptable: {Error}")
-    except Exception as Error:
-        # Nếu có lỗi khi tạo socket proxy, thông báo lỗi
-        print(f"Can't connect to socket: {Error}")
     finally:
         # Đóng socket proxy sau khi kết thúc
         proxy.close()
 
+def Proxy_Server():
+    """
+    Khởi chạy máy chủ Proxy để xử lý yêu cầu từ các clients.
+    """
+    # Đọc cấu hình từ tệp config.ini
+    policy = read_Config_File("config.ini")
+    if policy is None:
+        # Nếu không đọc được cấu hình, thông báo và thoát khỏi hàm
+        print("Can't read Configuration file. Please check if the configuration file is missing.")
+        return
+    options = read_Server_Options("config.ini")
+    if options["engine"] not in ENGINES:
+        print(f"Unknown engine '{options['engine']}', falling back to 'thread'")
+        options["engine"] = "thread"
+    if options["eviction_policy"] not in EVICTION_POLICIES:
+        print(f"Unknown eviction policy '{options['eviction_policy']}', falling back to 'lru'")
+        options["eviction_policy"] = "lru"
+    options["connect_ports"] = {int(port) for port in options["connect_ports"].split(",") if port.strip().isdigit()}
+    options["compression_types"] = {content_type.strip().lower() for content_type in options["compression_types"].split(",") if content_type.strip()}
+    if options["storage"] not in STORAGE_BACKENDS:
+        print(f"Unknown cache storage '{options['storage']}', falling back to 'files'")
+        options["storage"] = "files"
+    if options["access_log_format"] not in ACCESS_LOG_FORMATS:
+        print(f"Unknown access log format '{options['access_log_format']}', falling back to 'json'")
+        options["access_log_format"] = "json"
+    if options["processes"] > 1 and not hasattr(os, "fork"):
+        print("Multiple worker processes need os.fork(), running a single process")
+    if options["processes"] <= 1 or not hasattr(os, "fork"):
+        options["processes"] = 1
+        Proxy_Worker(policy, options)
+        return
+
+    if options["storage"] == "segments":
+        # Chỉ mục của SegmentStore nằm trong bộ nhớ của một tiến trình nên không dùng chung được
+        print("Cache storage 'segments' can't be shared between worker processes, falling back to 'files'")
+        options["storage"] = "files"
+    # Chuẩn bị thư mục cache một lần trước khi các worker cùng mở nó
+    prepare_cache_directory(CACHE_DIRECTORY, options["storage"], options["processes"])
+    listener = None
+    if not hasattr(socket, "SO_REUSEPORT"):
+        # Không có SO_REUSEPORT: các worker dùng chung một socket lắng nghe được tạo trước khi fork
+        try:
+            listener = create_listening_socket(CLIENT_ADDRESS, options["backlog"])
+        except Exception as Error:
+            print(f"Can't connect to socket: {Error}")
+            return
+    supervise_workers(options["processes"], lambda worker: Proxy_Worker(policy, options, worker, listener))
+
 if __name__ == "__main__":
     Proxy_Server()
@@ -1,5 +1,6 @@
 import socket
 import threading
+import asyncio
 import configparser
 import datetime
 import os
@@ -59,10 +60,12 @@ class ProxyServer:
                 for domain in config["ProxyConfig"]["whitelisting"].split(",")
             ]
             time_range = [int(t) for t in config["ProxyConfig"]["time"].split("-")]
+            engine = config.get("ServerConfig", "engine", fallback="thread").strip()
             return {
                 "cache_time": cache_time,
                 "whitelisting": whitelisting,
                 "time_range": time_range,
+                "engine": engine,
             }
         except Exception as Error:
             print(f"Error reading configuration file: {Error}")
@@ -197,10 +200,111 @@ class ProxyServer:
             print(f"Connection closed: {toward_client_address}")
             toward_client_socket.close()
 
+    async def handle_client_async(self, client_reader, client_writer):
+        toward_client_address = client_writer.get_extra_info("peername")
+        print(f"New connection detected: {toward_client_address}")
+        VALID_METHODS = ("GET", "HEAD", "POST")
+        BUFFER_SIZE = 4096
+        loop = asyncio.get_running_loop()
+        try:
+            client_data = await client_reader.read(BUFFER_SIZE)
+            if client_data:
+                method, url, headers = self.parse_data(client_data)
+                if (
+                    method == None
+                    or method.upper() not in VALID_METHODS
+                    or not self.is_whitelisted(url)
+                    # or not self.is_within_time_range()
+                ):
+                    client_writer.write(self.error_403_with_html("403.html"))
+                    await client_writer.drain()
+                    return
+
+                image_name = url.split("/")[-1]
+                domain_name = url.split("//")[-1].split("/")[0]
+
+                if "image/" in headers.get("accept", "") and len(image_name) > 0:
+                    cache_image = await loop.run_in_executor(
+                        None, self.cache.get, domain_name, image_name
+                    )
+
+                    if cache_image:
+                        print("Serving from cache")
+                        client_writer.write(cache_image)
+                        await client_writer.drain()
+                        return
+
+                server_writer = None
+                try:
+                    server_reader, server_writer = await asyncio.open_connection(
+                        domain_name, 80
+                    )
+                    print(f"Linked to: {server_writer.get_extra_info('peername')}")
+
+                    server_writer.write(client_data)
+                    await server_writer.drain()
+                    response_data = await server_reader.read(BUFFER_SIZE)
+                    response_method, response_url, response_headers = self.parse_data(
+                        response_data
+                    )
+
+                    if "transfer-encoding" in response_headers:
+                        while not response_data.endswith(b"0\r\n\r\n"):
+                            data = await server_reader.read(BUFFER_SIZE)
+                            if not data:
+                                break
+                            response_data += data
+
+                    elif "content-length" in response_headers:
+                        while len(response_data) < int(
+                            response_headers["content-length"]
+                        ):
+                            data = await server_reader.read(BUFFER_SIZE)
+                            if not data:
+                                break
+                            response_data += data
+
+                    if response_headers.get("content-type", "").startswith("image/"):
+                        await loop.run_in_executor(
+                            None, self.cache.put, domain_name, image_name, response_data
+                        )
+
+                    client_writer.write(response_data)
+                    await client_writer.drain()
+
+                except Exception as Error:
+                    print(f"Error while getting Server's IP: {Error}")
+                finally:
+                    if server_writer is not None:
+                        server_writer.close()
+
+        except Exception as Error:
+            print(f"Error occurred with the client socket: {Error}")
+        finally:
+            print(f"Connection closed: {toward_client_address}")
+            client_writer.close()
+
+    async def start_async(self):
+        CLIENT_ADDRESS = ("localhost", 8080)
+
+        server = await asyncio.start_server(
+            self.handle_client_async, CLIENT_ADDRESS[0], CLIENT_ADDRESS[1]
+        )
+        print(f"Proxy is listening at: {CLIENT_ADDRESS} (asyncio engine)")
+        async with server:
+            await server.serve_forever()
+
     def start(self):
         CLIENT_ADDRESS = ("localhost", 8080)
         BACKLOG = 5
 
+        if self.config.get("engine") == "asyncio":
+            try:
+                asyncio.run(self.start_async())
+            except Exception as Error:
+                print(f"Error during socket setup: {Error}")
+            return
+
         try:
             proxy = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
             proxy.bind(CLIENT_ADDRESS)
@@ -1,6 +1,7 @@
 import socket, threading
 import time, datetime
 import configparser
+import heapq
 import os
 
 
@@ -10,11 +11,22 @@ class ImageCache:
         self.cache_timeout = cache_timeout
         self.cache_directory = cache_directory
         self.cache_lock = threading.Lock()  # Khóa đồng bộ
+        # Min-heap (thời điểm hết hạn, đường dẫn tệp): luồng dọn dẹp chỉ cần xem đỉnh heap.
+        self.expiry_heap = []
+        self.expiry_times = {}  # đường dẫn tệp -> thời điểm hết hạn mới nhất
 
         # Tạo thư mục cache nếu thư mục này chưa tồn tại.
         if not os.path.exists(cache_directory):
             os.makedirs(cache_directory)
 
+        # Nạp các tệp còn lại từ lần chạy trước vào heap (chỉ quét một lần khi khởi động).
+        for root, dirs, files in os.walk(cache_directory):
+            for file in files:
+                file_path = os.path.join(root, file)
+                self.expiry_times[file_path] = os.path.getctime(file_path) + cache_timeout
+                self.expiry_heap.append((self.expiry_times[file_path], file_path))
+        heapq.heapify(self.expiry_heap)
+
         # Bắt đầu tiến trình dọn dẹp cache.
         self.start_cache_cleanup_thread()
 
@@ -24,21 +36,25 @@ class ImageCache:
         cache_cleanup_thread.daemon = True
         cache_cleanup_thread.start()
 
-    # Phương thức dùng để dọn dẹp cache.
+    # Phương thức dùng để dọn dẹp cache: lấy các tệp hết hạn ở đỉnh heap, không quét lại cả thư mục.
     def clear_expired_cache(self):
         while True:
             try:
                 current_time = time.time()
                 with self.cache_lock:
-                    for root, dirs, files in os.walk(self.cache_directory):
-                        for file in files:
-                            file_path = os.path.join(root, file)
-                            if current_time - os.path.getctime(file_path) >= self.cache_timeout:
-                                os.remove(file_path)
-                                print(f"Removed expired cache file: {file_path}")
+                    while self.expiry_heap and self.expiry_heap[0][0] <= current_time:
+                        expires_at, file_path = heapq.heappop(self.expiry_heap)
+                        # Tệp đã được ghi lại sau đó thì hết hạn muộn hơn (đã có mục mới trong heap).
+                        if self.expiry_times.get(file_path) == expires_at:
+                            del self.expiry_times[file_path]
+                            os.remove(file_path)
+                            print(f"Removed expired cache file: {file_path}")
+                    next_expiry = self.expiry_heap[0][0] if self.expiry_heap else current_time + self.cache_timeout
             except Exception as Error:
                 print(f"Error while deleting cache data: {Error}")
-            time.sleep(self.cache_timeout)
+                next_expiry = time.time() + self.cache_timeout
+            # Ngủ tới khi tệp tiếp theo hết hạn (tối đa cache_timeout giây).
+            time.sleep(min(self.cache_timeout, max(0.1, next_expiry - time.time())))
 
     # Phương thức dùng để lấy ra hình ảnh trong cache.
     def get(self, website, image_name):
@@ -61,6 +77,8 @@ class ImageCache:
             file_path = os.path.join(website_directory, image_name)
             with open(file_path, "wb") as f:
                 f.write(image_data)
+            self.expiry_times[file_path] = time.time() + self.cache_timeout
+            heapq.heappush(self.expiry_heap, (self.expiry_times[file_path], file_path))
 
 
 def parse_data(input_data):